@@ -108,10 +108,23 @@ def load_disabled_users() -> dict:
     except:
         return {}
 
-def save_disabled_users(users: dict):
-    """Save disabled users"""
+def load_enable_at() -> dict:
+    """Load custom enable times of disabled users"""
+    if not os.path.exists(DISABLED_USERS_FILE):
+        return {}
+    try:
+        with open(DISABLED_USERS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("enable_at", {})
+    except:
+        return {}
+
+def save_disabled_users(users: dict, enable_at: Optional[dict] = None):
+    """Save disabled users (keeps custom enable times of remaining users)"""
+    if enable_at is None:
+        enable_at = load_enable_at()
+    enable_at = {user: ts for user, ts in enable_at.items() if user in users}
     with open(DISABLED_USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump({"disabled_users": users}, f, indent=2)
+        json.dump({"disabled_users": users, "enable_at": enable_at}, f, indent=2)
 
 
 def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)):
@@ -428,6 +441,25 @@ async def enable_disabled_user(user: str, username: str = Depends(verify_credent
     return {"success": True, "message": f"User {user} removed from disabled list"}
 
 
+@app.put("/users/disabled/{user}/enable_at", tags=["Disabled Users"])
+async def reschedule_disabled_user(
+    user: str,
+    seconds: int = Query(..., ge=0),
+    username: str = Depends(verify_credentials),
+):
+    """Reschedule when a disabled user is re-enabled (seconds from now)"""
+    disabled = load_disabled_users()
+    
+    if user not in disabled:
+        raise HTTPException(status_code=404, detail=f"User {user} is not in disabled list")
+    
+    enable_at = load_enable_at()
+    enable_at[user] = time.time() + seconds
+    save_disabled_users(disabled, enable_at)
+    
+    return {"success": True, "message": f"User {user} will be enabled in {seconds} seconds"}
+
+
 @app.delete("/users/disabled", tags=["Disabled Users"])
 async def enable_all_disabled_users(username: str = Depends(verify_credentials)):
     """Enable all disabled users (clear the disabled list)"""
@@ -439,6 +471,33 @@ async def enable_all_disabled_users(username: str = Depends(verify_credentials))
     return {"success": True, "message": f"Cleared {count} users from disabled list"}
 
 
+# ═══════════════════════════════════════════════════════════════
+# Routes - IP History
+# ═══════════════════════════════════════════════════════════════
+
+@app.get("/ip-history", tags=["IP History"])
+async def get_ip_history(
+    hours: int = Query(12, ge=1, le=48),
+    username: str = Depends(verify_credentials),
+):
+    """List users who exceeded their IP limit within the last `hours`"""
+    from utils.ip_history_tracker import ip_history_tracker
+    
+    users_data = await ip_history_tracker.get_users_exceeding_limits(hours, load_config())
+    
+    data = [
+        {
+            "username": user,
+            "unique_ips": ip_count,
+            "limit": limit,
+            "ips": sorted(ips),
+        }
+        for user, ip_count, limit, ips in users_data
+    ]
+    
+    return {"success": True, "hours": hours, "data": data}
+
+
 # ═══════════════════════════════════════════════════════════════
 # Routes - Configuration
 # ═══════════════════════════════════════════════════════════════
@@ -21,7 +21,10 @@ from db.models import (
     SubnetISP,
     ViolationHistory,
     Config,
+    ConfigVersion,
     IPHistory,
+    WarningState,
+    WarningHistory,
 )
 
 from db.crud import (
@@ -32,7 +35,10 @@ from db.crud import (
     SubnetISPCRUD,
     ViolationHistoryCRUD,
     ConfigCRUD,
+    ConfigVersionCRUD,
     IPHistoryCRUD,
+    WarningStateCRUD,
+    WarningHistoryCRUD,
 )
 
 __all__ = [
@@ -52,7 +58,10 @@ __all__ = [
     "SubnetISP",
     "ViolationHistory",
     "Config",
+    "ConfigVersion",
     "IPHistory",
+    "WarningState",
+    "WarningHistory",
     # CRUD
     "UserCRUD",
     "UserLimitCRUD",
@@ -61,5 +70,8 @@ __all__ = [
     "SubnetISPCRUD",
     "ViolationHistoryCRUD",
     "ConfigCRUD",
+    "ConfigVersionCRUD",
     "IPHistoryCRUD",
+    "WarningStateCRUD",
+    "WarningHistoryCRUD",
 ]
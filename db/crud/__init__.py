@@ -24,11 +24,14 @@ from db.crud.subnet_isp import SubnetISPCRUD
 from db.crud.violations import ViolationHistoryCRUD
 
 # Config operations
-from db.crud.config import ConfigCRUD
+from db.crud.config import ConfigCRUD, ConfigVersionCRUD
 
 # IP history operations
 from db.crud.ip_history import IPHistoryCRUD
 
+# Warning system operations
+from db.crud.warnings import WarningStateCRUD, WarningHistoryCRUD
+
 __all__ = [
     "UserCRUD",
     "UserLimitCRUD",
@@ -37,5 +40,8 @@ __all__ = [
     "SubnetISPCRUD",
     "ViolationHistoryCRUD",
     "ConfigCRUD",
+    "ConfigVersionCRUD",
     "IPHistoryCRUD",
+    "WarningStateCRUD",
+    "WarningHistoryCRUD",
 ]
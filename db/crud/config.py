@@ -1,17 +1,58 @@
 """
-Config CRUD operations (key-value store).
+Config CRUD operations (key-value store) and config section versions.
 """
 
 from datetime import datetime
+from typing import Dict
 
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.models import Config
+from db.models import Config, ConfigVersion
 from utils.logs import get_logger
 
 db_config_logger = get_logger("db.config")
 
+# Config sections tracked by ConfigVersion
+SECTION_CONFIG = "config"
+SECTION_LIMITS = "limits"
+SECTION_EXCEPT_USERS = "except_users"
+
+
+class ConfigVersionCRUD:
+    """Change counters per config section (see ConfigVersion)."""
+    
+    @staticmethod
+    async def bump(db: AsyncSession, section: str):
+        """Increment a section's version in the caller's transaction."""
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert_fn = sqlite_insert if dialect == "sqlite" else pg_insert
+            stmt = insert_fn(ConfigVersion).values(section=section, version=1)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["section"],
+                set_={"version": ConfigVersion.version + 1},
+            )
+            await db.execute(stmt)
+        else:
+            result = await db.execute(
+                update(ConfigVersion)
+                .where(ConfigVersion.section == section)
+                .values(version=ConfigVersion.version + 1)
+            )
+            if result.rowcount == 0:
+                db.add(ConfigVersion(section=section, version=1))
+                await db.flush()
+        db_config_logger.debug(f"🔢 Bumped config version: {section}")
+    
+    @staticmethod
+    async def get_all(db: AsyncSession) -> Dict[str, int]:
+        """Get all section versions as {section: version} (missing sections are version 0)."""
+        result = await db.execute(select(ConfigVersion.section, ConfigVersion.version))
+        return {section: version for section, version in result.all()}
+
 
 class ConfigCRUD:
     """CRUD operations for Config table (key-value store)."""
@@ -33,6 +74,7 @@ class ConfigCRUD:
             db.add(config)
         
         await db.flush()
+        await ConfigVersionCRUD.bump(db, SECTION_CONFIG)
         db_config_logger.debug(f"✅ Config {key} set")
         return config
     
@@ -51,6 +93,7 @@ class ConfigCRUD:
         result = await db.execute(delete(Config).where(Config.key == key))
         deleted = result.rowcount > 0
         if deleted:
+            await ConfigVersionCRUD.bump(db, SECTION_CONFIG)
             db_config_logger.info(f"✅ Deleted config: {key}")
         return deleted
     
@@ -7,6 +7,7 @@ from typing import Optional, List
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from db.crud.config import ConfigVersionCRUD, SECTION_EXCEPT_USERS
 from db.models import ExceptUser
 from utils.logs import get_logger
 
@@ -33,6 +34,7 @@ class ExceptUserCRUD:
             db.add(except_user)
         
         await db.flush()
+        await ConfigVersionCRUD.bump(db, SECTION_EXCEPT_USERS)
         db_except_logger.info(f"✅ User {username} added to exception list")
         return except_user
     
@@ -43,6 +45,7 @@ class ExceptUserCRUD:
         result = await db.execute(delete(ExceptUser).where(ExceptUser.username == username))
         removed = result.rowcount > 0
         if removed:
+            await ConfigVersionCRUD.bump(db, SECTION_EXCEPT_USERS)
             db_except_logger.info(f"✅ User {username} removed from exception list")
         else:
             db_except_logger.debug(f"ℹ️ User {username} was not in exception list")
@@ -59,8 +62,8 @@ class ExceptUserCRUD:
     async def get_all(db: AsyncSession) -> List[str]:
         """Get all excepted usernames."""
         db_except_logger.debug("📋 Getting all excepted usernames")
-        result = await db.execute(select(ExceptUser))
-        users = [eu.username for eu in result.scalars().all()]
+        result = await db.execute(select(ExceptUser.username))
+        users = list(result.scalars().all())
         db_except_logger.debug(f"✅ Found {len(users)} excepted users")
         return users
     
@@ -3,9 +3,11 @@ IP History CRUD operations.
 """
 
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List, Set, Tuple
 
-from sqlalchemy import select, delete, and_
+from sqlalchemy import select, delete, and_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.models import IPHistory
@@ -13,6 +15,12 @@ from utils.logs import get_logger
 
 db_ip_logger = get_logger("db.ip_history")
 
+# (username, ip, node_name, inbound_protocol, seen_at)
+IPObservation = Tuple[str, str, Optional[str], Optional[str], datetime]
+
+# Rows per INSERT statement - keeps bound parameters under SQLite's limit
+UPSERT_CHUNK_SIZE = 100
+
 
 class IPHistoryCRUD:
     """CRUD operations for IPHistory table."""
@@ -55,6 +63,109 @@ class IPHistoryCRUD:
         await db.flush()
         return history
     
+    @staticmethod
+    async def record_batch(db: AsyncSession, observations: Iterable[IPObservation]) -> int:
+        """
+        Upsert a batch of IP observations.
+        
+        Uses INSERT ... ON CONFLICT (username, ip) DO UPDATE so a whole
+        check cycle is written with one statement per chunk instead of a
+        SELECT + UPDATE/INSERT round trip per IP.
+        
+        Returns:
+            Number of distinct (username, ip) pairs written
+        """
+        # Collapse duplicates within the batch - one row per (username, ip)
+        rows: Dict[Tuple[str, str], dict] = {}
+        for username, ip, node_name, inbound_protocol, seen_at in observations:
+            row = rows.get((username, ip))
+            if row is None:
+                rows[(username, ip)] = {
+                    "username": username,
+                    "ip": ip,
+                    "node_name": node_name,
+                    "inbound_protocol": inbound_protocol,
+                    "first_seen": seen_at,
+                    "last_seen": seen_at,
+                    "connection_count": 1,
+                }
+            else:
+                row["last_seen"] = max(row["last_seen"], seen_at)
+                row["node_name"] = node_name or row["node_name"]
+                row["inbound_protocol"] = inbound_protocol or row["inbound_protocol"]
+        
+        if not rows:
+            return 0
+        
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            insert_fn = sqlite_insert
+        elif dialect == "postgresql":
+            insert_fn = pg_insert
+        else:
+            for row in rows.values():
+                await IPHistoryCRUD.record_ip(
+                    db, row["username"], row["ip"], row["node_name"], row["inbound_protocol"]
+                )
+            return len(rows)
+        
+        values = list(rows.values())
+        for start in range(0, len(values), UPSERT_CHUNK_SIZE):
+            stmt = insert_fn(IPHistory).values(values[start:start + UPSERT_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["username", "ip"],
+                set_={
+                    "last_seen": stmt.excluded.last_seen,
+                    "connection_count": IPHistory.connection_count + 1,
+                    "node_name": func.coalesce(stmt.excluded.node_name, IPHistory.node_name),
+                    "inbound_protocol": func.coalesce(
+                        stmt.excluded.inbound_protocol, IPHistory.inbound_protocol
+                    ),
+                },
+            )
+            await db.execute(stmt)
+        
+        db_ip_logger.debug(f"📝 Upserted {len(values)} IP observations")
+        return len(values)
+    
+    @staticmethod
+    async def get_ips_since(
+        db: AsyncSession,
+        hours: int,
+        min_ips: int = 0,
+    ) -> Dict[str, Set[str]]:
+        """
+        Get the IPs seen per user within the specified hours.
+        
+        Args:
+            hours: Time window to look back
+            min_ips: Only return users with more than this many distinct IPs
+            
+        Returns:
+            Dict mapping username to set of IPs
+        """
+        db_ip_logger.debug(f"🔍 Getting IPs for all users (last {hours}h, > {min_ips} IPs)")
+        cutoff = datetime.utcnow() - timedelta(hours=hours)
+        stmt = select(IPHistory.username, IPHistory.ip).where(IPHistory.last_seen >= cutoff)
+        
+        if min_ips > 0:
+            # Filter in SQL so only users above the threshold are materialized
+            candidates = (
+                select(IPHistory.username)
+                .where(IPHistory.last_seen >= cutoff)
+                .group_by(IPHistory.username)
+                .having(func.count(IPHistory.ip) > min_ips)
+            )
+            stmt = stmt.where(IPHistory.username.in_(candidates))
+        
+        result = await db.execute(stmt)
+        ips_by_user: Dict[str, Set[str]] = {}
+        for username, ip in result.all():
+            ips_by_user.setdefault(username, set()).add(ip)
+        
+        db_ip_logger.debug(f"✅ Found IPs for {len(ips_by_user)} users")
+        return ips_by_user
+    
     @staticmethod
     async def get_user_ips(db: AsyncSession, username: str, hours: int = 24) -> List[IPHistory]:
         """Get IPs for a user within the specified hours."""
@@ -75,10 +186,11 @@ class IPHistoryCRUD:
         return ips
     
     @staticmethod
-    async def cleanup_old(db: AsyncSession, days: int = 7) -> int:
-        """Remove IP history older than specified days."""
-        db_ip_logger.debug(f"🧹 Cleaning up IP history older than {days} days")
-        cutoff = datetime.utcnow() - timedelta(days=days)
+    async def cleanup_old(db: AsyncSession, days: int = 7, hours: Optional[int] = None) -> int:
+        """Remove IP history older than specified days (or hours, if given)."""
+        window = timedelta(hours=hours) if hours is not None else timedelta(days=days)
+        db_ip_logger.debug(f"🧹 Cleaning up IP history older than {window}")
+        cutoff = datetime.utcnow() - window
         result = await db.execute(delete(IPHistory).where(IPHistory.last_seen < cutoff))
         if result.rowcount > 0:
             db_ip_logger.info(f"✅ Cleaned up {result.rowcount} old IP records")
@@ -8,6 +8,7 @@ from typing import Optional
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from db.crud.config import ConfigVersionCRUD, SECTION_LIMITS
 from db.models import UserLimit
 from utils.logs import get_logger
 
@@ -34,6 +35,7 @@ class UserLimitCRUD:
             db.add(user_limit)
         
         await db.flush()
+        await ConfigVersionCRUD.bump(db, SECTION_LIMITS)
         db_limits_logger.info(f"✅ Limit set for {username}: {limit}")
         return user_limit
     
@@ -53,9 +55,8 @@ class UserLimitCRUD:
     async def get_all(db: AsyncSession) -> dict[str, int]:
         """Get all special limits as a dictionary."""
         db_limits_logger.debug("📋 Getting all special limits")
-        result = await db.execute(select(UserLimit))
-        limits = result.scalars().all()
-        limits_dict = {ul.username: ul.limit for ul in limits}
+        result = await db.execute(select(UserLimit.username, UserLimit.limit))
+        limits_dict = {username: limit for username, limit in result.all()}
         db_limits_logger.debug(f"✅ Retrieved {len(limits_dict)} special limits")
         return limits_dict
     
@@ -66,6 +67,7 @@ class UserLimitCRUD:
         result = await db.execute(delete(UserLimit).where(UserLimit.username == username))
         deleted = result.rowcount > 0
         if deleted:
+            await ConfigVersionCRUD.bump(db, SECTION_LIMITS)
             db_limits_logger.info(f"✅ Deleted special limit for {username}")
         else:
             db_limits_logger.debug(f"ℹ️ No special limit found for {username}")
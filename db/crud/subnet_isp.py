@@ -3,9 +3,9 @@ Subnet ISP Cache CRUD operations.
 """
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy import select, delete, func
+from sqlalchemy import select, delete, func, bindparam
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.models import SubnetISP
@@ -30,21 +30,38 @@ class SubnetISPCRUD:
     
     @staticmethod
     async def get_by_ip(db: AsyncSession, ip: str) -> Optional[SubnetISP]:
-        """Get ISP info for an IP (looks up by subnet)."""
+        """
+        Get ISP info for an IP (looks up by subnet).
+        Read-only: hit counts are recorded separately with add_hits.
+        """
         subnet = SubnetISPCRUD.get_subnet_from_ip(ip)
         db_isp_logger.debug(f"🔍 Looking up ISP for {ip} (subnet: {subnet})")
         result = await db.execute(select(SubnetISP).where(SubnetISP.subnet == subnet))
         isp = result.scalar_one_or_none()
         
         if isp:
-            isp.hit_count += 1
-            await db.flush()
             db_isp_logger.debug(f"✅ Cache hit for {subnet}: {isp.isp}")
         else:
             db_isp_logger.debug(f"❌ Cache miss for {subnet}")
         
         return isp
     
+    @staticmethod
+    async def get_by_subnets(db: AsyncSession, subnets: Iterable[str]) -> Dict[str, SubnetISP]:
+        """
+        Get ISP info for many subnets with a single IN query.
+        Read-only: hit counts are recorded separately with add_hits.
+        """
+        subnets = list(subnets)
+        if not subnets:
+            return {}
+        db_isp_logger.debug(f"🔍 Looking up ISP for {len(subnets)} subnets")
+        result = await db.execute(select(SubnetISP).where(SubnetISP.subnet.in_(subnets)))
+        found = {row.subnet: row for row in result.scalars().all()}
+        
+        db_isp_logger.debug(f"✅ {len(found)}/{len(subnets)} subnets cached")
+        return found
+    
     @staticmethod
     async def get_by_subnet(db: AsyncSession, subnet: str) -> Optional[SubnetISP]:
         """Get ISP info by subnet directly."""
@@ -52,6 +69,55 @@ class SubnetISPCRUD:
         result = await db.execute(select(SubnetISP).where(SubnetISP.subnet == subnet))
         return result.scalar_one_or_none()
     
+    @staticmethod
+    async def get_all(db: AsyncSession) -> List[SubnetISP]:
+        """Get all cached subnets."""
+        db_isp_logger.debug("📋 Getting all cached subnets")
+        result = await db.execute(select(SubnetISP))
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def stream_all(
+        db: AsyncSession, batch_size: int = 1000
+    ) -> AsyncIterator[Tuple[int, str, Optional[str], Optional[str], Optional[str], Optional[str]]]:
+        """
+        Stream every cached subnet as plain (id, subnet, isp, country, city, region)
+        tuples from a single query, without building ORM objects.
+        """
+        db_isp_logger.debug("📋 Streaming all cached subnets")
+        result = await db.stream(
+            select(
+                SubnetISP.id,
+                SubnetISP.subnet,
+                SubnetISP.isp,
+                SubnetISP.country,
+                SubnetISP.city,
+                SubnetISP.region,
+            ).execution_options(yield_per=batch_size)
+        )
+        async for row in result:
+            yield tuple(row)
+    
+    @staticmethod
+    async def add_hits(db: AsyncSession, hits: Dict[int, int]) -> int:
+        """
+        Add aggregated hit counts in bulk.
+        
+        Args:
+            hits: {subnet_isp id: hits to add}
+        """
+        if not hits:
+            return 0
+        table = SubnetISP.__table__
+        await db.execute(
+            table.update()
+            .where(table.c.id == bindparam("row_id"))
+            .values(hit_count=table.c.hit_count + bindparam("hits")),
+            [{"row_id": row_id, "hits": count} for row_id, count in hits.items()],
+        )
+        db_isp_logger.debug(f"📝 Added hit counts for {len(hits)} subnets")
+        return len(hits)
+    
     @staticmethod
     async def cache_isp(
         db: AsyncSession,
@@ -3,7 +3,7 @@ Violation History CRUD operations.
 """
 
 import time
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from sqlalchemy import select, delete, func, and_
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -25,12 +25,13 @@ class ViolationHistoryCRUD:
         disable_duration: int,
         ip_count: Optional[int] = None,
         ips: Optional[List[str]] = None,
+        timestamp: Optional[float] = None,
     ) -> ViolationHistory:
-        """Add a violation record."""
+        """Add a violation record (timestamp defaults to now)."""
         db_violations_logger.debug(f"📝 Adding violation for {username}: step={step_applied}, duration={disable_duration}min")
         violation = ViolationHistory(
             username=username,
-            timestamp=time.time(),
+            timestamp=timestamp if timestamp is not None else time.time(),
             step_applied=step_applied,
             disable_duration=disable_duration,
             ip_count=ip_count,
@@ -46,8 +47,9 @@ class ViolationHistoryCRUD:
         db: AsyncSession,
         username: str,
         window_hours: int = 72,
+        limit: Optional[int] = None,
     ) -> List[ViolationHistory]:
-        """Get violations for a user within the time window."""
+        """Get violations for a user within the time window, newest first."""
         db_violations_logger.debug(f"🔍 Getting violations for {username} (last {window_hours}h)")
         cutoff = time.time() - (window_hours * 3600)
         result = await db.execute(
@@ -59,6 +61,7 @@ class ViolationHistoryCRUD:
                 )
             )
             .order_by(ViolationHistory.timestamp.desc())
+            .limit(limit)
         )
         violations = result.scalars().all()
         db_violations_logger.debug(f"✅ Found {len(violations)} violations for {username}")
@@ -86,6 +89,31 @@ class ViolationHistoryCRUD:
         db_violations_logger.debug(f"✅ {username} has {count} violations")
         return count
     
+    @staticmethod
+    async def get_window_stats(
+        db: AsyncSession,
+        username: str,
+        since: float,
+    ) -> Tuple[int, Optional[float]]:
+        """
+        Count a user's violations since `since` and the oldest timestamp among them.
+        A single range scan on the (username, timestamp) index.
+        """
+        result = await db.execute(
+            select(
+                func.count(ViolationHistory.id),  # pylint: disable=not-callable
+                func.min(ViolationHistory.timestamp),
+            )
+            .where(
+                and_(
+                    ViolationHistory.username == username,
+                    ViolationHistory.timestamp >= since,
+                )
+            )
+        )
+        count, oldest = result.one()
+        return count or 0, oldest
+    
     @staticmethod
     async def clear_user(db: AsyncSession, username: str) -> int:
         """Clear all violations for a user."""
@@ -0,0 +1,128 @@
+"""
+Warning State and Warning History CRUD operations.
+"""
+
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import WarningState, WarningHistory
+from utils.logs import get_logger
+
+db_warnings_logger = get_logger("db.warnings")
+
+
+class WarningStateCRUD:
+    """CRUD operations for WarningState table."""
+
+    @staticmethod
+    async def get_all(db: AsyncSession) -> Dict[str, dict]:
+        """Get all warning states as {username: data}."""
+        db_warnings_logger.debug("📋 Getting all warning states")
+        result = await db.execute(select(WarningState.username, WarningState.data))
+        return {username: data for username, data in result.all()}
+
+    @staticmethod
+    async def upsert_many(db: AsyncSession, states: Dict[str, dict]) -> int:
+        """
+        Insert or update warning states for the given users only.
+
+        Args:
+            states: {username: serialized warning}
+
+        Returns:
+            Number of rows written
+        """
+        if not states:
+            return 0
+
+        now = time.time()
+        rows = [
+            {
+                "username": username,
+                "data": data,
+                "monitoring_end_time": data.get("monitoring_end_time", now),
+                "updated_at": now,
+            }
+            for username, data in states.items()
+        ]
+
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert_fn = sqlite_insert if dialect == "sqlite" else pg_insert
+            stmt = insert_fn(WarningState).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["username"],
+                set_={
+                    "data": stmt.excluded.data,
+                    "monitoring_end_time": stmt.excluded.monitoring_end_time,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+            await db.execute(stmt)
+        else:
+            for row in rows:
+                result = await db.execute(
+                    select(WarningState).where(WarningState.username == row["username"])
+                )
+                state = result.scalar_one_or_none()
+                if state:
+                    state.data = row["data"]
+                    state.monitoring_end_time = row["monitoring_end_time"]
+                    state.updated_at = row["updated_at"]
+                else:
+                    db.add(WarningState(**row))
+            await db.flush()
+
+        db_warnings_logger.debug(f"📝 Upserted {len(rows)} warning states")
+        return len(rows)
+
+    @staticmethod
+    async def delete_many(db: AsyncSession, usernames: Iterable[str]) -> int:
+        """Delete warning states for the given users."""
+        usernames = list(usernames)
+        if not usernames:
+            return 0
+        result = await db.execute(delete(WarningState).where(WarningState.username.in_(usernames)))
+        db_warnings_logger.debug(f"🗑️ Deleted {result.rowcount} warning states")
+        return result.rowcount
+
+
+class WarningHistoryCRUD:
+    """CRUD operations for WarningHistory table."""
+
+    @staticmethod
+    async def add_many(db: AsyncSession, entries: Iterable[Tuple[str, float]]) -> int:
+        """Add (username, timestamp) warning history entries."""
+        rows = [{"username": username, "timestamp": ts} for username, ts in entries]
+        if not rows:
+            return 0
+        await db.execute(WarningHistory.__table__.insert(), rows)
+        db_warnings_logger.debug(f"📝 Added {len(rows)} warning history entries")
+        return len(rows)
+
+    @staticmethod
+    async def get_since(db: AsyncSession, cutoff: float) -> Dict[str, List[float]]:
+        """Get warning timestamps newer than cutoff as {username: [timestamps]}."""
+        db_warnings_logger.debug("📋 Getting warning history")
+        result = await db.execute(
+            select(WarningHistory.username, WarningHistory.timestamp)
+            .where(WarningHistory.timestamp > cutoff)
+            .order_by(WarningHistory.timestamp)
+        )
+        history: Dict[str, List[float]] = {}
+        for username, ts in result.all():
+            history.setdefault(username, []).append(ts)
+        return history
+
+    @staticmethod
+    async def cleanup_old(db: AsyncSession, cutoff: float) -> int:
+        """Remove warning history entries older than cutoff."""
+        result = await db.execute(delete(WarningHistory).where(WarningHistory.timestamp <= cutoff))
+        if result.rowcount > 0:
+            db_warnings_logger.info(f"✅ Cleaned up {result.rowcount} old warning history entries")
+        return result.rowcount
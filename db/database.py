@@ -5,8 +5,9 @@ Uses async SQLAlchemy with aiosqlite for SQLite.
 
 import os
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict
 
+from sqlalchemy import event, inspect
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
@@ -25,6 +26,69 @@ DATABASE_URL = os.environ.get(
     "sqlite+aiosqlite:///./data/pg_limiter.db"
 )
 
+# SQLite performance profiles - PRAGMAs applied to every new connection.
+# "performance" uses WAL so readers don't block the writer and commits
+# don't fsync the whole journal; "default" keeps SQLite's own settings.
+SQLITE_PROFILES: Dict[str, Dict[str, str]] = {
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": str(256 * 1024 * 1024),
+        "cache_size": str(-64 * 1024),  # Negative = KiB, i.e. 64 MiB
+        "busy_timeout": "5000",
+        "temp_store": "MEMORY",
+    },
+    "default": {},
+}
+
+# Env overrides for individual PRAGMAs (e.g. SQLITE_SYNCHRONOUS=FULL)
+SQLITE_PRAGMA_ENV = {
+    "journal_mode": "SQLITE_JOURNAL_MODE",
+    "synchronous": "SQLITE_SYNCHRONOUS",
+    "mmap_size": "SQLITE_MMAP_SIZE",
+    "cache_size": "SQLITE_CACHE_SIZE",
+    "busy_timeout": "SQLITE_BUSY_TIMEOUT",
+    "temp_store": "SQLITE_TEMP_STORE",
+}
+
+
+def get_sqlite_pragmas(profile: str = None) -> Dict[str, str]:
+    """
+    Resolve the PRAGMAs to apply for a profile.
+    
+    Args:
+        profile: Profile name; defaults to the SQLITE_PROFILE env var
+            ("performance" if unset)
+    """
+    if profile is None:
+        profile = os.environ.get("SQLITE_PROFILE", "performance")
+    if profile not in SQLITE_PROFILES:
+        db_logger.warning(f"⚠️ Unknown SQLITE_PROFILE '{profile}', using 'performance'")
+        profile = "performance"
+    
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for pragma, env_var in SQLITE_PRAGMA_ENV.items():
+        value = os.environ.get(env_var)
+        if value:
+            pragmas[pragma] = value
+    return pragmas
+
+
+def apply_sqlite_pragmas(sync_engine, pragmas: Dict[str, str]):
+    """Register a connect hook that applies `pragmas` to each new connection"""
+    if not pragmas:
+        return
+    
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
+
+
 # For SQLite, use StaticPool for better async support
 if DATABASE_URL.startswith("sqlite"):
     db_logger.debug(f"📦 Using SQLite database: {DATABASE_URL}")
@@ -34,6 +98,9 @@ if DATABASE_URL.startswith("sqlite"):
         connect_args={"check_same_thread": False},
         poolclass=StaticPool,
     )
+    sqlite_pragmas = get_sqlite_pragmas()
+    apply_sqlite_pragmas(engine.sync_engine, sqlite_pragmas)
+    db_logger.debug(f"⚙️ SQLite PRAGMAs: {sqlite_pragmas}")
 else:
     db_logger.debug(f"📦 Using external database: {DATABASE_URL}")
     engine = create_async_engine(
@@ -54,6 +121,24 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+async def get_schema_state() -> str:
+    """
+    How the database schema is managed.
+    
+    Returns:
+        "empty" (no tables yet), "versioned" (has Alembic history) or
+        "legacy" (tables built by create_all without Alembic history)
+    """
+    def _state(sync_conn) -> str:
+        tables = set(inspect(sync_conn).get_table_names())
+        if not tables:
+            return "empty"
+        return "versioned" if "alembic_version" in tables else "legacy"
+    
+    async with engine.connect() as conn:
+        return await conn.run_sync(_state)
+
+
 async def init_db():
     """
     Initialize the database - create all tables.
@@ -0,0 +1,36 @@
+"""Make (username, ip) unique in ip_history for batched upserts
+
+Revision ID: 002_ip_history_unique
+Revises: 001_initial
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '002_ip_history_unique'
+down_revision: Union[str, None] = '001_initial'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep only the most recent row for each (username, ip) pair
+    op.execute(
+        """
+        DELETE FROM ip_history
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM ip_history GROUP BY username, ip
+        )
+        """
+    )
+    op.drop_index('ix_ip_history_username_ip', table_name='ip_history')
+    op.create_index('ix_ip_history_username_ip', 'ip_history', ['username', 'ip'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ip_history_username_ip', table_name='ip_history')
+    op.create_index('ix_ip_history_username_ip', 'ip_history', ['username', 'ip'], unique=False)
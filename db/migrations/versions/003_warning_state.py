@@ -0,0 +1,58 @@
+"""Add warning_states and warning_history tables
+
+Revision ID: 003_warning_state
+Revises: 002_ip_history_unique
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '003_warning_state'
+down_revision: Union[str, None] = '002_ip_history_unique'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # init_db (create_all) may have created the tables already
+    existing_tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'warning_states' not in existing_tables:
+        _create_warning_states()
+    if 'warning_history' not in existing_tables:
+        _create_warning_history()
+
+
+def _create_warning_states() -> None:
+    op.create_table(
+        'warning_states',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('username', sa.String(length=255), nullable=False),
+        sa.Column('data', sa.JSON(), nullable=False),
+        sa.Column('monitoring_end_time', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_warning_states_username', 'warning_states', ['username'], unique=True)
+
+
+def _create_warning_history() -> None:
+    op.create_table(
+        'warning_history',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('username', sa.String(length=255), nullable=False),
+        sa.Column('timestamp', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_warning_history_username', 'warning_history', ['username'], unique=False)
+    op.create_index('ix_warning_history_timestamp', 'warning_history', ['timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_table('warning_history')
+    op.drop_table('warning_states')
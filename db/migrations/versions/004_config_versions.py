@@ -0,0 +1,36 @@
+"""Add config_versions table for per-section config change tracking
+
+Revision ID: 004_config_versions
+Revises: 003_warning_state
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '004_config_versions'
+down_revision: Union[str, None] = '003_warning_state'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # init_db (create_all) may have created the table already
+    if 'config_versions' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'config_versions',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('section', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_config_versions_section', 'config_versions', ['section'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table('config_versions')
@@ -0,0 +1,34 @@
+"""Add (username, timestamp) index on violation_history for windowed counts
+
+Revision ID: 005_violation_username_timestamp
+Revises: 004_config_versions
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '005_violation_username_timestamp'
+down_revision: Union[str, None] = '004_config_versions'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # init_db may have created the index already
+    existing = sa.inspect(op.get_bind()).get_indexes('violation_history')
+    if any(index['name'] == 'ix_violation_history_username_timestamp' for index in existing):
+        return
+    op.create_index(
+        'ix_violation_history_username_timestamp',
+        'violation_history',
+        ['username', 'timestamp'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_violation_history_username_timestamp', table_name='violation_history')
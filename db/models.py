@@ -201,6 +201,8 @@ class ViolationHistory(Base):
     
     __table_args__ = (
         Index("ix_violation_history_timestamp", "timestamp"),
+        # Windowed per-user counts for the punishment system
+        Index("ix_violation_history_username_timestamp", "username", "timestamp"),
     )
     
     def __repr__(self):
@@ -224,6 +226,22 @@ class Config(Base):
         return f"<Config(key='{self.key}')>"
 
 
+class ConfigVersion(Base):
+    """
+    Change counter per configuration section (config, limits, except_users).
+    Bumped by every CRUD write so readers can tell which sections changed
+    with a single small query.
+    """
+    __tablename__ = "config_versions"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    section = Column(String(50), unique=True, nullable=False, index=True)
+    version = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<ConfigVersion(section='{self.section}', version={self.version})>"
+
+
 class IPHistory(Base):
     """
     IP history for users - tracks which IPs each user has used.
@@ -247,9 +265,50 @@ class IPHistory(Base):
     connection_count = Column(Integer, default=1)
     
     __table_args__ = (
-        Index("ix_ip_history_username_ip", "username", "ip"),
+        Index("ix_ip_history_username_ip", "username", "ip", unique=True),
         Index("ix_ip_history_last_seen", "last_seen"),
     )
     
     def __repr__(self):
         return f"<IPHistory(username='{self.username}', ip='{self.ip}')>"
+
+
+class WarningState(Base):
+    """
+    Active monitoring warning for a user.
+    One row per monitored user so changes are written per user
+    instead of rewriting every warning.
+    """
+    __tablename__ = "warning_states"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    username = Column(String(255), unique=True, nullable=False, index=True)
+    
+    # Serialized UserWarning fields
+    data = Column(JSON, nullable=False)
+    
+    # Timestamps (unix)
+    monitoring_end_time = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+    
+    def __repr__(self):
+        return f"<WarningState(username='{self.username}')>"
+
+
+class WarningHistory(Base):
+    """
+    Warning history for the warning system's trust score.
+    One row per warning-triggered disable; rows older than 24 hours are compacted away.
+    """
+    __tablename__ = "warning_history"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    username = Column(String(255), nullable=False, index=True)
+    timestamp = Column(Float, nullable=False)  # Unix timestamp
+    
+    __table_args__ = (
+        Index("ix_warning_history_timestamp", "timestamp"),
+    )
+    
+    def __repr__(self):
+        return f"<WarningHistory(username='{self.username}', timestamp={self.timestamp})>"
@@ -9,8 +9,9 @@ import time
 import traceback
 
 from run_telegram import run_telegram_bot
+from telegram_bot.dispatcher import get_dispatcher
 from telegram_bot.send_message import send_logs
-from utils.check_usage import run_check_users_usage
+from utils.check_usage import run_check_users_usage, warning_system
 from utils.get_logs import (
     TASKS,
     check_and_add_new_nodes,
@@ -20,6 +21,7 @@ from utils.get_logs import (
     init_node_status_message,
 )
 from utils.handel_dis_users import DisabledUsers
+from utils.isp_cache import get_isp_cache
 from utils.logs import logger, log_startup_info, log_shutdown_info, get_logger
 from utils.panel_api import (
     enable_dis_user,
@@ -36,8 +38,17 @@ try:
 except ImportError:
     REDIS_AVAILABLE = False
 
+# Import database-backed subnet ISP cache
+try:
+    from utils.db_handler import DB_AVAILABLE, get_db_ip_history, get_db_subnet_cache
+except ImportError:
+    DB_AVAILABLE = False
+
 VERSION = "0.5.1"
 
+# Seconds each write-behind buffer may take to flush on shutdown
+SHUTDOWN_FLUSH_TIMEOUT = 10
+
 # Main logger
 main_logger = get_logger("limiter.main")
 
@@ -50,7 +61,36 @@ args = parser.parse_args()
 dis_obj = DisabledUsers()
 
 
+async def flush_pending_writes():
+    """Persist write-behind buffers before the event loop closes"""
+    if DB_AVAILABLE:
+        try:
+            await asyncio.wait_for(get_db_ip_history().flush(), SHUTDOWN_FLUSH_TIMEOUT)
+        except Exception as e:  # pylint: disable=broad-except
+            main_logger.warning(f"IP history flush on shutdown failed: {e}")
+    try:
+        await asyncio.wait_for(get_isp_cache().flush(), SHUTDOWN_FLUSH_TIMEOUT)
+    except Exception as e:  # pylint: disable=broad-except
+        main_logger.warning(f"ISP cache flush on shutdown failed: {e}")
+    try:
+        await asyncio.wait_for(warning_system.flush(), SHUTDOWN_FLUSH_TIMEOUT)
+    except Exception as e:  # pylint: disable=broad-except
+        main_logger.warning(f"Warning state flush on shutdown failed: {e}")
+    try:
+        await asyncio.wait_for(get_dispatcher().drain(), SHUTDOWN_FLUSH_TIMEOUT)
+    except Exception as e:  # pylint: disable=broad-except
+        main_logger.warning(f"Telegram notification drain on shutdown failed: {e}")
+
+
 async def main():
+    """Run the limiter, flushing pending writes when it stops."""
+    try:
+        await run_limiter()
+    finally:
+        await flush_pending_writes()
+
+
+async def run_limiter():
     """Main function to run the limiter."""
     log_startup_info("Limiter", f"v{VERSION}")
     main_logger.info(f"🚀 Starting Limiter v{VERSION}")
@@ -69,6 +109,14 @@ async def main():
     else:
         main_logger.info("ℹ Redis cache module not available, using in-memory cache")
     
+    # Preload the ISP subnet cache so lookups need no DB I/O
+    if DB_AVAILABLE:
+        try:
+            subnet_count = await get_db_subnet_cache().preload()
+            main_logger.info(f"✓ ISP subnet cache preloaded ({subnet_count} subnets)")
+        except Exception as e:
+            main_logger.warning(f"ISP subnet cache preload failed: {e}")
+    
     # Start Telegram bot
     main_logger.debug("Starting Telegram bot task...")
     asyncio.create_task(run_telegram_bot())
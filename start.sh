@@ -44,6 +44,39 @@ echo "    Panel: $PANEL_DOMAIN"
 echo "    Bot Token: ${BOT_TOKEN:0:10}..."
 echo "    Admin IDs: $ADMIN_IDS"
 
+# Databases built by init_db (create_all) before migrations were tracked have
+# no Alembic history. Their tables match the initial migration, so they are
+# stamped there and upgraded: later migrations such as the ip_history
+# (username, ip) dedupe then run once, like on any other database.
+SCHEMA_STATE=$(python -c "
+import asyncio
+from db.database import get_schema_state
+print(asyncio.run(get_schema_state()))
+" 2>/dev/null | tail -n 1)
+
+MIGRATE=1
+if [ "$SCHEMA_STATE" = "legacy" ]; then
+    echo "Stamping database created without migrations..."
+    if MIGRATION_OUTPUT=$(python -m alembic stamp 001_initial 2>&1); then
+        log_info "Database stamped at the initial migration"
+    else
+        log_warn "Stamping failed, migrations skipped: $MIGRATION_OUTPUT"
+        MIGRATE=0
+    fi
+fi
+
+# Run database migrations (before init_db, so migrations create their own tables)
+if [ $MIGRATE -eq 1 ]; then
+    echo "Running database migrations..."
+    MIGRATION_OUTPUT=$(python -m alembic upgrade head 2>&1)
+    MIGRATION_EXIT=$?
+    if [ $MIGRATION_EXIT -eq 0 ]; then
+        log_info "Migrations applied"
+    else
+        log_warn "Migrations skipped: $MIGRATION_OUTPUT"
+    fi
+fi
+
 # Initialize database
 echo "Initializing database..."
 if python -c "
@@ -57,16 +90,6 @@ else
     exit 1
 fi
 
-# Run database migrations
-echo "Running database migrations..."
-MIGRATION_OUTPUT=$(python -m alembic upgrade head 2>&1)
-MIGRATION_EXIT=$?
-if [ $MIGRATION_EXIT -eq 0 ]; then
-    log_info "Migrations applied"
-else
-    log_warn "Migrations skipped: $MIGRATION_OUTPUT"
-fi
-
 # Migrate from JSON to database if old JSON files exist
 if [ -f "/app/.disable_users.json" ] || [ -f "/app/.violation_history.json" ]; then
     echo "Migrating data from JSON files to database..."
@@ -0,0 +1,271 @@
+"""
+Outbound notification dispatcher.
+
+Notifications are queued and returned from immediately; a background task
+sends them to every admin. Small plain messages queued close together are
+merged into one digest message, and every send goes through a global token
+bucket (Telegram allows ~30 messages/s per bot) plus a per-chat bucket
+(~1 message/s per chat). A RetryAfter from Telegram pauses the chat for the
+requested time before retrying.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from utils.logs import get_logger
+from utils.loop_local import LoopLocal
+from utils.rate_governor import TokenBucket
+
+tg_dispatch_logger = get_logger("telegram.dispatch")
+
+# Bot-wide and per-chat send rates (messages per second) and burst sizes
+GLOBAL_RATE = 30.0
+GLOBAL_BURST = 30
+CHAT_RATE = 1.0
+CHAT_BURST = 3
+
+# How long to wait for more messages to merge into a digest
+DIGEST_WINDOW = 0.5
+# Digest messages stay below Telegram's 4096 character limit
+MAX_DIGEST_CHARS = 3900
+DIGEST_SEPARATOR = "\n\n"
+
+SEND_ATTEMPTS = 2
+# RetryAfter answers honoured per message before giving up
+MAX_RETRY_AFTER = 5
+
+
+@dataclass
+class Notification:
+    """A queued message for all admins"""
+    text: str
+    reply_markup: Any = None
+    # Resolved with (message_id, chat_id) of the first admin's copy
+    result: Optional[asyncio.Future] = None
+
+    @property
+    def mergeable(self) -> bool:
+        """Plain messages nobody waits on can be merged into a digest"""
+        return (
+            self.reply_markup is None
+            and self.result is None
+            and len(self.text) <= MAX_DIGEST_CHARS
+        )
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Seconds Telegram asked us to wait, if `error` is a RetryAfter"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        return None
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class NotificationDispatcher:
+    """
+    Rate-aware background sender for admin notifications.
+
+    Args:
+        get_admins: Coroutine returning the admin chat ids
+        send: Coroutine sending one message: send(chat_id, text, reply_markup)
+    """
+
+    def __init__(
+        self,
+        get_admins: Callable[[], Awaitable[Optional[List[int]]]],
+        send: Callable[[int, str, Any], Awaitable[Any]],
+    ):
+        self._get_admins = get_admins
+        self._send = send
+        self._queue: Deque[Notification] = deque()
+        # Recreated per event loop; _idle starts set while nothing is queued
+        self._wakeup = LoopLocal(asyncio.Event)
+        self._idle = LoopLocal(self._new_idle_event)
+        self._task: Optional[asyncio.Task] = None
+        self._global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        # chat_id -> monotonic time until which Telegram asked us to back off
+        self._chat_paused_until: Dict[int, float] = {}
+        self._stats = {"queued": 0, "sent": 0, "merged": 0, "failed": 0}
+
+    def _new_idle_event(self) -> asyncio.Event:
+        idle = asyncio.Event()
+        if not self._queue:
+            idle.set()
+        return idle
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self._stats, "pending": self.pending}
+
+    def enqueue(self, text: str, reply_markup: Any = None, want_message_id: bool = False) -> Optional[asyncio.Future]:
+        """
+        Queue a message for all admins and return at once.
+
+        Returns:
+            With want_message_id, a future resolved with (message_id, chat_id)
+            of the first admin's copy (or None if nothing was sent)
+        """
+        result = asyncio.get_running_loop().create_future() if want_message_id else None
+        self._queue.append(Notification(text, reply_markup, result))
+        self._stats["queued"] += 1
+        self._idle.get().clear()
+        self._wakeup.get().set()
+        self._ensure_running()
+        return result
+
+    async def drain(self):
+        """Wait until every queued notification has been sent"""
+        if self._queue:
+            self._ensure_running()
+        await self._idle.get().wait()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def acquire(self, chat_id: int):
+        """Wait for a send slot in `chat_id` (for edits and other direct calls)"""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST)
+        loop = asyncio.get_running_loop()
+        while True:
+            wait = max(
+                self._chat_paused_until.get(chat_id, 0.0) - loop.time(),
+                bucket.time_until_token(),
+                self._global_bucket.time_until_token(),
+            )
+            if wait <= 0:
+                bucket.take()
+                self._global_bucket.take()
+                return
+            await asyncio.sleep(wait)
+
+    def forget_removed_chats(self, old: List[int], new: List[int]):
+        """Drop rate limit state of chats that are no longer admins"""
+        for chat_id in set(old) - set(new):
+            self._chat_buckets.pop(chat_id, None)
+            self._chat_paused_until.pop(chat_id, None)
+
+    def report_retry_after(self, chat_id: int, seconds: float):
+        """Pause a chat after Telegram answered with RetryAfter"""
+        until = asyncio.get_running_loop().time() + seconds
+        self._chat_paused_until[chat_id] = max(self._chat_paused_until.get(chat_id, 0.0), until)
+        tg_dispatch_logger.warning(f"⏳ Telegram rate limit for chat {chat_id}, pausing {seconds:.0f}s")
+
+    async def _run(self):
+        idle = self._idle.get()
+        wakeup = self._wakeup.get()
+        while True:
+            if not self._queue:
+                idle.set()
+                wakeup.clear()
+                try:
+                    # asyncio.timeout rather than wait_for: wait_for can swallow
+                    # the loop shutdown's cancel when the wakeup fires at once
+                    async with asyncio.timeout(60):
+                        await wakeup.wait()
+                except TimeoutError:
+                    if not self._queue:
+                        return
+                continue
+
+            # Give a burst a moment to arrive so it can be merged
+            if self._queue[0].mergeable:
+                await asyncio.sleep(DIGEST_WINDOW)
+
+            batch = list(self._queue)
+            self._queue.clear()
+            for notification in self._coalesce(batch):
+                try:
+                    await self._deliver(notification)
+                except Exception as e:  # pylint: disable=broad-except
+                    tg_dispatch_logger.error(f"❌ Failed to deliver notification: {e}")
+                    if notification.result and not notification.result.done():
+                        notification.result.set_result(None)
+
+    def _coalesce(self, batch: List[Notification]) -> List[Notification]:
+        """Merge runs of mergeable notifications into digests, keeping order"""
+        merged: List[Notification] = []
+        for notification in batch:
+            previous = merged[-1] if merged else None
+            if (
+                previous is not None
+                and previous.mergeable
+                and notification.mergeable
+                and len(previous.text) + len(DIGEST_SEPARATOR) + len(notification.text) <= MAX_DIGEST_CHARS
+            ):
+                merged[-1] = Notification(previous.text + DIGEST_SEPARATOR + notification.text)
+                self._stats["merged"] += 1
+            else:
+                merged.append(notification)
+        return merged
+
+    async def _deliver(self, notification: Notification):
+        """Send one notification to every admin concurrently"""
+        admins = await self._get_admins()
+        if not admins:
+            tg_dispatch_logger.warning("⚠️ No admins found to send message")
+            if notification.result and not notification.result.done():
+                notification.result.set_result(None)
+            return
+
+        results = await asyncio.gather(
+            *(self._send_to_chat(chat_id, notification) for chat_id in admins)
+        )
+        if notification.result and not notification.result.done():
+            first = next((info for info in results if info is not None), None)
+            notification.result.set_result(first)
+
+    async def _send_to_chat(self, chat_id: int, notification: Notification) -> Optional[Tuple[int, int]]:
+        attempt = 0
+        rate_limited = 0
+        while attempt < SEND_ATTEMPTS and rate_limited < MAX_RETRY_AFTER:
+            await self.acquire(chat_id)
+            try:
+                sent_message = await self._send(chat_id, notification.text, notification.reply_markup)
+            except Exception as e:  # pylint: disable=broad-except
+                retry_after = _retry_after_seconds(e)
+                if retry_after is not None:
+                    # Not counted as a failed attempt - Telegram told us when to retry
+                    rate_limited += 1
+                    self.report_retry_after(chat_id, retry_after)
+                    continue
+                attempt += 1
+                tg_dispatch_logger.warning(f"⚠️ Attempt {attempt}/{SEND_ATTEMPTS} failed for admin {chat_id}: {e}")
+                continue
+            self._stats["sent"] += 1
+            tg_dispatch_logger.debug(f"✅ Message sent to admin {chat_id}")
+            return (getattr(sent_message, "message_id", None), chat_id)
+        self._stats["failed"] += 1
+        return None
+
+
+_dispatcher: Optional[NotificationDispatcher] = None
+
+
+async def _bot_send(chat_id: int, text: str, reply_markup: Any = None):
+    # Import application here to get the updated instance
+    from telegram_bot.main import application
+    return await application.bot.sendMessage(
+        chat_id=chat_id, text=text, parse_mode="HTML", reply_markup=reply_markup
+    )
+
+
+def get_dispatcher() -> NotificationDispatcher:
+    """Get or create the shared notification dispatcher"""
+    global _dispatcher
+    if _dispatcher is None:
+        from telegram_bot.utils import admin_registry, check_admin
+        _dispatcher = NotificationDispatcher(check_admin, _bot_send)
+        admin_registry.subscribe(_dispatcher.forget_removed_chats)
+    return _dispatcher
@@ -216,7 +216,7 @@ async def user_violations(update: Update, context: ContextTypes.DEFAULT_TYPE):
         system = get_punishment_system()
         system.load_config(config_data)
 
-        status = system.get_user_status(username)
+        status = await system.get_user_status(username)
 
         if status["violation_count"] == 0:
             await update.message.reply_html(
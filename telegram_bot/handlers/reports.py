@@ -8,7 +8,9 @@ import asyncio
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 
+from telegram_bot.keyboards import create_active_report_keyboard
 from telegram_bot.utils import check_admin, add_admin_to_config
+from utils.active_report import active_users_report
 from utils.read_config import read_config
 from utils.connection_analyzer import (
     generate_connection_report,
@@ -279,3 +281,22 @@ async def ip_history_48h_command(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text(f"Error generating report: {str(e)}")
         import traceback
         traceback.print_exc()
+
+
+async def show_active_report_page(query, page: int = 0):
+    """Show a page of the latest active users report in place of the current message."""
+    text = active_users_report.render_page(page)
+    if text is None and page > 0:
+        # The report shrank since the button was sent - show the first page
+        page = 0
+        text = active_users_report.render_page(page)
+    if text is None:
+        text = "✅ No users over their limit in the latest check."
+
+    reply_markup = create_active_report_keyboard(page, active_users_report.has_page(page + 1))
+    try:
+        await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode="HTML")
+    except Exception as e:  # pylint: disable=broad-except
+        # Refreshing an unchanged page is rejected as "message is not modified"
+        if "not modified" not in str(e):
+            raise
@@ -4,6 +4,8 @@ Contains all settings-related handlers for panel, intervals, and configuration.
 """
 
 import json
+from functools import lru_cache
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ContextTypes,
@@ -37,6 +39,7 @@ from telegram_bot.keyboards import (
 from utils.read_config import read_config, save_config_value
 
 
+@lru_cache(maxsize=None)
 def create_back_to_settings_keyboard():
     """Create a keyboard with only a back to settings button."""
     keyboard = [
@@ -45,6 +48,7 @@ def create_back_to_settings_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_country_keyboard():
     """Create country code options keyboard."""
     keyboard = [
@@ -61,6 +65,7 @@ def create_country_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_interval_keyboard():
     """Create check interval options keyboard."""
     keyboard = [
@@ -75,6 +80,7 @@ def create_interval_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_time_to_active_keyboard():
     """Create time to active options keyboard."""
     keyboard = [
@@ -89,6 +95,7 @@ def create_time_to_active_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_enhanced_details_keyboard():
     """Create enhanced details toggle keyboard."""
     keyboard = [
@@ -101,6 +108,7 @@ def create_enhanced_details_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_single_ip_keyboard():
     """Create single IP users toggle keyboard."""
     keyboard = [
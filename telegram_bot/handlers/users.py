@@ -4,6 +4,8 @@ Includes functions for except users, disabled users management, and cleanup.
 """
 
 import time
+from functools import lru_cache
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ContextTypes,
@@ -28,6 +30,7 @@ from telegram_bot.keyboards import (
 from utils.read_config import read_config
 
 
+@lru_cache(maxsize=None)
 def create_back_to_users_keyboard():
     """Create a simple back to users menu keyboard."""
     keyboard = [
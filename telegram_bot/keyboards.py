@@ -1,12 +1,18 @@
 """
 Telegram Bot Keyboards
 Contains all inline keyboard builders.
+
+Markups are immutable, so each builder is cached and returns the same
+prebuilt InlineKeyboardMarkup for the same arguments.
 """
 
+from functools import lru_cache
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram_bot.constants import CallbackData
 
 
+@lru_cache(maxsize=None)
 def create_main_menu_keyboard():
     """Create the main menu inline keyboard."""
     keyboard = [
@@ -30,6 +36,7 @@ def create_main_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_settings_menu_keyboard():
     """Create the settings menu inline keyboard."""
     keyboard = [
@@ -59,6 +66,7 @@ def create_settings_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_limits_menu_keyboard():
     """Create the limits menu inline keyboard."""
     keyboard = [
@@ -81,6 +89,7 @@ def create_limits_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_users_menu_keyboard():
     """Create the users menu inline keyboard."""
     keyboard = [
@@ -105,6 +114,7 @@ def create_users_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_monitoring_menu_keyboard():
     """Create the monitoring menu inline keyboard."""
     keyboard = [
@@ -122,6 +132,7 @@ def create_monitoring_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_reports_menu_keyboard():
     """Create the reports menu inline keyboard."""
     keyboard = [
@@ -143,6 +154,7 @@ def create_reports_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_admin_menu_keyboard():
     """Create the admin management menu inline keyboard."""
     keyboard = [
@@ -160,6 +172,7 @@ def create_admin_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_country_keyboard():
     """Create country code selection keyboard."""
     keyboard = [
@@ -178,6 +191,7 @@ def create_country_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_interval_keyboard():
     """Create check interval selection keyboard."""
     keyboard = [
@@ -196,6 +210,7 @@ def create_interval_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_time_to_active_keyboard():
     """Create time to active selection keyboard."""
     keyboard = [
@@ -214,6 +229,7 @@ def create_time_to_active_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_enhanced_details_keyboard():
     """Create enhanced details toggle keyboard."""
     keyboard = [
@@ -228,6 +244,7 @@ def create_enhanced_details_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_disable_method_keyboard():
     """Create disable method selection keyboard."""
     keyboard = [
@@ -244,6 +261,7 @@ def create_disable_method_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_punishment_menu_keyboard(enabled: bool = False):
     """Create punishment system menu keyboard."""
     toggle_text = "🔴 Disable" if enabled else "🟢 Enable"
@@ -266,6 +284,7 @@ def create_punishment_menu_keyboard(enabled: bool = False):
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_back_keyboard(callback_data: str = CallbackData.BACK_MAIN):
     """Create a simple back button keyboard."""
     keyboard = [
@@ -274,6 +293,7 @@ def create_back_keyboard(callback_data: str = CallbackData.BACK_MAIN):
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_confirmation_keyboard(confirm_data: str, cancel_data: str = CallbackData.BACK_MAIN):
     """Create a confirmation keyboard with Yes/No buttons."""
     keyboard = [
@@ -285,6 +305,7 @@ def create_confirmation_keyboard(confirm_data: str, cancel_data: str = CallbackD
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_back_to_main_keyboard():
     """Create a simple back to main menu keyboard."""
     keyboard = [
@@ -293,6 +314,7 @@ def create_back_to_main_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_special_limit_options_keyboard():
     """Create special limit options keyboard."""
     keyboard = [
@@ -306,6 +328,7 @@ def create_special_limit_options_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def create_general_limit_keyboard():
     """Create general limit options keyboard."""
     keyboard = [
@@ -318,3 +341,56 @@ def create_general_limit_keyboard():
         [InlineKeyboardButton("« Back to Limits", callback_data=CallbackData.LIMITS_MENU)],
     ]
     return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=1024)
+def create_enable_user_keyboard(username: str):
+    """Create the Enable button sent with a disable notification."""
+    keyboard = [
+        [InlineKeyboardButton(f"✅ Enable {username}", callback_data=f"enable_user:{username}")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=256)
+def create_enable_users_keyboard(usernames: tuple):
+    """Create one Enable button per user for a disable digest, two per row."""
+    buttons = [
+        InlineKeyboardButton(f"✅ Enable {username}", callback_data=f"enable_user:{username}")
+        for username in usernames
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=1024)
+def create_set_limit_keyboard(username: str, device_count: int):
+    """Create the Set limit / Add to except buttons for a user over the general limit."""
+    keyboard = [
+        [
+            InlineKeyboardButton(f"📱 Set {device_count} limit", callback_data=f"set_limit:{username}:{device_count}"),
+            InlineKeyboardButton("🚫 Add to except", callback_data=f"add_except:{username}"),
+        ]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=None)
+def create_report_summary_keyboard():
+    """Create the button that opens the full active users report."""
+    keyboard = [
+        [InlineKeyboardButton("📄 Full report", callback_data="active_report_page:0")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=128)
+def create_active_report_keyboard(page: int, has_next: bool):
+    """Create the navigation buttons for a page of the active users report."""
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"active_report_page:{page-1}"))
+    nav_buttons.append(InlineKeyboardButton("🔄 Refresh", callback_data=f"active_report_page:{page}"))
+    if has_next:
+        nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"active_report_page:{page+1}"))
+    return InlineKeyboardMarkup([nav_buttons])
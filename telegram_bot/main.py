@@ -112,6 +112,7 @@ from telegram_bot.handlers.reports import (
     users_by_protocol_command,
     ip_history_12h_command,
     ip_history_48h_command,
+    show_active_report_page,
 )
 from telegram_bot.handlers.backup import (
     send_backup,
@@ -330,6 +331,11 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
         await show_disabled_users_menu(query, page=page)
         return
     
+    if data.startswith("active_report_page:"):
+        page = int(data.split(":", 1)[1])
+        await show_active_report_page(query, page=page)
+        return
+    
     # Fallback for unhandled callbacks
     await query.edit_message_text(
         text=f"⚠️ Unhandled callback: {data}",
@@ -3,7 +3,7 @@ Send logs to telegram bot.
 """
 
 from utils.logs import get_logger
-from telegram_bot.utils import check_admin
+from telegram_bot.dispatcher import get_dispatcher
 
 tg_send_logger = get_logger("telegram.send")
 
@@ -12,44 +12,24 @@ async def send_logs(msg, return_message_id=False, reply_markup=None):
     """
     Send logs to all admins.
     
+    The message is queued on the notification dispatcher, which sends it in
+    the background (see telegram_bot.dispatcher); this returns immediately
+    unless the message id is requested.
+    
     Args:
         msg: The message to send
-        return_message_id: If True, returns the message_id of the first admin's message
+        return_message_id: If True, waits for the send and returns the message_id of the first admin's message
         reply_markup: Optional InlineKeyboardMarkup for buttons
         
     Returns:
         If return_message_id is True, returns (message_id, chat_id) tuple or None
         Otherwise returns None
     """
-    # Import application here to get the updated instance
-    from telegram_bot.main import application
-    
-    admins = await check_admin()
-    retries = 2
-    first_message_info = None
-    
-    tg_send_logger.debug(f"📤 Sending log to {len(admins)} admins ({len(msg)} chars)")
-    
-    if admins:
-        for admin in admins:
-            for attempt in range(retries):
-                try:
-                    sent_message = await application.bot.sendMessage(
-                        chat_id=admin, text=msg, parse_mode="HTML",
-                        reply_markup=reply_markup
-                    )
-                    # Store the first successful message info for editing later
-                    if first_message_info is None and return_message_id:
-                        first_message_info = (sent_message.message_id, admin)
-                    tg_send_logger.debug(f"✅ Message sent to admin {admin}")
-                    break
-                except Exception as e:  # pylint: disable=broad-except
-                    tg_send_logger.warning(f"⚠️ Attempt {attempt + 1}/{retries} failed for admin {admin}: {e}")
-    else:
-        tg_send_logger.warning("⚠️ No admins found to send message")
+    tg_send_logger.debug(f"📤 Queueing log for admins ({len(msg)} chars)")
+    result = get_dispatcher().enqueue(msg, reply_markup=reply_markup, want_message_id=return_message_id)
     
     if return_message_id:
-        return first_message_info
+        return await result
     return None
 
 
@@ -72,6 +52,7 @@ async def edit_message(message_info, new_text):
     from telegram_bot.main import application
     
     tg_send_logger.debug(f"✏️ Editing message {message_id} in chat {chat_id}")
+    await get_dispatcher().acquire(chat_id)
     try:
         await application.bot.edit_message_text(
             chat_id=chat_id,
@@ -94,15 +75,37 @@ async def send_disable_notification(msg: str, username: str):
         msg: The message text to send
         username: The username that was disabled
     """
-    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    from telegram_bot.keyboards import create_enable_user_keyboard
     
     tg_send_logger.debug(f"🚫 Sending disable notification for {username}")
-    keyboard = [
-        [InlineKeyboardButton(f"✅ Enable {username}", callback_data=f"enable_user:{username}")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    await send_logs(msg, reply_markup=create_enable_user_keyboard(username))
+
+
+async def send_disable_digest(msg: str, usernames: list[str]):
+    """
+    Send a digest of disabled users with an Enable button per user.
     
-    await send_logs(msg, reply_markup=reply_markup)
+    Args:
+        msg: The digest text
+        usernames: The usernames that were disabled
+    """
+    from telegram_bot.keyboards import create_enable_users_keyboard
+    
+    tg_send_logger.debug(f"🚫 Sending disable digest for {len(usernames)} users")
+    await send_logs(msg, reply_markup=create_enable_users_keyboard(tuple(usernames)))
+
+
+async def send_report_summary(msg: str):
+    """
+    Send the active users report summary with a button to browse the full report.
+    
+    Args:
+        msg: The summary text
+    """
+    from telegram_bot.keyboards import create_report_summary_keyboard
+    
+    tg_send_logger.debug("📊 Sending active users report summary")
+    await send_logs(msg, reply_markup=create_report_summary_keyboard())
 
 
 async def send_user_message(msg: str, username: str, device_count: int, has_special_limit: bool, is_except: bool):
@@ -117,35 +120,13 @@ async def send_user_message(msg: str, username: str, device_count: int, has_spec
         has_special_limit: Whether user already has a special limit set
         is_except: Whether user is in except list
     """
-    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-    from telegram_bot.main import application
+    from telegram_bot.keyboards import create_set_limit_keyboard
     
     tg_send_logger.debug(f"📤 Sending user message for {username} (devices: {device_count})")
-    admins = await check_admin()
-    retries = 2
     
-    # Create inline keyboard if user doesn't have special limit and is not except
+    # Show buttons only if user doesn't have special limit and is not except
     reply_markup = None
     if not has_special_limit and not is_except:
-        keyboard = [
-            [
-                InlineKeyboardButton(f"📱 Set {device_count} limit", callback_data=f"set_limit:{username}:{device_count}"),
-                InlineKeyboardButton("🚫 Add to except", callback_data=f"add_except:{username}"),
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    if admins:
-        for admin in admins:
-            for attempt in range(retries):
-                try:
-                    await application.bot.sendMessage(
-                        chat_id=admin, 
-                        text=msg, 
-                        parse_mode="HTML",
-                        reply_markup=reply_markup
-                    )
-                    tg_send_logger.debug(f"✅ User message sent to admin {admin}")
-                    break
-                except Exception as e:
-                    tg_send_logger.warning(f"⚠️ Attempt {attempt + 1}/{retries} failed for admin {admin}: {e}")
+        reply_markup = create_set_limit_keyboard(username, device_count)
+    
+    await send_logs(msg, reply_markup=reply_markup)
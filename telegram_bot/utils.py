@@ -6,7 +6,9 @@ handling special limits for users, and interacting with the database.
 import json
 import os
 import sys
+from typing import Callable, List, Optional
 
+from utils.logs import get_logger
 from utils.types import PanelType
 
 try:
@@ -22,6 +24,77 @@ try:
 except ImportError:
     DB_AVAILABLE = False
 
+tg_utils_logger = get_logger("telegram.utils")
+
+
+def _admins_from_env() -> Optional[List[int]]:
+    """Admin IDs from the ADMIN_IDS environment variable, None if unset or invalid"""
+    admin_ids_env = os.environ.get("ADMIN_IDS", "")
+    if admin_ids_env:
+        try:
+            return [int(id.strip()) for id in admin_ids_env.split(",") if id.strip()]
+        except ValueError:
+            pass
+    return None
+
+
+class AdminRegistry:
+    """
+    In-memory admin list.
+
+    Loaded once from ADMIN_IDS (Docker deployment) or config.json, then kept
+    up to date by the bot's own config.json writes, so admin checks never
+    touch the file. Listeners are called with (old, new) admin lists when
+    the list changes.
+    """
+
+    def __init__(self):
+        self._admins: Optional[List[int]] = None
+        self._listeners: List[Callable[[List[int], List[int]], None]] = []
+
+    def _load(self) -> List[int]:
+        admins = _admins_from_env()
+        if admins is not None:
+            return admins
+        # Fall back to config.json for non-Docker deployments
+        if os.path.exists("config.json"):
+            try:
+                with open("config.json", "r", encoding="utf-8") as f:
+                    return list(json.load(f).get("telegram", {}).get("admins", []))
+            except (OSError, ValueError) as e:
+                tg_utils_logger.error(f"❌ Could not read admins from config.json: {e}")
+        return []
+
+    def get(self) -> List[int]:
+        if self._admins is None:
+            self._admins = self._load()
+        return list(self._admins)
+
+    def set(self, admins: List[int]):
+        """Replace the admin list (ignored while ADMIN_IDS manages admins)"""
+        if _admins_from_env() is not None:
+            return
+        old = self.get()
+        self._admins = [int(admin) for admin in admins]
+        if old != self._admins:
+            tg_utils_logger.info(f"👑 Admin list changed: {len(old)} -> {len(self._admins)} admins")
+            for listener in self._listeners:
+                try:
+                    listener(old, list(self._admins))
+                except Exception as e:  # pylint: disable=broad-except
+                    tg_utils_logger.error(f"❌ Admin change listener failed: {e}")
+
+    def subscribe(self, listener: Callable[[List[int], List[int]], None]):
+        """Call `listener(old, new)` whenever the admin list changes"""
+        self._listeners.append(listener)
+
+    def invalidate(self):
+        """Reload from ADMIN_IDS / config.json on next access"""
+        self._admins = None
+
+
+admin_registry = AdminRegistry()
+
 
 async def get_token(panel_data: PanelType) -> PanelType | ValueError:
     """
@@ -70,6 +143,7 @@ async def write_json_file(data: dict):
     """
     with open("config.json", "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
+    admin_registry.set(data.get("telegram", {}).get("admins", []))
 
 
 async def add_admin_to_config(new_admin_id: int) -> int | None:
@@ -119,25 +193,13 @@ async def add_admin_to_config(new_admin_id: int) -> int | None:
 async def check_admin() -> list[int] | None:
     """
     Checks and returns the list of admins.
-    First checks ADMIN_IDS environment variable, then falls back to config.json.
+    Comes from the in-memory admin registry (ADMIN_IDS environment variable,
+    falling back to config.json).
 
     Returns:
         The list of admins.
     """
-    # First check environment variable (Docker deployment)
-    admin_ids_env = os.environ.get("ADMIN_IDS", "")
-    if admin_ids_env:
-        try:
-            return [int(id.strip()) for id in admin_ids_env.split(",") if id.strip()]
-        except ValueError:
-            pass
-    
-    # Fall back to config.json for non-Docker deployments
-    if os.path.exists("config.json"):
-        data = await read_json_file()
-        return data.get("telegram", {}).get("admins", [])
-    
-    return []
+    return admin_registry.get()
 
 
 async def handel_special_limit(username: str, limit: int) -> list:
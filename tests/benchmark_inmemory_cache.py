@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark the in-memory cache fallback against the previous implementation.
+
+The previous InMemoryCache (one asyncio.Lock around a single dict, lazy
+expiry only) is reproduced below for the operations the limiter uses on its
+hot paths. Both caches run the same mixed workload from many concurrent
+tasks, the way the limiter, Telegram bot and ISP lookups share it.
+
+Usage:
+    python tests/benchmark_inmemory_cache.py [operations] [tasks]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from utils.redis_cache import InMemoryCache
+
+
+class LegacyInMemoryCache:
+    """The previous lock-based InMemoryCache (hot-path methods only)."""
+
+    def __init__(self):
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self._lock:
+            import time
+            entry = self._cache.get(key)
+            if entry and (entry["expires_at"] == 0 or entry["expires_at"] > time.time()):
+                return entry["value"]
+            elif entry:
+                del self._cache[key]
+            return None
+
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
+        async with self._lock:
+            import time
+            expires_at = 0 if ex is None else time.time() + ex
+            self._cache[key] = {"value": value, "expires_at": expires_at}
+            return True
+
+    async def incr(self, key: str) -> int:
+        async with self._lock:
+            import time
+            entry = self._cache.get(key)
+            if entry and (entry["expires_at"] == 0 or entry["expires_at"] > time.time()):
+                try:
+                    new_val = int(entry["value"]) + 1
+                    entry["value"] = str(new_val)
+                    return new_val
+                except ValueError:
+                    return 1
+            self._cache[key] = {"value": "1", "expires_at": 0}
+            return 1
+
+    async def hset(self, name: str, key: str, value: str) -> int:
+        async with self._lock:
+            if name not in self._cache:
+                self._cache[name] = {"value": {}, "expires_at": 0}
+            entry = self._cache[name]
+            if not isinstance(entry["value"], dict):
+                entry["value"] = {}
+            is_new = key not in entry["value"]
+            entry["value"][key] = value
+            return 1 if is_new else 0
+
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        async with self._lock:
+            entry = self._cache.get(name)
+            if entry and isinstance(entry["value"], dict):
+                return entry["value"].get(key)
+            return None
+
+
+async def worker(cache, worker_id: int, operations: int):
+    """Mixed workload: ISP reads/writes, batch reads, counters and hashes"""
+    for i in range(operations):
+        subnet = f"pg_limiter:isp:10.{worker_id % 256}.{i % 256}"
+        op = i % 6
+        if op == 0:
+            await cache.set(subnet, '{"isp": "Example"}', ex=604800)
+        elif op == 1:
+            await cache.get(subnet)
+        elif op == 2:
+            await cache.mget([f"pg_limiter:isp:10.{worker_id % 256}.{n}" for n in range(10)])
+        elif op == 3:
+            await cache.incr(f"pg_limiter:counter:{i % 50}")
+        elif op == 4:
+            await cache.hset("pg_limiter:disabled_users", f"user{i % 500}", str(time.time()))
+        else:
+            await cache.hget("pg_limiter:disabled_users", f"user{i % 500}")
+
+
+async def run(cache, operations: int, tasks: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(cache, n, operations) for n in range(tasks)))
+    elapsed = time.perf_counter() - start
+    return operations * tasks / elapsed
+
+
+async def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tasks = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    print("=" * 60)
+    print(f"In-memory cache benchmark ({tasks} tasks x {operations} operations)")
+    print("=" * 60)
+
+    legacy = await run(LegacyInMemoryCache(), operations, tasks)
+    print(f"   {'lock-based (previous)':<30} {legacy:>12.0f} ops/s")
+
+    current_cache = InMemoryCache()
+    current = await run(current_cache, operations, tasks)
+    await current_cache.close()
+    print(f"   {'sharded, lock-free':<30} {current:>12.0f} ops/s")
+
+    print(f"\n📈 Speedup: {current / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
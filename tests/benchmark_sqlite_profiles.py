@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark SQLite write throughput for each performance profile.
+
+Runs the write patterns of the write-heavy tables (ip_history batched
+upserts, violation_history inserts, disabled_users add/remove) against a
+fresh database per profile, committing one session per operation the same
+way get_db() does.
+
+Usage:
+    python tests/benchmark_sqlite_profiles.py [operations]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Per-row CRUD logging would dominate the timings
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from db.database import SQLITE_PROFILES, apply_sqlite_pragmas, get_sqlite_pragmas
+from db.models import Base
+from db.crud import DisabledUserCRUD, IPHistoryCRUD, ViolationHistoryCRUD
+
+
+async def write_ip_history(session: AsyncSession, i: int):
+    now = datetime.utcnow()
+    rows = [
+        (f"user{(i * 7 + n) % 500}", f"10.0.{n}.{i % 250}", "node-1", "vless", now)
+        for n in range(20)
+    ]
+    await IPHistoryCRUD.record_batch(session, rows)
+
+
+async def write_violation(session: AsyncSession, i: int):
+    await ViolationHistoryCRUD.add(
+        session, username=f"user{i % 500}", step_applied=i % 4, disable_duration=10
+    )
+
+
+async def write_disabled_user(session: AsyncSession, i: int):
+    username = f"user{i % 200}"
+    if i % 2:
+        await DisabledUserCRUD.remove(session, username)
+    else:
+        await DisabledUserCRUD.add(session, username)
+
+
+WORKLOADS = {
+    "ip_history (20-row upsert)": write_ip_history,
+    "violation_history insert": write_violation,
+    "disabled_users add/remove": write_disabled_user,
+}
+
+
+async def run_profile(profile: str, operations: int) -> dict:
+    """Run every workload on a fresh database with the given profile"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        apply_sqlite_pragmas(engine.sync_engine, get_sqlite_pragmas(profile))
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        for name, workload in WORKLOADS.items():
+            start = time.perf_counter()
+            for i in range(operations):
+                async with session_factory() as session:
+                    await workload(session, i)
+                    await session.commit()
+            elapsed = time.perf_counter() - start
+            results[name] = operations / elapsed
+
+        await engine.dispose()
+    return results
+
+
+async def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    print("=" * 60)
+    print(f"SQLite profile benchmark ({operations} commits per workload)")
+    print("=" * 60)
+
+    all_results = {}
+    for profile in SQLITE_PROFILES:
+        print(f"\n⏱️  Profile: {profile} {get_sqlite_pragmas(profile) or '(SQLite defaults)'}")
+        all_results[profile] = await run_profile(profile, operations)
+        for name, rate in all_results[profile].items():
+            print(f"   {name:<30} {rate:>10.0f} commits/s")
+
+    baseline = all_results.get("default", {})
+    tuned = all_results.get("performance", {})
+    if baseline and tuned:
+        print("\n📈 Speedup (performance vs default):")
+        for name in WORKLOADS:
+            print(f"   {name:<30} {tuned[name] / baseline[name]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+"""
+Shared pytest fixtures.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import db.database as database  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point db.database at a fresh SQLite file and return its path"""
+    path = tmp_path / "test.db"
+    url = f"sqlite+aiosqlite:///{path}"
+    engine = create_async_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    monkeypatch.setattr(database, "DATABASE_URL", url)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False, autocommit=False, autoflush=False,
+    ))
+    yield path
+    asyncio.run(engine.dispose())
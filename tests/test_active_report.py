@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for the active users report: cycle diffing and page rendering.
+"""
+
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.active_report import ActiveUsersReport, ReportEntry  # noqa: E402
+
+
+def make_entry(email: str, device_count: int = 3, ip_count: int = 3, user_limit: int = 2) -> ReportEntry:
+    ips = tuple(f"10.0.0.{i}" for i in range(ip_count))
+    return ReportEntry(
+        email=email,
+        device_count=device_count,
+        ip_count=ip_count,
+        user_limit=user_limit,
+        has_special_limit=False,
+        is_except=False,
+        formatted_ips=ips,
+        ips=ips,
+    )
+
+
+def test_update_reports_new_changed_and_resolved_users():
+    report = ActiveUsersReport()
+    changes = report.update([make_entry("a"), make_entry("b")], 6, 6, 2)
+    assert [entry.email for entry in changes.new] == ["a", "b"]
+
+    # Same state again: nothing to report
+    assert not report.update([make_entry("a"), make_entry("b")], 6, 6, 2)
+
+    changes = report.update([make_entry("a", device_count=4, ip_count=4), make_entry("c")], 7, 7, 2)
+    assert [entry.email for entry in changes.new] == ["c"]
+    assert [(entry.email, previous) for entry, previous in changes.changed] == [("a", 3)]
+    assert changes.resolved == ["b"]
+
+
+def test_unchanged_blocks_are_not_rendered_again():
+    report = ActiveUsersReport()
+    report.update([make_entry("a"), make_entry("b")], 6, 6, 2)
+    report.render_page(0)
+    report.update([make_entry("a"), make_entry("b", ip_count=4)], 7, 7, 2)
+    report.render_page(0)
+    stats = report.get_stats()
+    assert stats["rendered"] == 3
+    assert stats["reused"] == 1
+
+
+def test_pages_fit_the_message_size():
+    report = ActiveUsersReport(max_page_chars=500)
+    report.update([make_entry(f"user{i}", ip_count=5) for i in range(20)], 60, 100, 2)
+    page = 0
+    seen = []
+    while report.has_page(page):
+        text = report.render_page(page)
+        assert len(text) <= 500
+        seen.extend(line for line in text.split("\n") if line.startswith("👤"))
+        page += 1
+    assert page > 1
+    assert len(seen) == 20
+    assert report.render_page(page) is None
+
+
+def test_oversized_block_is_cut_on_a_line_boundary():
+    report = ActiveUsersReport(max_page_chars=400)
+    report.update([make_entry("big", ip_count=60)], 60, 60, 2)
+    text = report.render_page(0)
+    assert len(text) <= 400
+    lines = text.split("\n")
+    assert lines[-1] == "…"
+    assert all(re.fullmatch(r"  • 10\.0\.0\.\d+", line) for line in lines[-4:-1])
+
+
+def test_full_snapshot_interval():
+    report = ActiveUsersReport()
+    assert report.full_snapshot_due(600, now=1000.0)
+    report.mark_full_snapshot(now=1000.0)
+    assert not report.full_snapshot_due(600, now=1599.0)
+    assert report.full_snapshot_due(600, now=1600.0)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the database-backed disabled users store (DBDisabledUsers).
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import utils.db_handler as db_handler  # noqa: E402
+from db import init_db  # noqa: E402
+from utils.db_handler import DBDisabledUsers  # noqa: E402
+
+
+class FakeClock:
+    """Stands in for the time module inside utils.db_handler"""
+
+    def __init__(self, now: float):
+        self.now = now
+        self.strftime = time.strftime
+        self.localtime = time.localtime
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_due_users_come_off_the_heaps_in_time(db_path, monkeypatch):
+    clock = FakeClock(10_000.0)
+    monkeypatch.setattr(db_handler, "time", clock)
+    asyncio.run(init_db())
+    store = DBDisabledUsers()
+
+    async def run():
+        await store.add_user("custom", duration_seconds=60)
+        await store.add_user("default")
+        clock.now += 30
+        await store.add_user("late")
+        due = [sorted(await store.get_users_to_enable(100))]
+
+        clock.now += 40  # custom is due
+        due.append(sorted(await store.get_users_to_enable(100)))
+        clock.now += 40  # default is due, late is not
+        due.append(sorted(await store.get_users_to_enable(100)))
+
+        # Due users stay due until they are removed
+        await store.remove_user("custom")
+        due.append(sorted(await store.get_users_to_enable(100)))
+        await store.flush()
+        return due
+
+    assert asyncio.run(run()) == [[], ["custom"], ["custom", "default"], ["default"]]
+
+
+def test_redisabled_user_is_not_due_by_stale_entry(db_path, monkeypatch):
+    clock = FakeClock(10_000.0)
+    monkeypatch.setattr(db_handler, "time", clock)
+    asyncio.run(init_db())
+    store = DBDisabledUsers()
+
+    async def run():
+        await store.add_user("alice", duration_seconds=10)
+        await store.remove_user("alice")
+        clock.now += 5
+        await store.add_user("alice", duration_seconds=60)
+        clock.now += 10
+        early = await store.get_users_to_enable(1000)
+        clock.now += 60
+        later = await store.get_users_to_enable(1000)
+        await store.flush()
+        return early, later
+
+    assert asyncio.run(run()) == ([], ["alice"])
+
+
+def test_changes_are_written_behind_and_reloaded(db_path, monkeypatch):
+    clock = FakeClock(10_000.0)
+    monkeypatch.setattr(db_handler, "time", clock)
+    asyncio.run(init_db())
+    store = DBDisabledUsers()
+
+    async def run():
+        await store.add_user("alice", duration_seconds=60, original_groups=["vip"], punishment_step=1)
+        await store.add_user("bob")
+        await store.remove_user("bob")
+        await store.flush()
+
+    asyncio.run(run())
+
+    reloaded = DBDisabledUsers()
+
+    async def reload():
+        await reloaded._ensure_initialized()
+        clock.now += 61
+        return await reloaded.get_users_to_enable(1000)
+
+    assert asyncio.run(reload()) == ["alice"]
+    assert reloaded.disabled_users == {"alice"}
+    assert reloaded.get_original_groups("alice") == ["vip"]
+    assert reloaded.get_punishment_step("alice") == 1
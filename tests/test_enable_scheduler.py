@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for the enable scheduler's delay queue.
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.enable_scheduler import EnableScheduler  # noqa: E402
+
+
+def test_pop_due_uses_custom_and_default_times():
+    scheduler = EnableScheduler(default_time_to_active=100)
+    scheduler.schedule("default", disabled_at=1000.0)
+    scheduler.schedule("custom", disabled_at=1000.0, enable_at=1050.0)
+    assert scheduler.next_due() == 1050.0
+    assert scheduler.pop_due(now=1060.0) == ["custom"]
+    assert scheduler.pop_due(now=1100.0) == ["default"]
+    assert len(scheduler) == 0
+
+
+def test_reschedule_and_cancel_skip_stale_entries():
+    scheduler = EnableScheduler(default_time_to_active=100)
+    scheduler.schedule("alice", disabled_at=1000.0)
+    scheduler.schedule("alice", disabled_at=1000.0, enable_at=1500.0)
+    scheduler.schedule("bob", disabled_at=1000.0)
+    scheduler.cancel("bob")
+    assert scheduler.pop_due(now=1200.0) == []
+    assert scheduler.pop_due(now=1500.0) == ["alice"]
+
+
+def test_wait_for_due_survives_loop_restarts():
+    scheduler = EnableScheduler(default_time_to_active=100)
+
+    async def wait_woken_by_schedule(username: str):
+        waiter = asyncio.create_task(scheduler.wait_for_due(timeout=5))
+        await asyncio.sleep(0.01)
+        # Already due: wakes the waiter instead of waiting out the timeout
+        scheduler.schedule(username, disabled_at=time.time() - 200)
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(wait_woken_by_schedule("first")) == ["first"]
+    assert asyncio.run(wait_woken_by_schedule("second")) == ["second"]
+
+
+def test_set_default_time_reschedules_default_users():
+    scheduler = EnableScheduler(default_time_to_active=100)
+    scheduler.schedule("default", disabled_at=1000.0)
+    scheduler.schedule("custom", disabled_at=1000.0, enable_at=1500.0)
+    scheduler.set_default_time(600)
+    assert scheduler.pop_due(now=1550.0) == ["custom"]
+    assert scheduler.pop_due(now=1600.0) == ["default"]
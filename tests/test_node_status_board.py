@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests for the node status board.
+Telegram is replaced by recording fakes.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import telegram_bot.send_message as send_message  # noqa: E402
+from utils.node_status_board import NodeStatusBoard  # noqa: E402
+
+
+def test_status_board_coalesces_updates(monkeypatch):
+    calls = []
+
+    async def fake_send_logs(text, return_message_id=False, reply_markup=None):
+        calls.append(("send", text))
+        return (100, 1)
+
+    async def fake_edit_message(message_info, text):
+        calls.append(("edit", text))
+        return True
+
+    monkeypatch.setattr(send_message, "send_logs", fake_send_logs)
+    monkeypatch.setattr(send_message, "edit_message", fake_edit_message)
+    board = NodeStatusBoard(interval=0.05)
+
+    async def run():
+        board.update(1, "node-1", "⏳ Connecting...")
+        board.update(2, "node-2", "⏳ Connecting...")
+        await asyncio.sleep(0.01)
+        for status in ("❌ Failed", "⏳ Connecting...", "✅ Connected"):
+            board.update(1, "node-1", status)
+            board.update(2, "node-2", status)
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert [kind for kind, _ in calls] == ["send", "edit"]
+    assert "Connected: 2 | Connecting: 0 | Failed: 0" in calls[-1][1]
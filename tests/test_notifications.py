@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the notification dispatcher.
+Telegram is replaced by recording fakes.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import telegram_bot.dispatcher as dispatcher  # noqa: E402
+
+
+def make_dispatcher(sent: list, admins=(1,)) -> dispatcher.NotificationDispatcher:
+    async def get_admins():
+        return list(admins)
+
+    async def send(chat_id, text, reply_markup):
+        sent.append((chat_id, text))
+        return SimpleNamespace(message_id=len(sent))
+
+    return dispatcher.NotificationDispatcher(get_admins, send)
+
+
+def test_plain_messages_are_merged_into_a_digest(monkeypatch):
+    monkeypatch.setattr(dispatcher, "DIGEST_WINDOW", 0.01)
+    sent = []
+    notifications = make_dispatcher(sent)
+
+    async def run():
+        notifications.enqueue("one")
+        notifications.enqueue("two")
+        notifications.enqueue("with button", reply_markup=object())
+        await asyncio.wait_for(notifications.drain(), 2)
+
+    asyncio.run(run())
+    assert sent == [(1, "one\n\ntwo"), (1, "with button")]
+    assert notifications.get_stats()["merged"] == 1
+
+
+def test_message_id_is_returned_for_the_first_admin(monkeypatch):
+    monkeypatch.setattr(dispatcher, "DIGEST_WINDOW", 0.01)
+    sent = []
+    notifications = make_dispatcher(sent, admins=(10, 20))
+
+    async def run():
+        return await asyncio.wait_for(notifications.enqueue("board", want_message_id=True), 2)
+
+    assert asyncio.run(run()) == (1, 10)
+    assert sorted(chat_id for chat_id, _ in sent) == [10, 20]
+
+
+def test_drain_across_loop_restarts(monkeypatch):
+    monkeypatch.setattr(dispatcher, "DIGEST_WINDOW", 0.01)
+    sent = []
+    notifications = make_dispatcher(sent)
+
+    async def run(tag: str):
+        # Nothing queued: returns at once in a fresh loop
+        await asyncio.wait_for(notifications.drain(), 1)
+        notifications.enqueue(f"{tag} sent")
+        await asyncio.wait_for(notifications.drain(), 2)
+        # Still queued when the loop ends
+        notifications.enqueue(f"{tag} left over")
+
+    asyncio.run(run("first"))
+    asyncio.run(run("second"))
+    asyncio.run(asyncio.wait_for(notifications.drain(), 2))
+    assert [text for _, text in sent] == [
+        "first sent", "first left over", "second sent", "second left over",
+    ]
+
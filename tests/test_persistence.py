@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Tests for IP history persistence and the migrations it relies on.
+
+Each test runs against its own SQLite file (the db_path fixture in conftest.py).
+"""
+
+import asyncio
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+
+import utils.db_handler as db_handler  # noqa: E402
+from db import init_db  # noqa: E402
+from db.database import get_schema_state  # noqa: E402
+from utils.db_handler import DBIPHistory  # noqa: E402
+from utils.ip_history_tracker import IPHistoryTracker  # noqa: E402
+
+
+def alembic_config(path: Path) -> Config:
+    config = Config()
+    config.set_main_option("script_location", str(ROOT / "db" / "migrations"))
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{path}")
+    return config
+
+
+def create_legacy_database(path: Path):
+    """A database as init_db built it before migrations were tracked"""
+    command.upgrade(alembic_config(path), "001_initial")
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE alembic_version")
+    conn.execute(
+        "INSERT INTO ip_history (username, ip, connection_count, first_seen, last_seen) VALUES "
+        "('alice', '1.1.1.1', 1, '2026-01-01 00:00:00', '2026-01-01 00:00:00'), "
+        "('alice', '1.1.1.1', 2, '2026-01-02 00:00:00', '2026-01-02 00:00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_database_is_stamped_and_upgraded(db_path):
+    create_legacy_database(db_path)
+    assert asyncio.run(get_schema_state()) == "legacy"
+
+    # What start.sh does for legacy databases
+    config = alembic_config(db_path)
+    command.stamp(config, "001_initial")
+    command.upgrade(config, "head")
+    asyncio.run(init_db())
+    assert asyncio.run(get_schema_state()) == "versioned"
+
+    conn = sqlite3.connect(db_path)
+    index_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'ix_ip_history_username_ip'"
+    ).fetchone()[0]
+    assert "UNIQUE" in index_sql.upper()
+    assert conn.execute("SELECT connection_count FROM ip_history").fetchall() == [(2,)]
+
+    history = DBIPHistory()
+
+    async def record():
+        history.record_observations([
+            ("alice", "1.1.1.1", "node-1", "vless"),
+            ("alice", "4.4.4.4", "node-1", "vless"),
+        ])
+        await history.flush()
+        return await history.get_ips_since(1)
+
+    assert asyncio.run(record()) == {"alice": {"1.1.1.1", "4.4.4.4"}}
+    rows = conn.execute(
+        "SELECT ip, COUNT(*) FROM ip_history WHERE username = 'alice' GROUP BY ip ORDER BY ip"
+    ).fetchall()
+    conn.close()
+    assert rows == [("1.1.1.1", 1), ("4.4.4.4", 1)]
+
+
+def test_migrations_skip_tables_init_db_created(db_path):
+    # Older start.sh ran init_db first, which created the newer tables
+    create_legacy_database(db_path)
+    asyncio.run(init_db())
+
+    config = alembic_config(db_path)
+    command.stamp(config, "001_initial")
+    command.upgrade(config, "head")
+
+    conn = sqlite3.connect(db_path)
+    version = conn.execute("SELECT version_num FROM alembic_version").fetchone()[0]
+    conn.close()
+    assert version == "005_violation_username_timestamp"
+
+
+def test_init_db_leaves_existing_rows_alone(db_path):
+    create_legacy_database(db_path)
+    asyncio.run(init_db())
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM ip_history").fetchone()[0] == 2
+    conn.close()
+
+
+def test_ip_history_survives_loop_restart(db_path):
+    asyncio.run(init_db())
+    history = DBIPHistory()
+
+    async def record(ip: str):
+        history.record_observations([("bob", ip, None, None)])
+        # Two flushes at once so the second waits on the flush lock
+        await asyncio.gather(history.flush(), history.flush())
+
+    asyncio.run(record("2.2.2.2"))
+    asyncio.run(record("3.3.3.3"))
+    assert asyncio.run(history.get_ips_since(1)) == {"bob": {"2.2.2.2", "3.3.3.3"}}
+
+
+def test_failed_ip_history_batch_is_kept_for_the_next_flush(db_path, monkeypatch):
+    asyncio.run(init_db())
+    history = DBIPHistory()
+    record_batch = db_handler.IPHistoryCRUD.record_batch
+    calls = []
+
+    async def failing_once(session, rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return await record_batch(session, rows)
+
+    monkeypatch.setattr(db_handler.IPHistoryCRUD, "record_batch", failing_once)
+
+    async def run():
+        history.record_observations([("alice", "1.1.1.1", None, None)])
+        await history.flush()
+        history.record_observations([("alice", "2.2.2.2", None, None)])
+        await history.flush()
+        return await history.get_ips_since(1)
+
+    assert asyncio.run(run()) == {"alice": {"1.1.1.1", "2.2.2.2"}}
+    assert calls == [1, 2]
+
+
+def test_legacy_json_history_is_imported_once(db_path, tmp_path):
+    asyncio.run(init_db())
+    legacy_file = tmp_path / ".ip_history.json"
+    now = time.time()
+    legacy_file.write_text(json.dumps({
+        "bob": {"entries": [
+            {"timestamp": now - 60, "ip": "2.2.2.2"},
+            {"timestamp": now - 30, "ip": "3.3.3.3"},
+        ]},
+    }))
+    tracker = IPHistoryTracker(filename=str(legacy_file))
+    tracker._db_history = DBIPHistory()
+
+    async def run():
+        await tracker.record_user_ips("carol", {"4.4.4.4"})
+        return await tracker._db_history.get_ips_since(1)
+
+    assert asyncio.run(run()) == {"bob": {"2.2.2.2", "3.3.3.3"}, "carol": {"4.4.4.4"}}
+    assert not legacy_file.exists()
+    assert (tmp_path / ".ip_history.json.migrated").exists()
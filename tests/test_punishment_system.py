@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests for the punishment system's database-backed violation history.
+"""
+
+import asyncio
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import utils.db_handler as db_handler  # noqa: E402
+from utils.punishment_system import PunishmentSystem  # noqa: E402
+
+
+def test_old_violations_are_cleaned_up_at_most_once_per_interval(db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(db_handler, "_db_violation_history", None)
+    history = db_handler.get_db_violation_history()
+    cleanups = []
+    cleanup_old = history.cleanup_old
+
+    async def counting_cleanup(window_hours):
+        cleanups.append(window_hours)
+        await cleanup_old(window_hours)
+
+    monkeypatch.setattr(history, "cleanup_old", counting_cleanup)
+    system = PunishmentSystem(filename=str(tmp_path / ".violation_history.json"))
+    system.window_hours = 24
+
+    async def run():
+        await history.record_violation("alice", 1, 10, timestamp=time.time() - 3 * 86400)
+        await system.record_violation("alice", 1, 10)
+        await system.record_violation("bob", 0, 0)
+        return await system.get_violation_count("alice")
+
+    assert asyncio.run(run()) == 1
+    assert cleanups == [24]
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT username FROM violation_history ORDER BY username").fetchall() == [
+        ("alice",), ("bob",),
+    ]
+    conn.close()
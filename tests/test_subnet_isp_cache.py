@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory subnet ISP index (DBSubnetISPCache).
+"""
+
+import asyncio
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db import SubnetISPCRUD, get_db, init_db  # noqa: E402
+from utils.db_handler import DBSubnetISPCache  # noqa: E402
+
+
+def hit_count(path: Path, subnet: str) -> int:
+    conn = sqlite3.connect(path)
+    count = conn.execute("SELECT hit_count FROM subnet_isp WHERE subnet = ?", (subnet,)).fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_lookups_are_served_from_memory_and_hits_written_in_bulk(db_path):
+    asyncio.run(init_db())
+    cache = DBSubnetISPCache()
+
+    async def fill():
+        await cache.cache_isp("5.6.7.8", "Example ISP", country="IR")
+        found = [await cache.get_cached_isp(ip) for ip in ("5.6.7.1", "5.6.7.200", "9.9.9.9")]
+        await asyncio.gather(cache.flush_hits(), cache.flush_hits())
+        return found
+
+    first, second, missing = asyncio.run(fill())
+    assert first["isp"] == second["isp"] == "Example ISP"
+    assert missing is None
+    before = hit_count(db_path, "5.6.7")
+
+    # The same contention on a new event loop
+    async def flush():
+        await cache.get_cached_isp("5.6.7.2")
+        await cache.get_cached_isp("5.6.7.3")
+        await asyncio.gather(cache.flush_hits(), cache.flush_hits())
+
+    asyncio.run(flush())
+    assert hit_count(db_path, "5.6.7") == before + 2
+
+    # Plain reads do not count as hits
+    async def read():
+        async with get_db() as session:
+            return await SubnetISPCRUD.get_by_ip(session, "5.6.7.9")
+
+    assert asyncio.run(read()).isp == "Example ISP"
+    assert hit_count(db_path, "5.6.7") == before + 2
+
+
+def test_preload_reads_the_whole_table(db_path):
+    asyncio.run(init_db())
+    writer = DBSubnetISPCache()
+
+    async def fill():
+        for subnet in range(3):
+            await writer.cache_isp(f"10.0.{subnet}.1", f"ISP {subnet}")
+
+    asyncio.run(fill())
+
+    reader = DBSubnetISPCache()
+    assert asyncio.run(reader.preload()) == 3
+    assert asyncio.run(reader.get_cached_subnets(["10.0.1", "10.0.5"])) == {
+        "10.0.1": {"ip": "10.0.1", "isp": "ISP 1", "country": "Unknown", "city": "Unknown", "region": "Unknown"},
+    }
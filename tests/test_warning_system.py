@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the enhanced warning system's persistence and evaluation.
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db import WarningStateCRUD, get_db  # noqa: E402
+from utils.types import ConnectionInfo, DeviceInfo, UserType  # noqa: E402
+from utils.warning_system.enhanced_system import EnhancedWarningSystem  # noqa: E402
+from utils.warning_system.user_warning import UserWarning  # noqa: E402
+
+
+def make_warning(username: str) -> UserWarning:
+    now = time.time()
+    return UserWarning(
+        username=username, ip_count=3, ips={"1.1.1.1"},
+        warning_time=now, monitoring_end_time=now + 180,
+    )
+
+
+def test_warning_changes_during_flush_are_persisted(db_path, tmp_path):
+    def new_system() -> EnhancedWarningSystem:
+        return EnhancedWarningSystem(
+            filename=str(tmp_path / "warnings.json"),
+            history_filename=str(tmp_path / "history.json"),
+        )
+
+    async def stored():
+        async with get_db() as session:
+            return sorted(await WarningStateCRUD.get_all(session))
+
+    async def run():
+        system = new_system()
+        await system._ensure_loaded()
+        system.warnings["a"] = make_warning("a")
+        system.mark_changed("a")
+        await system.save_warnings()
+        # Let the flush start, then change more state while it writes
+        await asyncio.sleep(0)
+        system.warnings["b"] = make_warning("b")
+        system.mark_changed("b")
+        await system.save_warnings()
+        await system.flush()
+        after_add = await stored()
+
+        del system.warnings["a"]
+        await system.save_warnings()
+        await asyncio.sleep(0)
+        system.warnings["c"] = make_warning("c")
+        system.mark_changed("c")
+        await system.save_warnings()
+        await system.flush()
+        return after_add, await stored()
+
+    after_add, after_remove = asyncio.run(run())
+    assert after_add == ["a", "b"]
+    assert after_remove == ["b", "c"]
+
+    async def reload():
+        system = new_system()
+        await system._ensure_loaded()
+        return sorted(system.warnings)
+
+    # A new event loop and a new instance see the same state
+    assert asyncio.run(reload()) == ["b", "c"]
+
+
+def test_assess_warning_inactive_only_when_absent():
+    system = EnhancedWarningSystem(use_db=False)
+    warning = make_warning("dave")
+    assert system._assess_warning("dave", warning, None, 2)["kind"] == "inactive"
+    # Present in the snapshot but without IPs right now is not inactive
+    assert system._assess_warning("dave", warning, set(), 2)["kind"] == "compliant"
+
+
+def test_outcome_digests_split_disabled_users(monkeypatch):
+    import utils.warning_system.enhanced_system as enhanced_system
+
+    sent = []
+
+    async def send_digest(message, usernames):
+        sent.append(("disabled", usernames))
+
+    async def send_logs(message):
+        sent.append(("logs", message.count("<code>")))
+
+    monkeypatch.setattr(enhanced_system, "safe_send_disable_digest", send_digest)
+    monkeypatch.setattr(enhanced_system, "safe_send_logs", send_logs)
+
+    def outcome(username, action=None):
+        result = {"username": username, "kind": "exceeds" if action else "inactive"}
+        if action:
+            result.update(
+                device_count=3, limit=2, punishment={
+                    "action": action, "violation_count": 2, "duration_minutes": 0,
+                },
+            )
+        return result
+
+    system = EnhancedWarningSystem(use_db=False)
+    asyncio.run(system._notify_outcomes([
+        outcome("a", "disabled"), outcome("b"), outcome("c", "disabled"), outcome("d", "warning"),
+    ]))
+    assert sent == [("disabled", ["a", "c"]), ("logs", 2)]
+
+
+def test_inbound_index_only_reflects_the_current_cycle(tmp_path):
+    system = EnhancedWarningSystem(
+        filename=str(tmp_path / "warnings.json"),
+        history_filename=str(tmp_path / "history.json"),
+        use_db=False,
+    )
+
+    def user_data(ip: str) -> UserType:
+        connection = ConnectionInfo(ip=ip, node_id=1, node_name="node", inbound_protocol="X", last_seen=time.time())
+        return UserType(name="erin", device_info=DeviceInfo(connections=[connection], inbound_protocols={"X"}))
+
+    async def run():
+        # Cycle 1: IP a on inbound X; cycle 2: a has left and IP b is on X
+        await system.add_warning("erin", 1, {"1.1.1.1"}, 0, user_data=user_data("1.1.1.1"))
+        result = await system.add_warning("erin", 1, {"2.2.2.2"}, 0, user_data=user_data("2.2.2.2"))
+        return result, system.warnings["erin"]
+
+    result, warning = asyncio.run(run())
+    assert result == "updated"
+    assert warning.ip_to_inbounds == {"2.2.2.2": {"X"}}
+    assert not warning.trust_factors["multi_ip_same_inbound"]
+    assert not warning.trust_factors["same_ip_multi_inbound"]
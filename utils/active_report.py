@@ -0,0 +1,346 @@
+"""
+Active users report - the per-cycle list of users over their device limit.
+
+Each check cycle replaces the report's entries (plain data, cheap to build);
+nothing is rendered until a page is viewed. User blocks are rendered on
+demand and cached by their content, so a user whose IPs and connections did
+not change is not re-rendered the next cycle. Pages are filled greedily up to
+Telegram's message size as they are requested.
+
+Each user's report state (device count, IP set, limit, monitoring status)
+is hashed every cycle, so a cycle can report only the users that are new,
+changed or resolved since the last one; the full summary is only sent every
+report_full_interval seconds (REPORT_FULL_INTERVAL in the environment).
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Telegram allows 4096 characters per message
+MAX_PAGE_CHARS = 3900
+# Users listed in the per-cycle summary
+SUMMARY_TOP_USERS = 5
+# Users listed per section of a changes message
+CHANGES_MAX_USERS = 20
+# Default seconds between full report summaries (changes are reported every cycle)
+REPORT_FULL_INTERVAL = 3600
+
+BLOCK_SEPARATOR = "\n\n"
+
+# (ip, inbound protocol, node name, node id)
+Connection = Tuple[str, str, str, int]
+
+
+@dataclass
+class ReportEntry:
+    """A user over their limit in one check cycle"""
+    email: str
+    device_count: int
+    ip_count: int
+    user_limit: int
+    has_special_limit: bool
+    is_except: bool
+    formatted_ips: Tuple[str, ...]
+    # Connections on the user's IPs; empty unless enhanced details are enabled
+    connections: Tuple[Connection, ...] = ()
+    # Seconds left in warning monitoring, None if not monitored
+    warning_time_remaining: Optional[int] = None
+    # Raw IPs, sorted
+    ips: Tuple[str, ...] = ()
+
+    @property
+    def body_key(self) -> tuple:
+        """Everything the IP lines of the block depend on"""
+        return (self.formatted_ips, self.connections)
+
+    @property
+    def needs_limit(self) -> bool:
+        """User is on the general limit and not excepted"""
+        return not self.has_special_limit and not self.is_except
+
+    def state_hash(self) -> int:
+        """Hash of what makes a report entry worth notifying about again"""
+        return hash((
+            self.device_count,
+            self.ips or self.formatted_ips,
+            self.user_limit,
+            self.has_special_limit,
+            self.is_except,
+            self.warning_time_remaining is not None,
+        ))
+
+
+@dataclass
+class ReportChanges:
+    """Difference between two consecutive report cycles"""
+    new: List[ReportEntry] = field(default_factory=list)
+    # (entry, previous device count)
+    changed: List[Tuple[ReportEntry, int]] = field(default_factory=list)
+    resolved: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.new or self.changed or self.resolved)
+
+
+def render_ip_details(formatted_ips: Tuple[str, ...], connections: Tuple[Connection, ...]) -> List[str]:
+    """
+    IP lines with node and inbound info, one per IP.
+    Multiple inbounds on the same IP are listed together (multiple devices).
+    """
+    # Group connections by IP
+    ip_to_connections: Dict[str, List[Connection]] = {}
+    for conn in connections:
+        ip_to_connections.setdefault(conn[0], []).append(conn)
+
+    # Map raw IP to formatted IP with ISP info
+    raw_to_formatted = {}
+    for formatted_ip in formatted_ips:
+        if ' (' in formatted_ip:
+            raw_ip = formatted_ip.split(' (')[0]
+        else:
+            raw_ip = formatted_ip.split(' ')[0]
+        raw_to_formatted[raw_ip] = formatted_ip
+
+    ip_details = []
+    for ip, ip_connections in ip_to_connections.items():
+        formatted_ip = raw_to_formatted.get(ip, ip)
+        unique_inbounds = list(dict.fromkeys(conn[1] for conn in ip_connections))
+        _, _, node_name, node_id = ip_connections[0]
+        node_info = f"{node_name}({node_id})"
+
+        if len(unique_inbounds) == 1:
+            ip_details.append(f"  • {formatted_ip} → {node_info} | {unique_inbounds[0]}")
+        else:
+            inbounds_str = ", ".join(unique_inbounds)
+            ip_details.append(f"  • {formatted_ip} → {node_info} | [{inbounds_str}]")
+    return ip_details
+
+
+def _limit_str(entry: ReportEntry) -> str:
+    if entry.is_except:
+        return "🔓"
+    if entry.has_special_limit:
+        return f"🎯 {entry.user_limit}"
+    return f"📊 {entry.user_limit}"
+
+
+def _status_text(entry: ReportEntry) -> str:
+    if entry.warning_time_remaining is None:
+        return ""
+    minutes, seconds = divmod(entry.warning_time_remaining, 60)
+    return f" ⚠️ {minutes}m{seconds}s"
+
+
+def _truncate_lines(block: str, budget: int) -> str:
+    """
+    Whole lines of `block` that fit in `budget` characters followed by "…",
+    so HTML tags are never cut in half. A first line longer than the budget
+    is cut as plain text.
+    """
+    lines = block.split("\n")
+    kept: List[str] = []
+    used = len("\n…")
+    for line in lines:
+        extra = len(line) + (1 if kept else 0)
+        if used + extra > budget:
+            break
+        kept.append(line)
+        used += extra
+    if not kept:
+        return block[:budget - 1] + "…"
+    return "\n".join(kept) + "\n…"
+
+
+class ActiveUsersReport:
+    """Latest active users report, rendered lazily into pages"""
+
+    def __init__(self, max_page_chars: int = MAX_PAGE_CHARS):
+        self.max_page_chars = max_page_chars
+        self.entries: List[ReportEntry] = []
+        self.total_devices = 0
+        self.total_ips = 0
+        self.general_limit = 0
+        self.generated_at = 0.0
+        # email -> (body key, rendered IP lines)
+        self._bodies: Dict[str, Tuple[tuple, str]] = {}
+        # Index of the first entry of each page found so far
+        self._page_starts: List[int] = [0]
+        self._stats = {"rendered": 0, "reused": 0}
+        # email -> (state hash, device count) from the previous cycle
+        self._states: Dict[str, Tuple[int, int]] = {}
+        self.last_full_at = 0.0
+
+    def update(
+        self, entries: List[ReportEntry], total_devices: int, total_ips: int, general_limit: int
+    ) -> ReportChanges:
+        """
+        Replace the report with a new cycle's entries (sorted for display).
+
+        Returns:
+            The users that are new, changed or resolved since the previous cycle
+        """
+        changes = ReportChanges()
+        states: Dict[str, Tuple[int, int]] = {}
+        for entry in entries:
+            state = entry.state_hash()
+            states[entry.email] = (state, entry.device_count)
+            previous = self._states.get(entry.email)
+            if previous is None:
+                changes.new.append(entry)
+            elif previous[0] != state:
+                changes.changed.append((entry, previous[1]))
+        changes.resolved = [email for email in self._states if email not in states]
+        self._states = states
+
+        self.entries = entries
+        self.total_devices = total_devices
+        self.total_ips = total_ips
+        self.general_limit = general_limit
+        self.generated_at = time.time()
+        self._page_starts = [0]
+        # Keep cached bodies only for users still in the report
+        current = {entry.email for entry in entries}
+        for email in [email for email in self._bodies if email not in current]:
+            del self._bodies[email]
+        return changes
+
+    def full_snapshot_due(self, interval: int = REPORT_FULL_INTERVAL, now: Optional[float] = None) -> bool:
+        """True if the full summary should be sent this cycle (`interval` seconds after the last one)"""
+        return (now or time.time()) - self.last_full_at >= interval
+
+    def mark_full_snapshot(self, now: Optional[float] = None):
+        self.last_full_at = now or time.time()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self._stats, "cached_blocks": len(self._bodies)}
+
+    def header(self) -> str:
+        return (
+            f"━━━━━━━━━━━━━━━━━━━━\n"
+            f"📊 <b>Active Users Report</b>\n"
+            f"👥 Users: {len(self.entries)} | 📱 Devices: {self.total_devices} | 🌐 IPs: {self.total_ips}\n"
+            f"📏 General limit: {self.general_limit}\n"
+            f"━━━━━━━━━━━━━━━━━━━━\n"
+        )
+
+    def _body(self, entry: ReportEntry) -> str:
+        key = entry.body_key
+        cached = self._bodies.get(entry.email)
+        if cached and cached[0] == key:
+            self._stats["reused"] += 1
+            return cached[1]
+
+        ip_details = render_ip_details(entry.formatted_ips, entry.connections) if entry.connections else []
+        if ip_details:
+            body = "\n".join(f"  {detail}" for detail in ip_details)
+        else:
+            body = "\n".join(f"  • {ip}" for ip in entry.formatted_ips)
+        self._bodies[entry.email] = (key, body)
+        self._stats["rendered"] += 1
+        return body
+
+    def render_block(self, entry: ReportEntry) -> str:
+        """One user's block; the header line is always fresh, IP lines come from the cache"""
+        user_header = (
+            f"👤 <b>{entry.email}</b>{_status_text(entry)}\n"
+            f"   📱 {entry.device_count} 🌐 {entry.ip_count} {_limit_str(entry)}"
+        )
+        return f"{user_header}\n{self._body(entry)}"
+
+    def _fill_page(self, start: int, budget: int) -> Tuple[List[str], int]:
+        """Blocks from entries[start:] that fit in `budget` characters, and the next start"""
+        blocks: List[str] = []
+        used = 0
+        index = start
+        while index < len(self.entries):
+            block = self.render_block(self.entries[index])
+            extra = len(block) + (len(BLOCK_SEPARATOR) if blocks else 0)
+            if blocks and used + extra > budget:
+                break
+            if not blocks and extra > budget:
+                # A single oversized block is cut to fit
+                block = _truncate_lines(block, budget)
+                extra = len(block)
+            blocks.append(block)
+            used += extra
+            index += 1
+        return blocks, index
+
+    def _page_budget(self, page: int) -> int:
+        budget = self.max_page_chars - len(self._page_title(page))
+        if page == 0:
+            budget -= len(self.header())
+        return budget
+
+    @staticmethod
+    def _page_title(page: int) -> str:
+        return f"📄 <b>Page {page + 1}</b>\n\n"
+
+    def has_page(self, page: int) -> bool:
+        """True if `page` exists (renders the pages before it if needed)"""
+        while len(self._page_starts) <= page:
+            last = len(self._page_starts) - 1
+            start = self._page_starts[last]
+            if start >= len(self.entries):
+                return False
+            _, next_start = self._fill_page(start, self._page_budget(last))
+            self._page_starts.append(next_start)
+        return page == 0 or self._page_starts[page] < len(self.entries)
+
+    def render_page(self, page: int) -> Optional[str]:
+        """Text of a page (0-indexed), or None if the page does not exist"""
+        if not self.entries or not self.has_page(page):
+            return None
+        blocks, next_start = self._fill_page(self._page_starts[page], self._page_budget(page))
+        if len(self._page_starts) == page + 1:
+            self._page_starts.append(next_start)
+        text = self._page_title(page) + BLOCK_SEPARATOR.join(blocks)
+        if page == 0:
+            text = self.header() + text
+        return text
+
+    def summary(self) -> str:
+        """Compact per-cycle summary: totals and the top users"""
+        lines = [self.header()]
+        for entry in self.entries[:SUMMARY_TOP_USERS]:
+            lines.append(
+                f"👤 <b>{entry.email}</b>{_status_text(entry)} "
+                f"📱 {entry.device_count} 🌐 {entry.ip_count} {_limit_str(entry)}"
+            )
+        remaining = len(self.entries) - SUMMARY_TOP_USERS
+        if remaining > 0:
+            lines.append(f"… and {remaining} more")
+        return "\n".join(lines)
+
+    def changes_summary(self, changes: ReportChanges) -> str:
+        """Message listing only the users that changed since the previous cycle"""
+        lines = [
+            f"🔔 <b>Active Users Changes</b>\n"
+            f"👥 Users: {len(self.entries)} | 📱 Devices: {self.total_devices} | 🌐 IPs: {self.total_ips}"
+        ]
+
+        def section(title: str, items: List[str]):
+            if not items:
+                return
+            lines.append(f"\n{title} ({len(items)}):")
+            lines.extend(items[:CHANGES_MAX_USERS])
+            if len(items) > CHANGES_MAX_USERS:
+                lines.append(f"… and {len(items) - CHANGES_MAX_USERS} more")
+
+        section("🆕 <b>New</b>", [
+            f"👤 <b>{entry.email}</b>{_status_text(entry)} "
+            f"📱 {entry.device_count} 🌐 {entry.ip_count} {_limit_str(entry)}"
+            for entry in changes.new
+        ])
+        section("🔁 <b>Changed</b>", [
+            f"👤 <b>{entry.email}</b>{_status_text(entry)} "
+            f"📱 {previous_devices}→{entry.device_count} 🌐 {entry.ip_count} {_limit_str(entry)}"
+            for entry, previous_devices in changes.changed
+        ])
+        section("✅ <b>Resolved</b>", [f"👤 {email}" for email in changes.resolved])
+        return "\n".join(lines)
+
+
+# Shared report, browsed from the Telegram bot
+active_users_report = ActiveUsersReport()
@@ -8,10 +8,11 @@ import asyncio
 import ipaddress
 from collections import Counter
 
-from telegram_bot.send_message import send_logs, send_user_message
+from telegram_bot.send_message import send_logs, send_report_summary, send_user_message
+from utils.active_report import ReportEntry, active_users_report
 from utils.logs import logger
 from utils.panel_api import disable_user
-from utils.read_config import read_config, get_config_value
+from utils.read_config import current_config, read_config, subscribe_config
 from utils.types import PanelType, UserType, EnhancedUserInfo
 from utils.warning_system import EnhancedWarningSystem
 from utils.isp_detector import ISPDetector
@@ -26,6 +27,17 @@ warning_system = EnhancedWarningSystem()
 isp_detector = None  # Will be initialized when needed
 
 
+async def _on_config_change(old, new):
+    """Recreate the ISP detector when the ipinfo token changes"""
+    global isp_detector
+    if isp_detector is not None and (old is None or old.ipinfo_token != new.ipinfo_token):
+        await isp_detector.close()
+        isp_detector = None
+
+
+subscribe_config(_on_config_change)
+
+
 def group_ips_by_subnet(ip_list: list[str]) -> tuple[list[str], dict[str, list[str]]]:
     """
     Group IPs by their /24 subnet and return formatted representations.
@@ -86,94 +98,59 @@ def group_ips_by_subnet(ip_list: list[str]) -> tuple[list[str], dict[str, list[s
     return formatted_results, ip_mapping
 
 
-def _build_ip_details(user_info: EnhancedUserInfo, original_user: UserType, show_enhanced_details: bool) -> tuple[list[str], int]:
+def get_monitored_ips() -> set[str]:
+    """IPs of active users under warning monitoring (resolved first by ISP lookups)"""
+    monitored_ips = set()
+    for username in warning_system.get_monitoring_users():
+        user = ACTIVE_USERS.get(username)
+        if user:
+            monitored_ips.update(user.ip)
+    return monitored_ips
+
+
+def _count_devices(user_info: EnhancedUserInfo, original_user: UserType) -> int:
     """
-    Build IP details with connection info for a user.
-    
-    Args:
-        user_info: Enhanced user information
-        original_user: Original user data with device info
-        show_enhanced_details: Whether to show detailed connection info
-        
-    Returns:
-        Tuple of (list of formatted IP detail strings, device count)
-        Device count = unique (IP, inbound) combinations
+    Device count of a user = unique (IP, inbound) combinations.
+    Falls back to the IP count when there is no connection info.
     """
-    device_count = 0
-    unique_devices = set()  # Track unique (IP, inbound) combinations
-    
     if not original_user or not original_user.device_info or not original_user.device_info.connections:
-        # Fallback: count IPs as devices if no connection info
-        return [], len(user_info.formatted_ips)
-    
-    # Count unique devices (IP + inbound combinations)
-    for conn in original_user.device_info.connections:
-        unique_devices.add((conn.ip, conn.inbound_protocol))
-    device_count = len(unique_devices)
-    
-    if not show_enhanced_details:
-        return [], device_count
-    
-    ip_details = []
-    
-    # Group connections by IP
-    ip_to_connections = {}
-    for conn in original_user.device_info.connections:
-        if conn.ip in user_info.user.ip:
-            if conn.ip not in ip_to_connections:
-                ip_to_connections[conn.ip] = []
-            ip_to_connections[conn.ip].append(conn)
-    
-    # Create mapping of raw IP to formatted IP with ISP info
-    raw_to_formatted = {}
-    for formatted_ip in user_info.formatted_ips:
-        if ' (' in formatted_ip:
-            raw_ip = formatted_ip.split(' (')[0]
-        else:
-            raw_ip = formatted_ip.split(' ')[0]
-        raw_to_formatted[raw_ip] = formatted_ip
-    
-    # Build details for each IP with inbound info
-    for ip, connections in ip_to_connections.items():
-        formatted_ip = raw_to_formatted.get(ip, ip)
-        
-        # Get unique inbounds for this IP
-        unique_inbounds = list(set(c.inbound_protocol for c in connections))
-        node_info = f"{connections[0].node_name}({connections[0].node_id})"
-        
-        if len(unique_inbounds) == 1:
-            ip_details.append(f"  • {formatted_ip} → {node_info} | {unique_inbounds[0]}")
-        else:
-            # Multiple inbounds on same IP = multiple devices
-            inbounds_str = ", ".join(unique_inbounds)
-            ip_details.append(f"  • {formatted_ip} → {node_info} | [{inbounds_str}]")
-    
-    return ip_details, device_count
+        return len(user_info.formatted_ips)
+    return len({(conn.ip, conn.inbound_protocol) for conn in original_user.device_info.connections})
+
+
+def _report_connections(user_info: EnhancedUserInfo, original_user: UserType) -> tuple:
+    """Snapshot of the connections on a user's IPs for the report"""
+    if not original_user or not original_user.device_info or not original_user.device_info.connections:
+        return ()
+    user_ips = set(user_info.user.ip)
+    return tuple(
+        (conn.ip, conn.inbound_protocol, conn.node_name, conn.node_id)
+        for conn in original_user.device_info.connections
+        if conn.ip in user_ips
+    )
 
 
 async def check_ip_used() -> dict:
     """
     Check active users and display them.
-    1. Shows all active users with device count >= general_limit in ONE combined message
+    1. Updates the active users report with all users over their limit and
+       sends a compact summary (the full report is paginated in the bot)
     2. Sends SEPARATE action messages for users who don't have special limit set
        (for setting their limit via inline buttons)
     """
     global isp_detector
     
-    config_data = await read_config()
-    general_limit = config_data.get("limits", {}).get("general", 2)
-    special_limit = config_data.get("limits", {}).get("special", {})
-    except_users = config_data.get("limits", {}).get("except_users", [])
-    show_enhanced_details = config_data.get("display", {}).get("show_enhanced_details", True)
+    config = await current_config()
+    general_limit = config.general_limit
+    special_limit = config.special_limits
+    except_users = config.except_users
+    show_enhanced_details = config.enhanced_details
     
     # Initialize ISP detector with token from config
     if isp_detector is None:
-        ipinfo_token = config_data.get("api", {}).get("ipinfo_token", "")
-        use_fallback_api = config_data.get("api", {}).get("use_fallback_isp_api", False)
+        ipinfo_token = config.ipinfo_token
         logger.info(f"Loading IPINFO_TOKEN from config: {'Present' if ipinfo_token else 'NOT FOUND'}")
-        if use_fallback_api:
-            logger.info("Using fallback ISP API (ip-api.com) for all requests")
-        isp_detector = ISPDetector(token=ipinfo_token if ipinfo_token else None, use_fallback_only=use_fallback_api)
+        isp_detector = ISPDetector(token=ipinfo_token if ipinfo_token else None)
     
     all_users_log = {}
     enhanced_users_info = {}
@@ -202,7 +179,9 @@ async def check_ip_used() -> dict:
             all_ips.add(ip)
     
     # Get ISP information for all IPs
-    isp_info_batch = await isp_detector.get_multiple_isp_info(list(all_ips))
+    isp_info_batch = await isp_detector.get_multiple_isp_info(
+        list(all_ips), priority_ips=get_monitored_ips()
+    )
     
     # Create enhanced user info with ISP details
     for email, formatted_ips in all_users_log.items():
@@ -257,8 +236,7 @@ async def check_ip_used() -> dict:
             all_user_device_counts[email] = 0
             continue
         
-        original_user = ACTIVE_USERS.get(email)
-        _, device_count = _build_ip_details(user_info, original_user, show_enhanced_details)
+        device_count = _count_devices(user_info, ACTIVE_USERS.get(email))
         all_user_device_counts[email] = device_count
         total_devices += device_count
     
@@ -271,16 +249,14 @@ async def check_ip_used() -> dict:
         reverse=True
     )
     
-    # Build combined message for all users with >= general_limit devices
-    combined_message_parts = []
-    users_needing_limit = []  # Users without special limit who need action messages
-    users_shown = 0
+    # Collect report entries for all users over their limit; they are rendered
+    # only when an admin opens a report page
+    report_entries = []
     
     for email, user_info in sorted_users:
         if not user_info.user.ip:
             continue
         
-        original_user = ACTIVE_USERS.get(email)
         ip_count = len(user_info.formatted_ips)
         device_count = all_user_device_counts.get(email, 0)
         
@@ -294,95 +270,44 @@ async def check_ip_used() -> dict:
         if device_count <= user_limit:
             continue
         
-        users_shown += 1
-        
-        # Build IP details
-        ip_details, _ = _build_ip_details(user_info, original_user, show_enhanced_details)
-        
-        # Build status indicators
-        status_text = ""
-        if user_info.is_being_monitored:
-            minutes = user_info.warning_time_remaining // 60
-            seconds = user_info.warning_time_remaining % 60
-            status_text = f" ⚠️ {minutes}m{seconds}s"
-        
-        # Build limit indicator
-        if is_except:
-            limit_indicator = "🔓"
-        elif has_special_limit:
-            limit_indicator = f"🎯{user_limit}"
-        else:
-            limit_indicator = f"📊{user_limit}"
-            # Add to list of users needing limit setting
-            users_needing_limit.append({
-                "email": email,
-                "device_count": device_count,
-                "ip_count": ip_count
-            })
-        
-        # Build user block with IP details for combined message
-        # Format: 👤 Username
-        #         📱 2 🌐 2 🎯 2
-        #         • IP details...
-        
-        # Build limit indicator
-        if is_except:
-            limit_str = "🔓"
-        elif has_special_limit:
-            limit_str = f"🎯 {user_limit}"
-        else:
-            limit_str = f"📊 {user_limit}"
-        
-        user_header = f"👤 <b>{email}</b>{status_text}\n   📱 {device_count} 🌐 {ip_count} {limit_str}"
-        
-        # Add IP details
-        if ip_details:
-            ip_lines = "\n".join(f"  {detail}" for detail in ip_details)
-            user_block = f"{user_header}\n{ip_lines}"
-        else:
-            ip_lines = "\n".join(f"  • {ip}" for ip in user_info.formatted_ips)
-            user_block = f"{user_header}\n{ip_lines}"
-        
-        combined_message_parts.append(user_block)
-    
-    # Send combined message with all users
-    if combined_message_parts:
-        header = (
-            f"━━━━━━━━━━━━━━━━━━━━\n"
-            f"📊 <b>Active Users Report</b>\n"
-            f"👥 Users: {users_shown} | 📱 Devices: {total_devices} | 🌐 IPs: {total_ips}\n"
-            f"📏 General limit: {general_limit}\n"
-            f"━━━━━━━━━━━━━━━━━━━━\n"
-        )
-        
-        # Split into chunks if too long (Telegram limit ~4096 chars)
-        full_message = header + "\n\n".join(combined_message_parts)
-        
-        if len(full_message) > 4000:
-            # Send in chunks
-            await send_logs(header)
-            chunk = ""
-            for block in combined_message_parts:
-                if len(chunk) + len(block) + 2 > 3900:
-                    await send_logs(chunk)
-                    await asyncio.sleep(0.3)
-                    chunk = block
-                else:
-                    chunk = chunk + "\n\n" + block if chunk else block
-            if chunk:
-                await send_logs(chunk)
-        else:
-            await send_logs(full_message)
-    
-    # Send SEPARATE action messages for users who need limit setting
-    # (users without special limit and not in except list)
+        report_entries.append(ReportEntry(
+            email=email,
+            device_count=device_count,
+            ip_count=ip_count,
+            user_limit=user_limit,
+            has_special_limit=has_special_limit,
+            is_except=is_except,
+            formatted_ips=tuple(user_info.formatted_ips),
+            connections=_report_connections(user_info, ACTIVE_USERS.get(email)) if show_enhanced_details else (),
+            warning_time_remaining=user_info.warning_time_remaining if user_info.is_being_monitored else None,
+            ips=tuple(sorted(set(user_info.user.ip))),
+        ))
+    
+    changes = active_users_report.update(report_entries, total_devices, total_ips, general_limit)
+    
+    # Send a compact summary on the full report interval, otherwise only what
+    # changed since the previous cycle; the full report is browsed page by page
+    if active_users_report.full_snapshot_due(config.report_full_interval):
+        active_users_report.mark_full_snapshot()
+        if report_entries:
+            await send_report_summary(active_users_report.summary())
+    elif changes:
+        await send_report_summary(active_users_report.changes_summary(changes))
+    
+    # Send SEPARATE action messages for users who need limit setting (users
+    # without special limit and not in except list), only when they are new
+    # to the report or their device count changed.
+    # The notification dispatcher paces these, so nothing here waits on Telegram.
+    users_needing_limit = [entry for entry in changes.new if entry.needs_limit]
+    users_needing_limit += [
+        entry for entry, previous_devices in changes.changed
+        if entry.needs_limit and entry.device_count != previous_devices
+    ]
     if users_needing_limit:
-        await asyncio.sleep(1)  # Small delay after combined message
-        
-        for user_data in users_needing_limit:
-            email = user_data["email"]
-            device_count = user_data["device_count"]
-            ip_count = user_data["ip_count"]
+        for entry in users_needing_limit:
+            email = entry.email
+            device_count = entry.device_count
+            ip_count = entry.ip_count
             
             action_message = (
                 f"⚙️ <b>Set Limit for: {email}</b>\n"
@@ -393,7 +318,6 @@ async def check_ip_used() -> dict:
             try:
                 # Send with inline buttons (has_special_limit=False, is_except=False)
                 await send_user_message(action_message, email, device_count, False, False)
-                await asyncio.sleep(0.5)
             except Exception as e:
                 logger.error(f"Failed to send action message for user {email}: {e}")
     
@@ -401,7 +325,6 @@ async def check_ip_used() -> dict:
     monitoring_summary = await warning_system.generate_monitoring_summary()
     if monitoring_summary:
         try:
-            await asyncio.sleep(1)
             await send_logs(monitoring_summary)
         except Exception as e:
             logger.error(f"Failed to send monitoring summary: {e}")
@@ -415,27 +338,22 @@ async def check_users_usage(panel_data: PanelType):
     """
     global isp_detector
     
+    config = await current_config()
+    # Group/admin filters still take the raw config dict
     config_data = await read_config()
     all_users_log = await check_ip_used()
     
-    # Use new config format
-    limits_config = config_data.get("limits", {})
-    api_config = config_data.get("api", {})
-    
-    except_users = limits_config.get("except_users", [])
-    special_limit = limits_config.get("special", {})
-    limit_number = limits_config.get("general", 2)
+    except_users = config.except_users
+    special_limit = config.special_limits
+    limit_number = config.general_limit
     
     # Initialize ISP detector if not already done
     if isp_detector is None:
-        ipinfo_token = api_config.get("ipinfo_token", "")
-        use_fallback_api = api_config.get("use_fallback_isp_api", False)
+        ipinfo_token = config.ipinfo_token
         logger.info(f"[check_users_usage] Loading ipinfo_token: {'Present' if ipinfo_token else 'NOT FOUND'}")
         if ipinfo_token:
             logger.info(f"[check_users_usage] Token preview: {ipinfo_token[:20]}...")
-        if use_fallback_api:
-            logger.info("[check_users_usage] Using fallback ISP API (ip-api.com) for all requests")
-        isp_detector = ISPDetector(token=ipinfo_token if ipinfo_token else None, use_fallback_only=use_fallback_api)
+        isp_detector = ISPDetector(token=ipinfo_token if ipinfo_token else None)
     
     # Build user info with actual unique IP counts for ALL active users
     # This is critical for warning system to work correctly
@@ -454,11 +372,15 @@ async def check_users_usage(panel_data: PanelType):
         all_ips_for_isp_lookup.update(unique_ips)
     
     # Batch fetch ISP info for all IPs
-    isp_info_batch = await isp_detector.get_multiple_isp_info(list(all_ips_for_isp_lookup))
+    isp_info_batch = await isp_detector.get_multiple_isp_info(
+        list(all_ips_for_isp_lookup), priority_ips=get_monitored_ips()
+    )
     
     # Record IPs to history tracker for long-term tracking
     for username, unique_ips in all_users_actual_ips.items():
-        await ip_history_tracker.record_user_ips(username, unique_ips)
+        await ip_history_tracker.record_user_ips(
+            username, unique_ips, all_users_data[username].device_info.connections
+        )
     
     # Save history periodically
     await ip_history_tracker.save_history()
@@ -466,8 +388,10 @@ async def check_users_usage(panel_data: PanelType):
     # Cleanup inactive users from history
     await ip_history_tracker.cleanup_inactive_users(set(all_users_actual_ips.keys()))
     
-    # Check for users who still violate limits after warning period
+    # Expired warnings are evaluated by the monitor task at their deadline;
+    # this picks up its results and anything it hasn't reached yet.
     # Pass actual IPs, not formatted display strings
+    warning_system.start_monitor(panel_data)
     disabled_users = await warning_system.check_persistent_violations(
         panel_data, all_users_actual_ips, config_data
     )
@@ -545,6 +469,5 @@ async def run_check_users_usage(panel_data: PanelType) -> None:
     """run check_ip_used() function and then run check_users_usage()"""
     while True:
         await check_users_usage(panel_data)
-        data = await read_config()
-        check_interval = data.get("monitoring", {}).get("check_interval", 60)
-        await asyncio.sleep(int(check_interval))
+        config = await current_config()
+        await asyncio.sleep(config.check_interval)
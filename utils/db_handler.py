@@ -6,13 +6,17 @@ It integrates with the db module to provide persistent storage for:
 - ISP caching (by subnet)
 - Violation history
 - Configuration
+- IP history
 """
 
 import asyncio
+import heapq
 import time
-from typing import Dict, List, Optional, Set
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
 
 from utils.logs import logger
+from utils.loop_local import LoopLocal
 
 # Try to import database module, fall back to JSON if not available
 try:
@@ -23,6 +27,7 @@ try:
         SubnetISPCRUD,
         ViolationHistoryCRUD,
         ConfigCRUD,
+        IPHistoryCRUD,
     )
     DB_AVAILABLE = True
     logger.info("Database module loaded successfully")
@@ -35,6 +40,14 @@ class DBDisabledUsers:
     """
     Database-backed disabled users management.
     Provides the same interface as DisabledUsers class but uses SQLite.
+
+    The table is read once at startup; afterwards all queries are answered
+    from memory. Due-to-enable lookups use min-heaps keyed by enable time,
+    and changes are persisted to the database by a background write-behind
+    flush.
+
+    Not used by the limiter yet: disabled users are still tracked by the
+    JSON-backed utils.handel_dis_users.DisabledUsers and enable_scheduler.
     """
 
     def __init__(self):
@@ -44,6 +57,16 @@ class DBDisabledUsers:
         self._cache_enable_at: Dict[str, float] = {}
         self._original_groups: Dict[str, List[str]] = {}
         self._punishment_steps: Dict[str, int] = {}
+        # (enable_at, username) for users with a custom duration
+        self._enable_at_heap: List[Tuple[float, str]] = []
+        # (disabled_at, username) for users on the default duration
+        self._disabled_at_heap: List[Tuple[float, str]] = []
+        # Users already popped from a heap as due, until they are removed
+        self._due: Set[str] = set()
+        # username -> DisabledUserCRUD.add kwargs, or None to delete
+        self._pending_writes: Dict[str, Optional[dict]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = LoopLocal(asyncio.Lock)
 
     async def _ensure_initialized(self):
         """Ensure database is initialized"""
@@ -67,8 +90,44 @@ class DBDisabledUsers:
             self._punishment_steps = {
                 u.username: u.punishment_step for u in users if u.punishment_step is not None
             }
+        self._enable_at_heap = [
+            (enable_at, username) for username, enable_at in self._cache_enable_at.items()
+        ]
+        self._disabled_at_heap = [
+            (disabled_at, username)
+            for username, disabled_at in self._cache_timestamps.items()
+            if username not in self._cache_enable_at
+        ]
+        heapq.heapify(self._enable_at_heap)
+        heapq.heapify(self._disabled_at_heap)
+        self._due.clear()
         logger.info(f"Loaded {len(self._cache)} disabled users from database")
 
+    def _schedule_write(self, username: str, record: Optional[dict]):
+        """Queue a write-behind change for a user and start a flush if idle"""
+        self._pending_writes[username] = record
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Persist all pending disabled-user changes to the database"""
+        async with self._flush_lock.get():
+            while self._pending_writes:
+                batch, self._pending_writes = self._pending_writes, {}
+                try:
+                    async with get_db() as session:
+                        for username, record in batch.items():
+                            if record is None:
+                                await DisabledUserCRUD.remove(session, username)
+                            else:
+                                await DisabledUserCRUD.add(session, username=username, **record)
+                except Exception as e:
+                    logger.error(f"Failed to persist {len(batch)} disabled user changes: {e}")
+                    # Keep the changes for the next flush unless superseded
+                    for username, record in batch.items():
+                        self._pending_writes.setdefault(username, record)
+                    break
+
     async def add_user(
         self,
         username: str,
@@ -90,28 +149,28 @@ class DBDisabledUsers:
         current_time = time.time()
         enable_at = current_time + duration_seconds if duration_seconds > 0 else None
 
-        async with get_db() as session:
-            await DisabledUserCRUD.add(
-                session,
-                username=username,
-                disabled_at=current_time,
-                enable_at=enable_at,
-                original_groups=original_groups,
-                punishment_step=punishment_step,
-            )
-
         # Update cache
         self._cache.add(username)
         self._cache_timestamps[username] = current_time
         if enable_at:
             self._cache_enable_at[username] = enable_at
-        elif username in self._cache_enable_at:
-            del self._cache_enable_at[username]
+            heapq.heappush(self._enable_at_heap, (enable_at, username))
+        else:
+            self._cache_enable_at.pop(username, None)
+            heapq.heappush(self._disabled_at_heap, (current_time, username))
+        self._due.discard(username)
         if original_groups:
             self._original_groups[username] = original_groups
         if punishment_step is not None:
             self._punishment_steps[username] = punishment_step
 
+        self._schedule_write(username, {
+            "disabled_at": current_time,
+            "enable_at": enable_at,
+            "original_groups": original_groups,
+            "punishment_step": punishment_step,
+        })
+
         enable_time = time.strftime(
             "%H:%M:%S", time.localtime(enable_at if enable_at else current_time + 1800)
         )
@@ -124,15 +183,15 @@ class DBDisabledUsers:
         """Remove a user from disabled users"""
         await self._ensure_initialized()
 
-        async with get_db() as session:
-            await DisabledUserCRUD.remove(session, username)
-
-        # Update cache
+        # Update cache - heap entries for the user become stale and are skipped
         self._cache.discard(username)
         self._cache_timestamps.pop(username, None)
         self._cache_enable_at.pop(username, None)
         self._original_groups.pop(username, None)
         self._punishment_steps.pop(username, None)
+        self._due.discard(username)
+
+        self._schedule_write(username, None)
 
         logger.info(f"User {username} removed from disabled users")
 
@@ -148,12 +207,25 @@ class DBDisabledUsers:
         """
         await self._ensure_initialized()
 
-        async with get_db() as session:
-            users = await DisabledUserCRUD.get_users_to_enable(
-                session, default_time_to_active
-            )
+        current_time = time.time()
+
+        heap = self._enable_at_heap
+        while heap and heap[0][0] <= current_time:
+            enable_at, username = heapq.heappop(heap)
+            if self._cache_enable_at.get(username) == enable_at:
+                self._due.add(username)
 
-        return [u.username for u in users]
+        cutoff = current_time - default_time_to_active
+        heap = self._disabled_at_heap
+        while heap and heap[0][0] <= cutoff:
+            disabled_at, username = heapq.heappop(heap)
+            if (
+                username not in self._cache_enable_at
+                and self._cache_timestamps.get(username) == disabled_at
+            ):
+                self._due.add(username)
+
+        return list(self._due)
 
     def get_user_remaining_time(self, username: str, default_time_to_active: int) -> int:
         """
@@ -200,15 +272,17 @@ class DBDisabledUsers:
 
         users = self._cache.copy()
 
-        async with get_db() as session:
-            for username in users:
-                await DisabledUserCRUD.remove(session, username)
+        for username in users:
+            self._schedule_write(username, None)
 
         self._cache.clear()
         self._cache_timestamps.clear()
         self._cache_enable_at.clear()
         self._original_groups.clear()
         self._punishment_steps.clear()
+        self._enable_at_heap.clear()
+        self._disabled_at_heap.clear()
+        self._due.clear()
 
         return users
 
@@ -217,24 +291,100 @@ class DBSubnetISPCache:
     """
     Database-backed ISP cache by /24 subnet.
     Caches ISP info by subnet to reduce API calls.
+
+    The whole table is streamed once (single query) into a compact in-memory
+    prefix index: packed /24 integer -> row id -> record tuple, so lookups
+    do no DB I/O. Hit counts are aggregated in memory and written back in
+    bulk every HIT_FLUSH_INTERVAL seconds.
     """
 
+    HIT_FLUSH_INTERVAL = 300
+
     def __init__(self):
         self._initialized = False
-        self._memory_cache: Dict[str, Dict[str, str]] = {}  # Subnet -> ISP info
+        self._init_lock = LoopLocal(asyncio.Lock)
+        # Packed /24 prefix (or the subnet string for non-IPv4 keys) -> row id
+        self._index: Dict[object, int] = {}
+        # Row id -> (subnet, isp, country, city, region)
+        self._records: Dict[int, Tuple[str, Optional[str], Optional[str], Optional[str], Optional[str]]] = {}
+        self._pending_hits: Dict[int, int] = {}
+        self._last_hit_flush = time.time()
+        self._flush_lock = LoopLocal(asyncio.Lock)
+        self._flush_task: Optional[asyncio.Task] = None
 
     async def _ensure_initialized(self):
-        if not self._initialized:
-            await init_db()
-            self._initialized = True
+        if self._initialized:
+            return
+        async with self._init_lock.get():
+            if not self._initialized:
+                await init_db()
+                await self._load()
+                self._initialized = True
+
+    async def preload(self) -> int:
+        """Load the subnet table into memory (called at startup). Returns the subnet count."""
+        await self._ensure_initialized()
+        return len(self._records)
+
+    async def _load(self):
+        """Stream the whole subnet_isp table into the prefix index"""
+        start = time.time()
+        self._index.clear()
+        self._records.clear()
+        async with get_db() as session:
+            async for row_id, subnet, isp, country, city, region in SubnetISPCRUD.stream_all(session):
+                self._index[self._pack_subnet(subnet)] = row_id
+                self._records[row_id] = (subnet, isp, country, city, region)
+        logger.info(f"Loaded {len(self._records)} cached ISP subnets in {time.time() - start:.2f}s")
 
     @staticmethod
     def _get_subnet(ip: str) -> str:
-        """Extract /24 subnet from IP (e.g., 192.168.1.5 -> 192.168.1.0/24)"""
-        parts = ip.split(".")
-        if len(parts) == 4:
-            return f"{parts[0]}.{parts[1]}.{parts[2]}.0/24"
-        return ip
+        """Extract /24 subnet from IP (e.g., 192.168.1.5 -> 192.168.1), same key as the DB"""
+        return SubnetISPCRUD.get_subnet_from_ip(ip)
+
+    @staticmethod
+    def _pack_subnet(subnet: str) -> object:
+        """Pack an IPv4 /24 key ("a.b.c") into a 24-bit integer; other keys are kept as strings"""
+        parts = subnet.split(".")
+        if len(parts) == 3 and all(part.isdigit() for part in parts):
+            a, b, c = (int(part) for part in parts)
+            return (a << 16) | (b << 8) | c
+        return subnet
+
+    def _lookup(self, ip: str, subnet: str) -> Optional[Dict[str, str]]:
+        row_id = self._index.get(self._pack_subnet(subnet))
+        if row_id is None:
+            return None
+        self._pending_hits[row_id] = self._pending_hits.get(row_id, 0) + 1
+        _, isp, country, city, region = self._records[row_id]
+        return {
+            "ip": ip,
+            "isp": isp,
+            "country": country or "Unknown",
+            "city": city or "Unknown",
+            "region": region or "Unknown",
+        }
+
+    def _maybe_flush_hits(self):
+        if time.time() - self._last_hit_flush < self.HIT_FLUSH_INTERVAL:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush_hits())
+
+    async def flush_hits(self):
+        """Write aggregated hit counts to the database in one bulk UPDATE"""
+        async with self._flush_lock.get():
+            self._last_hit_flush = time.time()
+            if not self._pending_hits:
+                return
+            hits, self._pending_hits = self._pending_hits, {}
+            try:
+                async with get_db() as session:
+                    await SubnetISPCRUD.add_hits(session, hits)
+            except Exception as e:
+                logger.error(f"Failed to flush ISP cache hit counts: {e}")
+                for row_id, count in hits.items():
+                    self._pending_hits[row_id] = self._pending_hits.get(row_id, 0) + count
 
     async def get_cached_isp(self, ip: str) -> Optional[Dict[str, str]]:
         """
@@ -248,27 +398,29 @@ class DBSubnetISPCache:
         """
         await self._ensure_initialized()
 
-        subnet = self._get_subnet(ip)
+        isp_info = self._lookup(ip, self._get_subnet(ip))
+        self._maybe_flush_hits()
+        return isp_info
 
-        # Check memory cache first
-        if subnet in self._memory_cache:
-            return self._memory_cache[subnet]
+    async def get_cached_subnets(self, subnets: List[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Get cached ISP info for many subnets from the in-memory index.
 
-        # Check database
-        async with get_db() as session:
-            cached = await SubnetISPCRUD.get_by_ip(session, ip)
-            if cached:
-                isp_info = {
-                    "ip": ip,
-                    "isp": cached.isp,
-                    "country": cached.country or "Unknown",
-                    "city": cached.city or "Unknown",
-                    "region": cached.region or "Unknown",
-                }
-                self._memory_cache[subnet] = isp_info
-                return isp_info
-
-        return None
+        Args:
+            subnets: Subnet keys (e.g. "192.168.1")
+
+        Returns:
+            Dict mapping subnet to ISP info for cached subnets only
+        """
+        await self._ensure_initialized()
+
+        found = {}
+        for subnet in subnets:
+            isp_info = self._lookup(subnet, subnet)
+            if isp_info:
+                found[subnet] = isp_info
+        self._maybe_flush_hits()
+        return found
 
     async def cache_isp(
         self,
@@ -292,9 +444,8 @@ class DBSubnetISPCache:
 
         subnet = self._get_subnet(ip)
 
-        # Save to database
         async with get_db() as session:
-            await SubnetISPCRUD.cache_isp(
+            cached = await SubnetISPCRUD.cache_isp(
                 session,
                 ip=ip,
                 isp=isp_name,
@@ -302,15 +453,11 @@ class DBSubnetISPCache:
                 city=city,
                 region=region,
             )
+            row_id = cached.id
 
-        # Update memory cache
-        self._memory_cache[subnet] = {
-            "ip": ip,
-            "isp": isp_name,
-            "country": country or "Unknown",
-            "city": city or "Unknown",
-            "region": region or "Unknown",
-        }
+        # Update the index
+        self._index[self._pack_subnet(subnet)] = row_id
+        self._records[row_id] = (subnet, isp_name, country, city, region)
 
         logger.debug(f"Cached ISP for subnet {subnet}: {isp_name}")
 
@@ -318,13 +465,16 @@ class DBSubnetISPCache:
         """Get all cached subnet ISP info"""
         await self._ensure_initialized()
 
-        # Need to add get_all method to SubnetISPCRUD
-        # For now, return memory cache
-        return self._memory_cache.copy()
-
-    def clear_memory_cache(self):
-        """Clear only the in-memory cache"""
-        self._memory_cache.clear()
+        return {
+            subnet: {
+                "ip": subnet,
+                "isp": isp,
+                "country": country or "Unknown",
+                "city": city or "Unknown",
+                "region": region or "Unknown",
+            }
+            for subnet, isp, country, city, region in self._records.values()
+        }
 
 
 class DBViolationHistory:
@@ -345,8 +495,9 @@ class DBViolationHistory:
         username: str,
         step_applied: int,
         duration_minutes: int,
+        timestamp: Optional[float] = None,
     ):
-        """Record a new violation"""
+        """Record a new violation (a single-row insert)"""
         await self._ensure_initialized()
 
         async with get_db() as session:
@@ -355,6 +506,7 @@ class DBViolationHistory:
                 username=username,
                 step_applied=step_applied,
                 disable_duration=duration_minutes,
+                timestamp=timestamp,
             )
 
         logger.info(f"Recorded violation for {username} (step {step_applied})")
@@ -379,16 +531,34 @@ class DBViolationHistory:
                 session, username, window_hours=window_hours
             )
 
-    async def get_user_violations(self, username: str, limit: int = 10) -> List[dict]:
-        """Get recent violations for a user"""
+    async def get_window_stats(
+        self, username: str, window_hours: int = 168
+    ) -> Tuple[int, Optional[float]]:
+        """
+        Violation count within the time window and the oldest timestamp in it.
+
+        Returns:
+            (count, oldest timestamp or None)
+        """
+        await self._ensure_initialized()
+
+        async with get_db() as session:
+            return await ViolationHistoryCRUD.get_window_stats(
+                session, username, since=time.time() - window_hours * 3600
+            )
+
+    async def get_user_violations(
+        self, username: str, limit: int = 10, window_hours: int = 24 * 365
+    ) -> List[dict]:
+        """Get recent violations for a user, newest first"""
         await self._ensure_initialized()
 
         async with get_db() as session:
             violations = await ViolationHistoryCRUD.get_user_violations(
-                session, username, window_hours=24*365  # Get all within a year
+                session, username, window_hours=window_hours, limit=limit
             )
             result = []
-            for v in violations[:limit]:
+            for v in violations:
                 result.append({
                     "username": v.username,
                     "timestamp": v.timestamp,
@@ -420,7 +590,7 @@ class DBViolationHistory:
         """Remove violations older than window"""
         await self._ensure_initialized()
 
-        days = window_hours // 24
+        days = max(1, -(-window_hours // 24))  # Round up so nothing in the window is deleted
 
         async with get_db() as session:
             await ViolationHistoryCRUD.cleanup_old(session, days=days)
@@ -475,6 +645,103 @@ class DBConfig:
         return self._cache.copy()
 
 
+class DBIPHistory:
+    """
+    Database-backed IP history.
+    Observations are buffered in memory and upserted in a single batch by a
+    background task, so the check cycle never waits on the database.
+    """
+
+    CLEANUP_INTERVAL = 3600  # Seconds between retention cleanups
+
+    def __init__(self, retention_hours: int = 48):
+        self._initialized = False
+        self.retention_hours = retention_hours
+        # (username, ip) -> (node_name, inbound_protocol, seen_at)
+        self._pending: Dict[Tuple[str, str], Tuple[Optional[str], Optional[str], datetime]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = LoopLocal(asyncio.Lock)
+        self._last_cleanup = 0.0
+
+    async def _ensure_initialized(self):
+        if not self._initialized:
+            await init_db()
+            self._initialized = True
+
+    def record_observations(
+        self,
+        observations: List[Tuple[str, str, Optional[str], Optional[str]]],
+    ):
+        """
+        Queue (username, ip, node_name, inbound_protocol) observations.
+        Returns immediately; the write happens in a background flush.
+        """
+        now = datetime.utcnow()
+        for username, ip, node_name, inbound_protocol in observations:
+            previous = self._pending.get((username, ip))
+            if previous is not None:
+                node_name = node_name or previous[0]
+                inbound_protocol = inbound_protocol or previous[1]
+            self._pending[(username, ip)] = (node_name, inbound_protocol, now)
+
+        if self._pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> int:
+        """Write all pending observations to the database"""
+        await self._ensure_initialized()
+
+        written = 0
+        async with self._flush_lock.get():
+            while self._pending:
+                batch, self._pending = self._pending, {}
+                rows = [
+                    (username, ip, node_name, inbound_protocol, seen_at)
+                    for (username, ip), (node_name, inbound_protocol, seen_at) in batch.items()
+                ]
+                try:
+                    async with get_db() as session:
+                        written += await IPHistoryCRUD.record_batch(session, rows)
+                except Exception as e:
+                    logger.error(f"Failed to write {len(rows)} IP history rows: {e}")
+                    # Keep the rows for the next flush unless newer observations replaced them
+                    for key, observation in batch.items():
+                        self._pending.setdefault(key, observation)
+                    break
+
+            if time.time() - self._last_cleanup >= self.CLEANUP_INTERVAL:
+                self._last_cleanup = time.time()
+                try:
+                    async with get_db() as session:
+                        await IPHistoryCRUD.cleanup_old(session, hours=self.retention_hours)
+                except Exception as e:
+                    logger.error(f"Failed to clean up IP history: {e}")
+
+        return written
+
+    async def import_observations(
+        self,
+        observations: List[Tuple[str, str, Optional[str], Optional[str], datetime]],
+    ) -> int:
+        """
+        Write (username, ip, node_name, inbound_protocol, seen_at) rows directly,
+        e.g. when importing the legacy JSON history. Errors are raised to the caller.
+        """
+        await self._ensure_initialized()
+        async with get_db() as session:
+            return await IPHistoryCRUD.record_batch(session, observations)
+
+    async def get_ips_since(self, hours: int, min_ips: int = 0) -> Dict[str, Set[str]]:
+        """
+        Get IPs per user seen within the last `hours`.
+        Pending observations are flushed first so results are current.
+        """
+        await self.flush()
+
+        async with get_db() as session:
+            return await IPHistoryCRUD.get_ips_since(session, hours, min_ips=min_ips)
+
+
 # ============================================================================
 # Singleton instances
 # ============================================================================
@@ -483,6 +750,7 @@ _db_disabled_users: Optional[DBDisabledUsers] = None
 _db_subnet_cache: Optional[DBSubnetISPCache] = None
 _db_violation_history: Optional[DBViolationHistory] = None
 _db_config: Optional[DBConfig] = None
+_db_ip_history: Optional[DBIPHistory] = None
 
 
 def get_db_disabled_users() -> DBDisabledUsers:
@@ -515,3 +783,11 @@ def get_db_config() -> DBConfig:
     if _db_config is None:
         _db_config = DBConfig()
     return _db_config
+
+
+def get_db_ip_history() -> DBIPHistory:
+    """Get or create the database-backed IP history"""
+    global _db_ip_history
+    if _db_ip_history is None:
+        _db_ip_history = DBIPHistory()
+    return _db_ip_history
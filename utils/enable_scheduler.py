@@ -0,0 +1,160 @@
+"""
+Enable Scheduler - delay queue for re-enabling disabled users
+
+Keeps a min-heap of (due_at, username) so the enable loop can sleep until
+exactly the next user is due instead of polling and scanning every
+disabled user. Scheduling and cancelling are O(log n) / O(1); superseded
+heap entries are skipped lazily when popped.
+"""
+
+import asyncio
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.logs import get_logger
+from utils.loop_local import LoopLocal
+
+scheduler_logger = get_logger("enable_scheduler")
+
+
+class EnableScheduler:
+    """
+    Heap-based delay queue of users waiting to be re-enabled.
+
+    A user is due at their custom enable_at time if set, otherwise
+    disabled_at + default_time_to_active.
+    """
+
+    def __init__(self, default_time_to_active: int = 1800):
+        self.default_time_to_active = default_time_to_active
+        self._heap: List[Tuple[float, str]] = []
+        # username -> (disabled_at, enable_at)
+        self._entries: Dict[str, Tuple[float, Optional[float]]] = {}
+        # username -> due time of the user's live heap entry
+        self._due_at: Dict[str, float] = {}
+        # Created per event loop - limiter.py restarts with a new asyncio.run
+        self._wakeup = LoopLocal(asyncio.Event)
+
+    def __len__(self) -> int:
+        return len(self._due_at)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._due_at
+
+    def _push(self, username: str, due_at: float):
+        previous_next = self.next_due()
+        self._due_at[username] = due_at
+        heapq.heappush(self._heap, (due_at, username))
+        # Wake the waiter if this user is now the earliest
+        if previous_next is None or due_at < previous_next:
+            self._wake()
+
+    def schedule(self, username: str, disabled_at: float, enable_at: Optional[float] = None):
+        """Schedule (or reschedule) a user to be enabled"""
+        self._entries[username] = (disabled_at, enable_at)
+        due_at = enable_at if enable_at else disabled_at + self.default_time_to_active
+        self._push(username, due_at)
+        scheduler_logger.debug(
+            f"⏰ {username} scheduled for {time.strftime('%H:%M:%S', time.localtime(due_at))}"
+        )
+
+    def cancel(self, username: str) -> bool:
+        """Cancel a user's scheduled enable. Returns True if it was scheduled."""
+        self._entries.pop(username, None)
+        return self._due_at.pop(username, None) is not None
+
+    def clear(self):
+        """Cancel all scheduled enables"""
+        self._heap.clear()
+        self._entries.clear()
+        self._due_at.clear()
+
+    def rebuild(self, disabled_users: Dict[str, float], enable_at: Dict[str, float]):
+        """
+        Rebuild the queue from storage.
+
+        Args:
+            disabled_users: {username: disabled_timestamp}
+            enable_at: {username: enable_at_timestamp} for custom durations
+        """
+        self._entries = {
+            username: (disabled_at, enable_at.get(username))
+            for username, disabled_at in disabled_users.items()
+        }
+        self._due_at = {
+            username: custom if custom else disabled_at + self.default_time_to_active
+            for username, (disabled_at, custom) in self._entries.items()
+        }
+        self._heap = [(due_at, username) for username, due_at in self._due_at.items()]
+        heapq.heapify(self._heap)
+        self._wake()
+        scheduler_logger.debug(f"🔄 Rebuilt enable schedule with {len(self._heap)} users")
+
+    def set_default_time(self, default_time_to_active: int):
+        """Change the default duration, rescheduling users that rely on it"""
+        if default_time_to_active == self.default_time_to_active:
+            return
+        self.default_time_to_active = default_time_to_active
+        for username, (disabled_at, enable_at) in list(self._entries.items()):
+            if not enable_at:
+                self._push(username, disabled_at + default_time_to_active)
+
+    def _wake(self):
+        """Wake a waiting wait_for_due (no-op outside an event loop)"""
+        try:
+            self._wakeup.get().set()
+        except RuntimeError:
+            pass
+
+    def _discard_stale(self):
+        while self._heap and self._due_at.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        """Time the next user is due, or None if nothing is scheduled"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """Remove and return all users that are due"""
+        if now is None:
+            now = time.time()
+        due = []
+        while True:
+            next_due = self.next_due()
+            if next_due is None or next_due > now:
+                break
+            _, username = heapq.heappop(self._heap)
+            del self._due_at[username]
+            self._entries.pop(username, None)
+            due.append(username)
+        return due
+
+    async def wait_for_due(self, timeout: Optional[float] = None) -> List[str]:
+        """
+        Sleep until the next user is due (or the schedule changes, or
+        `timeout` elapses) and return the users that are due.
+        May return an empty list if woken early.
+        """
+        wakeup = self._wakeup.get()
+        wakeup.clear()
+        due = self.pop_due()
+        if due:
+            return due
+
+        next_due = self.next_due()
+        delay = None if next_due is None else max(0.0, next_due - time.time())
+        if timeout is not None:
+            delay = timeout if delay is None else min(delay, timeout)
+
+        try:
+            await asyncio.wait_for(wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+        return self.pop_due()
+
+
+# Global instance
+enable_scheduler = EnableScheduler()
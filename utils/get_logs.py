@@ -16,8 +16,9 @@ except ImportError:
         "Module 'httpx' is not installed use: 'pip install httpx' to install it"
     )
     sys.exit()
-from telegram_bot.send_message import send_logs, edit_message
+from telegram_bot.send_message import send_logs
 from utils.logs import logger  # pylint: disable=ungrouped-imports
+from utils.node_status_board import node_status_board
 from utils.panel_api import get_nodes, get_token
 from utils.parse_logs import parse_logs, set_current_node_info
 from utils.types import NodeType, PanelType
@@ -26,71 +27,15 @@ TASKS = []
 
 task_node_mapping = {}
 
-# Track the status message for node connections
-_node_status_message_id = None
-_node_connection_status = {}  # node_id -> {"name": str, "status": str}
 
-
-async def _build_node_status_message() -> str:
-    """Build a formatted message showing all node connection statuses."""
-    global _node_connection_status
-    
-    if not _node_connection_status:
-        return "🔄 <b>SSE Node Connections</b>\n\nNo nodes to connect."
-    
-    time_str = datetime.now().strftime("%H:%M:%S")
-    lines = [f"🔄 <b>SSE Node Connections</b> - {time_str}\n"]
-    
-    for node_id in sorted(_node_connection_status.keys()):
-        info = _node_connection_status[node_id]
-        lines.append(f"  {info['status']} Node {node_id}: <code>{info['name']}</code>")
-    
-    # Count statuses
-    connected = sum(1 for info in _node_connection_status.values() if "✅" in info['status'])
-    connecting = sum(1 for info in _node_connection_status.values() if "⏳" in info['status'])
-    failed = sum(1 for info in _node_connection_status.values() if "❌" in info['status'])
-    
-    lines.append(f"\n📊 Connected: {connected} | Connecting: {connecting} | Failed: {failed}")
-    
-    return "\n".join(lines)
-
-
-async def _update_node_status(node_id: int, node_name: str, status: str) -> None:
-    """Update the status of a node and refresh the message."""
-    global _node_connection_status, _node_status_message_id
-    
-    _node_connection_status[node_id] = {"name": node_name, "status": status}
-    
-    message = await _build_node_status_message()
-    
-    if _node_status_message_id:
-        # Try to edit the existing message
-        result = await edit_message(_node_status_message_id, message)
-        if not result:
-            # If edit fails, send a new message
-            _node_status_message_id = await send_logs(message, return_message_id=True)
-    else:
-        # Send initial message
-        _node_status_message_id = await send_logs(message, return_message_id=True)
+def _update_node_status(node_id: int, node_name: str, status: str) -> None:
+    """Update the status of a node; the status message is refreshed in the background."""
+    node_status_board.update(node_id, node_name, status)
 
 
 async def init_node_status_message(nodes: list) -> None:
-    """Initialize the status message with all nodes showing as connecting."""
-    global _node_connection_status, _node_status_message_id
-    
-    _node_connection_status = {}
-    _node_status_message_id = None
-    
-    for node in nodes:
-        if node.status == "connected":
-            _node_connection_status[node.node_id] = {
-                "name": node.node_name,
-                "status": "⏳ Connecting..."
-            }
-    
-    if _node_connection_status:
-        message = await _build_node_status_message()
-        _node_status_message_id = await send_logs(message, return_message_id=True)
+    """Start a new status message with all connected nodes showing as connecting."""
+    node_status_board.reset(nodes)
 
 
 async def get_nodes_logs(panel_data: PanelType, node: NodeType) -> None:
@@ -104,8 +49,6 @@ async def get_nodes_logs(panel_data: PanelType, node: NodeType) -> None:
     Raises:
         ValueError: If there is an issue with getting the panel token.
     """
-    global _node_connection_status
-    
     # Set current node information for log parsing
     await set_current_node_info(node.node_id, node.node_name)
     
@@ -139,7 +82,7 @@ async def get_nodes_logs(panel_data: PanelType, node: NodeType) -> None:
                         )
                     
                     # Update status to connected
-                    await _update_node_status(node.node_id, node.node_name, "✅ Connected")
+                    _update_node_status(node.node_id, node.node_name, "✅ Connected")
                     
                     async for line in response.aiter_lines():
                         if line.startswith("data: "):
@@ -148,17 +91,17 @@ async def get_nodes_logs(panel_data: PanelType, node: NodeType) -> None:
                                 await parse_logs(log_data, node.node_id, node.node_name)
                                 
         except httpx.HTTPStatusError as error:
-            await _update_node_status(node.node_id, node.node_name, "❌ HTTP Error")
+            _update_node_status(node.node_id, node.node_name, "❌ HTTP Error")
             logger.error(f"HTTP error connecting to node {node.node_id}: {error}")
             await asyncio.sleep(10)
-            await _update_node_status(node.node_id, node.node_name, "⏳ Reconnecting...")
+            _update_node_status(node.node_id, node.node_name, "⏳ Reconnecting...")
             continue
             
         except Exception as error:  # pylint: disable=broad-except
-            await _update_node_status(node.node_id, node.node_name, "❌ Failed")
+            _update_node_status(node.node_id, node.node_name, "❌ Failed")
             logger.error(f"Failed to connect to node {node.node_id}: {error}")
             await asyncio.sleep(10)
-            await _update_node_status(node.node_id, node.node_name, "⏳ Reconnecting...")
+            _update_node_status(node.node_id, node.node_name, "⏳ Reconnecting...")
             continue
 
 
@@ -170,8 +113,6 @@ async def handle_cancel(panel_data: PanelType, tasks: list[Task]) -> None:
         panel_data (PanelType): The credentials for the panel.
         tasks (list[Task]): The list of tasks to be cancelled.
     """
-    global _node_connection_status
-    
     deactivate_nodes = {}  # task_name -> node_id
     while True:
         nodes_list = await get_nodes(panel_data)
@@ -187,8 +128,8 @@ async def handle_cancel(panel_data: PanelType, tasks: list[Task]) -> None:
                 logger.info(f"Cancelling disconnected node task: {task_name}")
                 
                 # Update status to show disconnected
-                if node_id in _node_connection_status:
-                    await _update_node_status(node_id, _node_connection_status[node_id]["name"], "⚫ Disconnected")
+                if node_id in node_status_board:
+                    _update_node_status(node_id, node_status_board.name_of(node_id), "⚫ Disconnected")
                 
                 del deactivate_nodes[task_name]
                 task.cancel()
@@ -225,8 +166,6 @@ async def handle_cancel_all(tasks: list[Task], panel_data: PanelType, tg: asynci
         panel_data (PanelType): The credentials for the panel.
         tg (asyncio.TaskGroup): The TaskGroup to create new tasks in.
     """
-    global _node_status_message_id, _node_connection_status
-    
     while True:
         # Wait for 2 hours before restarting all SSE connections
         await asyncio.sleep(2 * 60 * 60)  # 2 hours
@@ -244,8 +183,7 @@ async def handle_cancel_all(tasks: list[Task], panel_data: PanelType, tg: asynci
                     task_node_mapping.pop(task)
         
         # Reset status tracking
-        _node_status_message_id = None
-        _node_connection_status = {}
+        node_status_board.reset()
         
         # Small delay to let tasks clean up
         await asyncio.sleep(2)
@@ -273,8 +211,6 @@ async def check_and_add_new_nodes(panel_data: PanelType, tg: asyncio.TaskGroup)
         panel_data (PanelType): The credentials for the panel.
         tg (asyncio.TaskGroup): The TaskGroup to which the new task will be added.
     """
-    global _node_connection_status
-    
     while True:
         all_nodes = await get_nodes(panel_data)
         if all_nodes and not isinstance(all_nodes, ValueError):
@@ -283,14 +219,8 @@ async def check_and_add_new_nodes(panel_data: PanelType, tg: asyncio.TaskGroup)
                     node not in task_node_mapping.values()
                     and node.status == "connected"
                 ):
-                    # Add to status tracking
-                    _node_connection_status[node.node_id] = {
-                        "name": node.node_name,
-                        "status": "⏳ Connecting..."
-                    }
-                    
                     logger.info(f"Add a new node. id: {node.node_id} name: {node.node_name}")
-                    await _update_node_status(node.node_id, node.node_name, "⏳ Connecting...")
+                    _update_node_status(node.node_id, node.node_name, "⏳ Connecting...")
                     await create_node_task(panel_data, tg, node)
         # Check for new nodes every 2 minutes instead of 25 seconds to reduce API calls
         await asyncio.sleep(120)
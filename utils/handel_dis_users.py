@@ -7,6 +7,7 @@ import json
 import os
 import time
 
+from utils.enable_scheduler import enable_scheduler
 from utils.logs import logger
 
 DISABLED_USERS = set()
@@ -125,6 +126,7 @@ class DisabledUsers:
             logger.info(f"User {username} disabled at {time.strftime('%H:%M:%S', time.localtime(current_time))}, "
                        f"will be enabled around {enable_time} (default)")
         
+        enable_scheduler.schedule(username, current_time, self.enable_at.get(username))
         await self.save_disabled_users()
 
     async def remove_user(self, username: str):
@@ -142,6 +144,7 @@ class DisabledUsers:
             del DISABLED_USERS_TIMESTAMPS[username]
         if username in DISABLED_USERS_ENABLE_AT:
             del DISABLED_USERS_ENABLE_AT[username]
+        enable_scheduler.cancel(username)
         await self.save_disabled_users()
 
     async def get_users_to_enable(self, default_time_to_active: int) -> list:
@@ -224,5 +227,6 @@ class DisabledUsers:
         DISABLED_USERS.clear()
         DISABLED_USERS_TIMESTAMPS.clear()
         DISABLED_USERS_ENABLE_AT.clear()
+        enable_scheduler.clear()
         await self.save_disabled_users()
         return set(disabled_users)
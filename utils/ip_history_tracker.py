@@ -2,15 +2,26 @@
 IP History Tracker - Tracks unique IPs per user over time periods
 """
 
+import bisect
+import heapq
 import json
 import os
 import time
-from typing import Dict, Set, List, Tuple
+from typing import Dict, Set, List, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 
 from utils.logs import logger
 
+# Try to use the database-backed history, fall back to the JSON file
+try:
+    from utils.db_handler import DB_AVAILABLE, get_db_ip_history
+except ImportError:
+    DB_AVAILABLE = False
+
+# How long IP history is kept for each user (hours)
+HISTORY_RETENTION_HOURS = 48
+
 
 @dataclass
 class IPHistoryEntry:
@@ -21,34 +32,137 @@ class IPHistoryEntry:
 
 @dataclass
 class UserIPHistory:
-    """IP history for a user"""
+    """
+    IP history for a user.
+    Entries are kept sorted by timestamp so time-window queries and
+    cleanup can bisect to the cutoff instead of scanning every entry.
+    """
     username: str
     entries: List[IPHistoryEntry] = field(default_factory=list)
+    # Parallel list of entry timestamps used for bisect lookups
+    _timestamps: List[float] = field(default_factory=list, repr=False)
+    # IP -> most recent timestamp the IP was seen
+    _last_seen: Dict[str, float] = field(default_factory=dict, repr=False)
+    
+    def __post_init__(self):
+        if self.entries:
+            self.entries.sort(key=lambda entry: entry.timestamp)
+            self._timestamps = [entry.timestamp for entry in self.entries]
+            self._last_seen = {}
+            for entry in self.entries:
+                self._last_seen[entry.ip] = entry.timestamp
+    
+    @property
+    def last_activity(self) -> float:
+        """Timestamp of the most recent entry (0 if there are none)"""
+        return self._timestamps[-1] if self._timestamps else 0.0
+    
+    @property
+    def distinct_ip_count(self) -> int:
+        """Number of distinct IPs over the whole retained history"""
+        return len(self._last_seen)
     
     def add_ip(self, ip: str, timestamp: float = None):
         """Add an IP to history"""
         if timestamp is None:
             timestamp = time.time()
-        self.entries.append(IPHistoryEntry(timestamp=timestamp, ip=ip))
+        entry = IPHistoryEntry(timestamp=timestamp, ip=ip)
+        if not self._timestamps or timestamp >= self._timestamps[-1]:
+            self.entries.append(entry)
+            self._timestamps.append(timestamp)
+        else:
+            index = bisect.bisect_right(self._timestamps, timestamp)
+            self.entries.insert(index, entry)
+            self._timestamps.insert(index, timestamp)
+        if timestamp > self._last_seen.get(ip, 0.0):
+            self._last_seen[ip] = timestamp
     
-    def get_unique_ips_since(self, hours: int) -> Set[str]:
+    def get_unique_ips_since(self, hours: int, now: Optional[float] = None) -> Set[str]:
         """Get unique IPs seen in the last X hours"""
-        cutoff_time = time.time() - (hours * 3600)
-        return {entry.ip for entry in self.entries if entry.timestamp >= cutoff_time}
+        cutoff_time = (now if now is not None else time.time()) - (hours * 3600)
+        start = bisect.bisect_left(self._timestamps, cutoff_time)
+        # The same IPs are recorded every cycle, so the per-IP last-seen map
+        # is usually much smaller than the window slice - use whichever is cheaper.
+        if len(self._timestamps) - start > len(self._last_seen):
+            return {ip for ip, seen in self._last_seen.items() if seen >= cutoff_time}
+        return {entry.ip for entry in self.entries[start:]}
     
-    def cleanup_old_entries(self, max_hours: int = 48):
-        """Remove entries older than max_hours"""
-        cutoff_time = time.time() - (max_hours * 3600)
-        self.entries = [entry for entry in self.entries if entry.timestamp >= cutoff_time]
+    def cleanup_old_entries(self, max_hours: int = HISTORY_RETENTION_HOURS, now: Optional[float] = None) -> int:
+        """
+        Remove entries older than max_hours.
+        
+        Returns:
+            Number of removed entries
+        """
+        cutoff_time = (now if now is not None else time.time()) - (max_hours * 3600)
+        index = bisect.bisect_left(self._timestamps, cutoff_time)
+        if not index:
+            return 0
+        for entry in self.entries[:index]:
+            if self._last_seen.get(entry.ip, 0.0) < cutoff_time:
+                self._last_seen.pop(entry.ip, None)
+        del self.entries[:index]
+        del self._timestamps[:index]
+        return index
 
 
 class IPHistoryTracker:
-    """Tracks IP history for all users"""
+    """
+    Tracks IP history for all users.
+    
+    When the database is available, observations are written to the
+    ip_history table in batches and reports query it directly. Otherwise
+    history is kept in memory and persisted to a JSON file, with a min-heap
+    of (last_activity, username) so inactive users can be expired without
+    scanning every user's history each cycle.
+    """
     
-    def __init__(self, filename=".ip_history.json"):
+    def __init__(self, filename=".ip_history.json", use_db: bool = True):
         self.filename = filename
         self.user_histories: Dict[str, UserIPHistory] = {}
-        self.load_history()
+        # One heap entry per user; stale entries are re-queued lazily on pop
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._scheduled: Set[str] = set()
+        self._db_history = (
+            get_db_ip_history()
+            if use_db and DB_AVAILABLE else None
+        )
+        self._legacy_checked = False
+        if self._db_history is None:
+            self.load_history()
+    
+    async def _import_legacy_file(self):
+        """Import the JSON history into the database once, then rename the file"""
+        if self._legacy_checked or self._db_history is None:
+            return
+        self._legacy_checked = True
+        if not os.path.exists(self.filename):
+            return
+        try:
+            self.load_history()
+            cutoff_time = time.time() - HISTORY_RETENTION_HOURS * 3600
+            observations = [
+                (username, entry.ip, None, None, datetime.utcfromtimestamp(entry.timestamp))
+                for username, user_history in self.user_histories.items()
+                for entry in user_history.entries
+                if entry.timestamp >= cutoff_time
+            ]
+            if observations:
+                await self._db_history.import_observations(observations)
+            os.replace(self.filename, f"{self.filename}.migrated")
+            logger.info(f"Imported {len(observations)} IP history entries from {self.filename} into the database")
+        except Exception as e:
+            logger.error(f"Error importing IP history from {self.filename}: {e}")
+        finally:
+            self.user_histories = {}
+            self._expiry_heap = []
+            self._scheduled = set()
+    
+    def _schedule_expiry(self, username: str, timestamp: float):
+        """Queue a user for inactivity expiry checks if not already queued"""
+        if username not in self._scheduled:
+            heapq.heappush(self._expiry_heap, (timestamp, username))
+            self._scheduled.add(username)
     
     def load_history(self):
         """Load IP history from file"""
@@ -57,22 +171,27 @@ class IPHistoryTracker:
                 with open(self.filename, "r", encoding="utf-8") as f:
                     data = json.load(f)
                     for username, history_data in data.items():
-                        user_history = UserIPHistory(username=username)
-                        for entry_data in history_data.get("entries", []):
-                            user_history.entries.append(
-                                IPHistoryEntry(
-                                    timestamp=entry_data["timestamp"],
-                                    ip=entry_data["ip"]
-                                )
+                        entries = [
+                            IPHistoryEntry(
+                                timestamp=entry_data["timestamp"],
+                                ip=entry_data["ip"]
                             )
+                            for entry_data in history_data.get("entries", [])
+                        ]
+                        user_history = UserIPHistory(username=username, entries=entries)
                         self.user_histories[username] = user_history
+                        self._schedule_expiry(username, user_history.last_activity)
                 logger.info(f"Loaded IP history for {len(self.user_histories)} users")
         except Exception as e:
             logger.error(f"Error loading IP history: {e}")
             self.user_histories = {}
+            self._expiry_heap = []
+            self._scheduled = set()
     
     async def save_history(self):
-        """Save IP history to file"""
+        """Save IP history to file (database writes are flushed in the background)"""
+        if self._db_history is not None:
+            return
         try:
             data = {}
             for username, user_history in self.user_histories.items():
@@ -92,8 +211,30 @@ class IPHistoryTracker:
         except Exception as e:
             logger.error(f"Error saving IP history: {e}")
     
-    async def record_user_ips(self, username: str, ips: Set[str]):
-        """Record IPs for a user at current time"""
+    async def record_user_ips(self, username: str, ips: Set[str], connections: Optional[list] = None):
+        """
+        Record IPs for a user at current time
+        
+        Args:
+            username: Username
+            ips: Unique IPs seen this cycle
+            connections: Optional ConnectionInfo list providing node/inbound per IP
+        """
+        if self._db_history is not None:
+            await self._import_legacy_file()
+            conn_by_ip = {conn.ip: conn for conn in connections or []}
+            observations = []
+            for ip in ips:
+                conn = conn_by_ip.get(ip)
+                observations.append((
+                    username,
+                    ip,
+                    conn.node_name if conn else None,
+                    conn.inbound_protocol if conn else None,
+                ))
+            self._db_history.record_observations(observations)
+            return
+        
         current_time = time.time()
         
         if username not in self.user_histories:
@@ -106,7 +247,8 @@ class IPHistoryTracker:
             user_history.add_ip(ip, current_time)
         
         # Cleanup old entries (keep 48 hours)
-        user_history.cleanup_old_entries(max_hours=48)
+        user_history.cleanup_old_entries(max_hours=HISTORY_RETENTION_HOURS, now=current_time)
+        self._schedule_expiry(username, current_time)
     
     async def get_users_exceeding_limits(self, hours: int, config_data: dict) -> List[Tuple[str, int, int, Set[str]]]:
         """
@@ -123,17 +265,37 @@ class IPHistoryTracker:
         special_limit = limits_config.get("special", {})
         general_limit = limits_config.get("general", 2)
         
+        if self._db_history is not None:
+            await self._import_legacy_file()
+            # Only users above the smallest configured limit can exceed theirs
+            min_limit = min([int(general_limit)] + [int(v) for v in special_limit.values()])
+            ips_by_user = await self._db_history.get_ips_since(hours, min_ips=min_limit)
+            for username, unique_ips in ips_by_user.items():
+                if username in except_users:
+                    continue
+                user_limit = int(special_limit.get(username, general_limit))
+                if len(unique_ips) > user_limit:
+                    results.append((username, len(unique_ips), user_limit, unique_ips))
+            results.sort(key=lambda x: x[1], reverse=True)
+            return results
+        
+        now = time.time()
         for username, user_history in self.user_histories.items():
             if username in except_users:
                 continue
             
-            # Get unique IPs in time period
-            unique_ips = user_history.get_unique_ips_since(hours)
-            ip_count = len(unique_ips)
-            
             # Get user's limit
             user_limit = int(special_limit.get(username, general_limit))
             
+            # Distinct IPs over the whole history bound the window count,
+            # so users that can't exceed their limit skip the window query
+            if user_history.distinct_ip_count <= user_limit:
+                continue
+            
+            # Get unique IPs in time period
+            unique_ips = user_history.get_unique_ips_since(hours, now=now)
+            ip_count = len(unique_ips)
+            
             # Only include if exceeded limit
             if ip_count > user_limit:
                 results.append((username, ip_count, user_limit, unique_ips))
@@ -145,21 +307,37 @@ class IPHistoryTracker:
     
     async def cleanup_inactive_users(self, active_users: Set[str]):
         """Remove users who are no longer active"""
-        # Keep users who have entries in last 48 hours
-        cutoff_time = time.time() - (48 * 3600)
+        # Database rows are expired by retention cleanup in the writer
+        if self._db_history is not None:
+            return
         
-        users_to_remove = []
-        for username, user_history in self.user_histories.items():
-            # Check if user has any recent entries
-            has_recent = any(entry.timestamp >= cutoff_time for entry in user_history.entries)
-            if not has_recent and username not in active_users:
-                users_to_remove.append(username)
+        # Keep users who have entries in last 48 hours
+        current_time = time.time()
+        cutoff_time = current_time - (HISTORY_RETENTION_HOURS * 3600)
         
-        for username in users_to_remove:
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] < cutoff_time:
+            _, username = heapq.heappop(self._expiry_heap)
+            self._scheduled.discard(username)
+            
+            user_history = self.user_histories.get(username)
+            if user_history is None:
+                continue
+            
+            # Heap entry was stale - user has been seen since it was queued
+            if user_history.last_activity >= cutoff_time:
+                self._schedule_expiry(username, user_history.last_activity)
+                continue
+            
+            if username in active_users:
+                self._schedule_expiry(username, current_time)
+                continue
+            
             del self.user_histories[username]
+            removed += 1
         
-        if users_to_remove:
-            logger.info(f"Cleaned up {len(users_to_remove)} inactive users from IP history")
+        if removed:
+            logger.info(f"Cleaned up {removed} inactive users from IP history")
     
     async def generate_report(self, hours: int, config_data: dict, isp_detector=None) -> str:
         """
@@ -0,0 +1,232 @@
+"""
+ISP Cache - tiered subnet-level ISP cache
+
+Lookups go through three tiers, all keyed by /24 subnet (see get_subnet_key):
+1. Bounded in-process LRU
+2. Redis (or its in-memory fallback), 7 day TTL
+3. Database (subnet_isp table)
+
+A hit in a lower tier is promoted into the tiers above it. New results are
+stored in the LRU immediately and written back to Redis and the database by
+a background task. Hits and misses are counted per tier.
+"""
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from utils.logs import get_logger
+from utils.loop_local import LoopLocal
+
+isp_cache_logger = get_logger("isp_cache")
+
+# Try to import Redis cache
+try:
+    from utils.redis_cache import get_cached_isp_many, cache_isp_many
+    REDIS_CACHE_AVAILABLE = True
+except ImportError:
+    REDIS_CACHE_AVAILABLE = False
+
+# Try to import database-backed subnet cache
+try:
+    from utils.db_handler import get_db_subnet_cache, DB_AVAILABLE
+except ImportError:
+    DB_AVAILABLE = False
+    get_db_subnet_cache = None
+
+# Maximum number of subnets kept in the in-process tier
+ISP_CACHE_MAX_ENTRIES = int(os.environ.get("ISP_CACHE_MAX_ENTRIES", "10000"))
+
+TIERS = ("memory", "redis", "db")
+
+
+def get_subnet_key(ip: str) -> str:
+    """
+    Cache key shared by all ISP cache tiers (same as SubnetISPCRUD.get_subnet_from_ip).
+    e.g., 192.168.1.100 -> 192.168.1
+    """
+    parts = ip.split(".")
+    if len(parts) == 4:
+        return ".".join(parts[:3])
+    if ":" in ip:
+        return ":".join(ip.split(":")[:4])
+    return ip
+
+
+class LRUCache:
+    """Bounded dict that evicts the least recently used key"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class TieredISPCache:
+    """
+    Memory → Redis → database ISP cache keyed by subnet.
+
+    Args:
+        max_entries: Size of the in-process LRU tier
+        use_db: Use the database tier (if the db module is available)
+    """
+
+    def __init__(self, max_entries: int = ISP_CACHE_MAX_ENTRIES, use_db: bool = True):
+        self._memory = LRUCache(max_entries)
+        self._db_cache = get_db_subnet_cache() if use_db and DB_AVAILABLE else None
+        self._stats = {tier: {"hits": 0, "misses": 0} for tier in TIERS}
+        # Write-back queue: subnet -> (representative ip, isp info)
+        self._pending: Dict[str, tuple] = {}
+        self._lock = LoopLocal(asyncio.Lock)
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _count(self, tier: str, hits: int, misses: int):
+        self._stats[tier]["hits"] += hits
+        self._stats[tier]["misses"] += misses
+
+    async def get_many(self, subnets: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Look up subnets through every tier (one Redis MGET, one DB query).
+
+        Returns:
+            Dict mapping subnet to ISP info for cached subnets only
+        """
+        subnets = list(dict.fromkeys(subnets))
+        found: Dict[str, Dict[str, str]] = {}
+        for subnet in subnets:
+            isp_info = self._memory.get(subnet)
+            if isp_info is not None:
+                found[subnet] = isp_info
+        missing = [subnet for subnet in subnets if subnet not in found]
+        self._count("memory", len(found), len(missing))
+
+        # Redis tier
+        if missing and REDIS_CACHE_AVAILABLE:
+            try:
+                redis_hits = await get_cached_isp_many(missing)
+            except Exception as e:
+                isp_cache_logger.warning(f"Redis ISP lookup failed: {e}")
+                redis_hits = {}
+            self._count("redis", len(redis_hits), len(missing) - len(redis_hits))
+            for subnet, isp_info in redis_hits.items():
+                self._memory.put(subnet, isp_info)
+                found[subnet] = isp_info
+            missing = [subnet for subnet in missing if subnet not in found]
+
+        # Database tier
+        if missing and self._db_cache:
+            try:
+                db_hits = await self._db_cache.get_cached_subnets(missing)
+            except Exception as e:
+                isp_cache_logger.warning(f"Database ISP lookup failed: {e}")
+                db_hits = {}
+            self._count("db", len(db_hits), len(missing) - len(db_hits))
+            for subnet, isp_info in db_hits.items():
+                self._memory.put(subnet, isp_info)
+                found[subnet] = isp_info
+                # Promote to Redis only - the database already has it
+                self._queue_write(subnet, isp_info.get("ip", subnet), isp_info, to_db=False)
+
+        return found
+
+    async def put(self, ip: str, isp_info: Dict[str, str]):
+        """Store a fresh lookup result; Redis and database are written in the background"""
+        if isp_info.get("isp") == "Unknown ISP":
+            return
+        subnet = get_subnet_key(ip)
+        self._memory.put(subnet, isp_info)
+        self._queue_write(subnet, ip, isp_info, to_db=True)
+
+    def _queue_write(self, subnet: str, ip: str, isp_info: Dict[str, str], to_db: bool):
+        previous = self._pending.get(subnet)
+        self._pending[subnet] = (ip, isp_info, to_db or (previous is not None and previous[2]))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """
+        Write queued results back to Redis and the database.
+        Results queued while a write is in progress are written by the next pass.
+        """
+        async with self._lock.get():
+            while self._pending:
+                pending, self._pending = self._pending, {}
+                await self._write_back(pending)
+
+    async def _write_back(self, pending: Dict[str, tuple]):
+        # Redis - one pipelined round trip for all entries
+        if REDIS_CACHE_AVAILABLE:
+            try:
+                await cache_isp_many(
+                    {subnet: isp_info for subnet, (_, isp_info, _) in pending.items()}
+                )
+            except Exception as e:
+                isp_cache_logger.warning(f"Failed to cache ISP in Redis: {e}")
+
+        for subnet, (ip, isp_info, to_db) in pending.items():
+            if to_db and self._db_cache:
+                try:
+                    await self._db_cache.cache_isp(
+                        ip=ip,
+                        isp_name=isp_info.get("isp", "Unknown ISP"),
+                        country=isp_info.get("country"),
+                        city=isp_info.get("city"),
+                        region=isp_info.get("region"),
+                    )
+                except Exception as e:
+                    isp_cache_logger.warning(f"Failed to save ISP to database cache: {e}")
+
+        isp_cache_logger.debug(f"💾 Wrote back {len(pending)} ISP cache entries")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Size and per-tier hit rates"""
+        tiers = {}
+        for tier, counts in self._stats.items():
+            lookups = counts["hits"] + counts["misses"]
+            tiers[tier] = {
+                **counts,
+                "hit_rate": round(counts["hits"] / lookups, 3) if lookups else 0.0,
+            }
+        return {
+            "memory_entries": len(self._memory),
+            "max_entries": self._memory.max_entries,
+            "pending_writes": len(self._pending),
+            "tiers": tiers,
+        }
+
+    def clear_memory(self):
+        """Clear only the in-process tier"""
+        self._memory.clear()
+
+
+# Global instance
+_isp_cache: Optional[TieredISPCache] = None
+
+
+def get_isp_cache() -> TieredISPCache:
+    """Get or create the shared tiered ISP cache"""
+    global _isp_cache
+    if _isp_cache is None:
+        _isp_cache = TieredISPCache()
+    return _isp_cache
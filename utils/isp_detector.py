@@ -1,27 +1,36 @@
 """
 ISP Detection Module
 This module provides functionality to detect ISP information for IP addresses
-Uses Redis cache when available for fast lookups, with fallback to in-memory and database.
+Lookups go through the tiered subnet cache (memory LRU, Redis, database) before the APIs.
 """
 
 import asyncio
+import time
 import aiohttp
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional
+from utils.isp_cache import TieredISPCache, get_isp_cache, get_subnet_key
 from utils.logs import logger
+from utils.rate_governor import (
+    PRIORITY_MONITORED,
+    PRIORITY_NORMAL,
+    get_governor,
+    parse_retry_after,
+)
 
-# Try to import Redis cache
+# Try to import database module availability
 try:
-    from utils.redis_cache import get_cached_isp, cache_isp
-    REDIS_CACHE_AVAILABLE = True
-except ImportError:
-    REDIS_CACHE_AVAILABLE = False
-
-# Try to import database-backed subnet cache
-try:
-    from utils.db_handler import get_db_subnet_cache, DB_AVAILABLE
+    from utils.db_handler import DB_AVAILABLE
 except ImportError:
     DB_AVAILABLE = False
-    get_db_subnet_cache = None
+
+
+# Seconds a subnet whose lookup failed is not looked up again
+FAILED_LOOKUP_TTL = 300
+
+
+def default_isp_info(ip: str) -> Dict[str, str]:
+    """ISP info returned when a lookup fails"""
+    return {"ip": ip, "isp": "Unknown ISP", "country": "Unknown", "city": "Unknown", "region": "Unknown"}
 
 
 class ISPDetector:
@@ -41,12 +50,14 @@ class ISPDetector:
         self.token = token
         self.use_fallback_only = use_fallback_only
         self.use_db_cache = use_db_cache and DB_AVAILABLE
-        self.cache = {}  # Simple cache to avoid repeated API calls
-        self.rate_limit_delay = 1  # 1 second delay between requests
-        self.last_request_time = 0
-        self.rate_limited = False  # Track if we're rate limited
+        # Shared tiered subnet cache (a private memory/Redis one without the database)
+        self.cache = get_isp_cache() if self.use_db_cache else TieredISPCache(use_db=False)
+        # Shared per-provider rate governors (also used by parse_logs)
+        self._ipinfo = get_governor("ipinfo")
+        self._ip_api = get_governor("ip-api")
         self._session = None  # Shared aiohttp session
-        self._db_cache = get_db_subnet_cache() if self.use_db_cache else None
+        # subnet -> monotonic time of a failed lookup (short negative cache)
+        self._failed_lookups: Dict[str, float] = {}
         
         if self.use_db_cache:
             logger.info("ISPDetector initialized with database-backed subnet cache")
@@ -74,7 +85,7 @@ class ISPDetector:
     async def get_isp_info(self, ip: str) -> Dict[str, str]:
         """
         Get ISP information for a given IP address.
-        Checks Redis cache first, then memory, then database, finally API.
+        Checks memory first, then Redis and the database (by subnet), finally API.
         
         Args:
             ip (str): IP address to lookup
@@ -82,57 +93,23 @@ class ISPDetector:
         Returns:
             Dict[str, str]: Dictionary containing ISP information
         """
-        # Check Redis cache first (fastest)
-        if REDIS_CACHE_AVAILABLE:
-            try:
-                cached = await get_cached_isp(ip)
-                if cached:
-                    logger.debug(f"ISP Redis cache hit for {ip}")
-                    # Also store in memory cache
-                    self.cache[ip] = cached
-                    return cached
-            except Exception as e:
-                logger.warning(f"Redis cache lookup failed for {ip}: {e}")
-        
-        # Check memory cache
-        if ip in self.cache:
-            return self.cache[ip]
-        
-        # Check database cache (by subnet) if enabled
-        if self._db_cache:
-            try:
-                cached = await self._db_cache.get_cached_isp(ip)
-                if cached:
-                    # Copy to memory cache and Redis
-                    self.cache[ip] = cached
-                    await self._cache_isp_result(ip, cached)
-                    logger.debug(f"ISP cache hit for {ip} (subnet cache)")
-                    return cached
-            except Exception as e:
-                logger.warning(f"Database cache lookup failed: {e}")
-        
+        results = await self.get_multiple_isp_info([ip])
+        return results[ip]
+    
+    async def _fetch_isp_info(self, ip: str, priority: int = PRIORITY_NORMAL) -> Dict[str, str]:
+        """
+        Look up ISP information for an IP from the external APIs.
+        Does not touch any cache.
+        """
         # If use_fallback_only is enabled, skip ipinfo.io and use ip-api.com directly
         if self.use_fallback_only:
-            result = await self._get_isp_fallback(ip)
-            await self._cache_isp_result(ip, result)
-            return result
+            return await self._get_isp_fallback(ip, priority)
         
-        # If we're rate limited, return default info immediately
-        if self.rate_limited:
-            default_info = {
-                "ip": ip,
-                "isp": "Unknown ISP",
-                "country": "Unknown",
-                "city": "Unknown",
-                "region": "Unknown"
-            }
-            self.cache[ip] = default_info
-            return default_info
-            
-        # Rate limiting
-        current_time = asyncio.get_event_loop().time()
-        if current_time - self.last_request_time < self.rate_limit_delay:
-            await asyncio.sleep(self.rate_limit_delay - (current_time - self.last_request_time))
+        # ipinfo.io is cooling down after a 429 - use the fallback until it recovers
+        if self._ipinfo.in_cooldown:
+            return await self._get_isp_fallback(ip, priority)
+        
+        await self._ipinfo.acquire(priority)
         
         try:
             # Try ipinfo.io API first
@@ -151,28 +128,23 @@ class ISPDetector:
                     # Prefer as_domain, fallback to as_name, then org
                     isp_name = data.get("as_domain") or data.get("as_name") or data.get("org", "Unknown ISP")
                     logger.info(f"ISP detected for {ip}: {isp_name}")
-                    isp_info = {
+                    self._ipinfo.report_success()
+                    return {
                         "ip": ip,
                         "isp": isp_name,
                         "country": data.get("country", "Unknown"),
                         "city": data.get("city", "Unknown"),
                         "region": data.get("region", "Unknown")
                     }
-                    self.cache[ip] = isp_info
-                    self.last_request_time = asyncio.get_event_loop().time()
-                    # Save to all caches (Redis + database)
-                    await self._cache_isp_result(ip, isp_info)
-                    return isp_info
                 elif response.status == 429:
-                    # Rate limited - set flag and return default
-                    self.rate_limited = True
+                    # Rate limited - cool down and use the fallback meanwhile
+                    self._ipinfo.report_rate_limited(parse_retry_after(response.headers))
                     logger.warning(f"ISP detection rate limited for {ip}")
+                    return await self._get_isp_fallback(ip, priority)
                 elif response.status == 403:
                     # Forbidden - try fallback API
                     logger.warning(f"ipinfo.io returned 403 for {ip}, trying fallback API...")
-                    result = await self._get_isp_fallback(ip)
-                    await self._cache_isp_result(ip, result)
-                    return result
+                    return await self._get_isp_fallback(ip, priority)
                 else:
                     response_text = await response.text()
                     logger.warning(f"Failed to get ISP info for {ip}: HTTP {response.status} - {response_text}")
@@ -180,69 +152,33 @@ class ISPDetector:
         except asyncio.TimeoutError:
             logger.error(f"Timeout getting ISP info for {ip}")
             # Try fallback on timeout
-            result = await self._get_isp_fallback(ip)
-            await self._cache_isp_result(ip, result)
-            return result
+            return await self._get_isp_fallback(ip, priority)
         except Exception as e:
             logger.error(f"Error getting ISP info for {ip}: {type(e).__name__}: {e}")
             # Try fallback on any error
-            result = await self._get_isp_fallback(ip)
-            await self._cache_isp_result(ip, result)
-            return result
+            return await self._get_isp_fallback(ip, priority)
         
         # Return default info if lookup fails
-        default_info = {
-            "ip": ip,
-            "isp": "Unknown ISP",
-            "country": "Unknown",
-            "city": "Unknown",
-            "region": "Unknown"
-        }
-        self.cache[ip] = default_info
-        return default_info
+        return default_isp_info(ip)
     
-    async def _save_to_db_cache(self, ip: str, isp_info: Dict[str, str]):
-        """Save ISP info to database cache (by subnet)"""
-        if self._db_cache and isp_info.get("isp") != "Unknown ISP":
-            try:
-                await self._db_cache.cache_isp(
-                    ip=ip,
-                    isp_name=isp_info.get("isp", "Unknown ISP"),
-                    country=isp_info.get("country"),
-                    city=isp_info.get("city"),
-                    region=isp_info.get("region"),
-                )
-            except Exception as e:
-                logger.warning(f"Failed to save ISP to database cache: {e}")
-    
-    async def _cache_isp_result(self, ip: str, isp_info: Dict[str, str]):
-        """Cache ISP result to Redis (primary) and database (backup)"""
-        if isp_info.get("isp") == "Unknown ISP":
-            return
-        
-        # Cache to Redis (7 day TTL)
-        if REDIS_CACHE_AVAILABLE:
-            try:
-                await cache_isp(ip, isp_info)
-                logger.debug(f"Cached ISP for {ip} in Redis")
-            except Exception as e:
-                logger.warning(f"Failed to cache ISP in Redis: {e}")
-        
-        # Also save to database as backup
-        await self._save_to_db_cache(ip, isp_info)
-    
-    async def _get_isp_fallback(self, ip: str) -> Dict[str, str]:
+    async def _get_isp_fallback(self, ip: str, priority: int = PRIORITY_NORMAL) -> Dict[str, str]:
         """
         Fallback method to get ISP info using alternative free APIs
         
         Args:
             ip (str): IP address to lookup
+            priority (int): Rate governor priority for the request
             
         Returns:
             Dict[str, str]: ISP information dictionary
         """
+        # ip-api.com is cooling down after a 429 - don't queue behind it
+        if self._ip_api.in_cooldown:
+            return default_isp_info(ip)
+        
         # Try ip-api.com (free, no token needed, 45 req/min)
         try:
+            await self._ip_api.acquire(priority)
             url = f"http://ip-api.com/json/{ip}?fields=status,message,country,countryCode,region,regionName,city,isp,org,as,asname"
             
             session = await self._get_session()
@@ -260,60 +196,93 @@ class ISPDetector:
                             "region": data.get("regionName", "Unknown")
                         }
                         logger.info(f"✓ Fallback API success for {ip}: {isp_info['isp']}")
-                        self.cache[ip] = isp_info
+                        self._ip_api.report_success()
                         return isp_info
                     else:
                         logger.warning(f"Fallback API returned failure status for {ip}")
+                elif response.status == 429:
+                    self._ip_api.report_rate_limited(parse_retry_after(response.headers))
+                    logger.warning(f"Fallback API rate limited for {ip}")
         except Exception as e:
             logger.error(f"Fallback API failed for {ip}: {e}")
         
         # If all fails, return default
-        default_info = {
-            "ip": ip,
-            "isp": "Unknown ISP",
-            "country": "Unknown",
-            "city": "Unknown",
-            "region": "Unknown"
-        }
-        return default_info
+        return default_isp_info(ip)
     
-    async def get_multiple_isp_info(self, ips: list[str]) -> Dict[str, Dict[str, str]]:
+    async def get_multiple_isp_info(
+        self, ips: list[str], priority_ips: Optional[Iterable[str]] = None
+    ) -> Dict[str, Dict[str, str]]:
         """
         Get ISP information for multiple IP addresses efficiently.
-        Uses semaphore to limit concurrent requests and prevent rate limiting.
+        
+        IPs are collapsed to unique /24 subnets before any lookup. Each cache
+        tier is queried once for all remaining subnets (one Redis MGET, one
+        DB IN query), only true misses go to the API (one IP per subnet),
+        and results are fanned back out to every IP in the subnet.
+        
+        Subnets containing any of `priority_ips` (IPs of users under active
+        monitoring) are looked up first and jump the rate governor queues.
         
         Args:
             ips (list[str]): List of IP addresses
+            priority_ips (Optional[Iterable[str]]): IPs to resolve first
             
         Returns:
             Dict[str, Dict[str, str]]: Dictionary mapping IP to ISP info
         """
-        # Filter out already cached IPs
-        uncached_ips = [ip for ip in ips if ip not in self.cache]
+        subnet_ips: Dict[str, List[str]] = {}
+        for ip in dict.fromkeys(ips):
+            subnet_ips.setdefault(get_subnet_key(ip), []).append(ip)
         
-        if uncached_ips:
+        # Cache tiers - memory, then one Redis MGET, then one DB query
+        resolved = await self.cache.get_many(subnet_ips)
+        
+        # API - one representative IP per uncached subnet, skipping recent failures
+        self._expire_failed_lookups()
+        missing = [
+            subnet for subnet in subnet_ips
+            if subnet not in resolved and subnet not in self._failed_lookups
+        ]
+        if missing:
+            priority_subnets = {get_subnet_key(ip) for ip in priority_ips or ()}
+            missing.sort(key=lambda subnet: subnet not in priority_subnets)
+            logger.debug(f"ISP lookup: {len(subnet_ips)} subnets, {len(missing)} need API calls")
             # Limit concurrent requests to avoid overwhelming the API
             semaphore = asyncio.Semaphore(5)
             
-            async def bounded_get_isp_info(ip: str):
+            async def bounded_fetch(subnet: str):
                 async with semaphore:
-                    return await self.get_isp_info(ip)
+                    ip = subnet_ips[subnet][0]
+                    priority = PRIORITY_MONITORED if subnet in priority_subnets else PRIORITY_NORMAL
+                    isp_info = await self._fetch_isp_info(ip, priority)
+                    await self.cache.put(ip, isp_info)
+                    return subnet, isp_info
             
-            # Process in batches of 10 to be gentle on API
-            batch_size = 10
-            for i in range(0, len(uncached_ips), batch_size):
-                batch = uncached_ips[i:i + batch_size]
-                tasks = [bounded_get_isp_info(ip) for ip in batch]
-                await asyncio.gather(*tasks, return_exceptions=True)
-                
-                # Small delay between batches if we have more
-                if i + batch_size < len(uncached_ips):
-                    await asyncio.sleep(0.5)
+            results = await asyncio.gather(
+                *(bounded_fetch(subnet) for subnet in missing), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"ISP lookup failed: {result}")
+                    continue
+                subnet, isp_info = result
+                resolved[subnet] = isp_info
+                if isp_info.get("isp") == "Unknown ISP":
+                    self._failed_lookups[subnet] = time.monotonic()
+        
+        # Fan results out to every IP of each subnet
+        isp_by_ip = {}
+        for subnet, subnet_members in subnet_ips.items():
+            isp_info = resolved.get(subnet)
+            for ip in subnet_members:
+                isp_by_ip[ip] = {**isp_info, "ip": ip} if isp_info else default_isp_info(ip)
         
-        # Build result from cache
-        def default_info(ip_addr):
-            return {"ip": ip_addr, "isp": "Unknown ISP", "country": "Unknown", "city": "Unknown", "region": "Unknown"}
-        return {ip: self.cache.get(ip, default_info(ip)) for ip in ips}
+        return isp_by_ip
+    
+    def _expire_failed_lookups(self):
+        cutoff = time.monotonic() - FAILED_LOOKUP_TTL
+        for subnet in [s for s, failed_at in self._failed_lookups.items() if failed_at < cutoff]:
+            del self._failed_lookups[subnet]
     
     def format_ip_with_isp(self, ip: str, isp_info: Dict[str, str]) -> str:
         """
@@ -343,5 +312,6 @@ class ISPDetector:
         return f"{ip} ({isp}, {country})"
     
     def clear_cache(self):
-        """Clear the ISP cache"""
-        self.cache.clear()
+        """Clear the in-memory ISP cache tier and the failed lookups"""
+        self.cache.clear_memory()
+        self._failed_lookups.clear()
@@ -0,0 +1,35 @@
+"""
+Loop-local asyncio primitives.
+
+asyncio Events, Locks and Conditions bind to the event loop they are first
+used in. limiter.py restarts with a fresh `asyncio.run(main())`, so module
+level singletons must not keep primitives from a previous loop around;
+LoopLocal creates a new one the first time it is used in each running loop.
+"""
+
+import asyncio
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LoopLocal(Generic[T]):
+    """
+    Lazily created object, recreated when used in a different event loop.
+
+    Args:
+        factory: Creates the object, e.g. asyncio.Event
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._value: Optional[T] = None
+
+    def get(self) -> T:
+        """The object for the running loop (must be called from a coroutine or callback)"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._value = self._factory()
+        return self._value
@@ -0,0 +1,132 @@
+"""
+Node status board - the Telegram message listing SSE node connection states.
+
+Status changes only update the in-memory state; a background task sends or
+edits the message at most once per NODE_STATUS_EDIT_INTERVAL, with whatever
+the state is at that point. SSE tasks never wait on Telegram.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from utils.logs import get_logger
+
+node_status_logger = get_logger("node_status")
+
+# Minimum seconds between two sends/edits of the board
+NODE_STATUS_EDIT_INTERVAL = 5.0
+
+
+class NodeStatusBoard:
+    """
+    In-memory node statuses mirrored to one Telegram message.
+
+    Args:
+        interval: Minimum seconds between two edits
+    """
+
+    def __init__(self, interval: float = NODE_STATUS_EDIT_INTERVAL):
+        self.interval = interval
+        self._status: Dict[int, Dict[str, str]] = {}  # node_id -> {"name": str, "status": str}
+        self._message_info: Optional[Tuple[int, int]] = None
+        self._last_text: Optional[str] = None
+        self._last_flush = 0.0
+        self._dirty = False
+        # Bumped on reset so an in-flight send for the old board is discarded
+        self._generation = 0
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self._status
+
+    def name_of(self, node_id: int) -> Optional[str]:
+        info = self._status.get(node_id)
+        return info["name"] if info else None
+
+    def update(self, node_id: int, node_name: str, status: str):
+        """Record a node's status; the message is refreshed in the background"""
+        info = self._status.get(node_id)
+        if info and info["name"] == node_name and info["status"] == status:
+            return
+        self._status[node_id] = {"name": node_name, "status": status}
+        self._mark_dirty()
+
+    def reset(self, nodes: Iterable = ()):
+        """Start a new board message with the connected nodes as connecting"""
+        self._status = {
+            node.node_id: {"name": node.node_name, "status": "⏳ Connecting..."}
+            for node in nodes
+            if node.status == "connected"
+        }
+        self._message_info = None
+        self._last_text = None
+        self._generation += 1
+        if self._status:
+            self._mark_dirty()
+        else:
+            self._dirty = False
+
+    def build_message(self) -> str:
+        """Formatted message showing all node connection statuses"""
+        if not self._status:
+            return "🔄 <b>SSE Node Connections</b>\n\nNo nodes to connect."
+
+        time_str = datetime.now().strftime("%H:%M:%S")
+        lines = [f"🔄 <b>SSE Node Connections</b> - {time_str}\n"]
+
+        for node_id in sorted(self._status):
+            info = self._status[node_id]
+            lines.append(f"  {info['status']} Node {node_id}: <code>{info['name']}</code>")
+
+        # Count statuses
+        statuses = [info["status"] for info in self._status.values()]
+        connected = sum(1 for status in statuses if "✅" in status)
+        connecting = sum(1 for status in statuses if "⏳" in status)
+        failed = sum(1 for status in statuses if "❌" in status)
+
+        lines.append(f"\n📊 Connected: {connected} | Connecting: {connecting} | Failed: {failed}")
+
+        return "\n".join(lines)
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._dirty:
+            wait = self._last_flush + self.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+            try:
+                await self.flush()
+            except Exception as e:  # pylint: disable=broad-except
+                node_status_logger.error(f"❌ Failed to update node status message: {e}")
+
+    async def flush(self):
+        """Send or edit the board message with the current state"""
+        from telegram_bot.send_message import edit_message, send_logs
+
+        # Only the timestamp changed - nothing to edit
+        text = self.build_message()
+        if self._last_text is not None and text.split("\n", 1)[1:] == self._last_text.split("\n", 1)[1:]:
+            return
+
+        generation = self._generation
+        if self._message_info and await edit_message(self._message_info, text):
+            self._last_text = text
+            return
+
+        # No message yet, or the edit failed - send a new one
+        message_info = await send_logs(text, return_message_id=True)
+        if generation == self._generation:
+            self._message_info = message_info
+            self._last_text = text
+
+
+# Shared board
+node_status_board = NodeStatusBoard()
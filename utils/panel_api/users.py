@@ -3,16 +3,18 @@ User operations for panel API.
 """
 
 import asyncio
+import os
 import random
 import time
 from ssl import SSLError
 
 import httpx
 
+from utils.enable_scheduler import enable_scheduler
 from utils.handel_dis_users import DisabledUsers
 from utils.user_groups_storage import UserGroupsStorage
 from utils.logs import logger, log_api_request, log_user_action, get_logger
-from utils.read_config import read_config
+from utils.read_config import current_config, read_config
 from utils.types import PanelType, UserType
 from utils.panel_api.auth import get_token, invalidate_token_cache, safe_send_logs_panel
 
@@ -677,9 +679,9 @@ async def enable_selected_users(
         ValueError: If the function fails to enable the users.
     """
     users_logger.info(f"✅ Enabling {len(inactive_users)} selected users...")
-    data = await read_config()
-    disable_method = data.get("disable_method", "status")
-    disabled_group_id = data.get("disabled_group_id", None)
+    config = await current_config()
+    disable_method = config.disable_method
+    disabled_group_id = config.disabled_group_id
     use_group_method = disable_method == "group" and disabled_group_id is not None
     
     users_logger.debug(f"Using enable method: {'group' if use_group_method else 'status'}")
@@ -853,9 +855,9 @@ async def disable_user(panel_data: PanelType, username: UserType, duration_secon
         await safe_send_logs_panel(message)
         return None
     
-    data = await read_config()
-    disable_method = data.get("disable_method", "status")
-    disabled_group_id = data.get("disabled_group_id", None)
+    config = await current_config()
+    disable_method = config.disable_method
+    disabled_group_id = config.disabled_group_id
     
     users_logger.debug(f"Using disable method: {disable_method} (disabled_group_id={disabled_group_id})")
     
@@ -916,7 +918,7 @@ async def disable_user_with_punishment(panel_data: PanelType, username: UserType
     data = await read_config()
     punishment, step_index, violation_count = await get_punishment_for_user(username.name, data)
     
-    users_logger.debug(f"⚖️ Punishment for {username.name}: step={step_index}, violations={violation_count}, type={punishment.action_type if punishment else 'none'}")
+    users_logger.debug(f"⚖️ Punishment for {username.name}: step={step_index}, violations={violation_count}, type={punishment.step_type if punishment else 'none'}")
     
     punishment_enabled = data.get("punishment", {}).get("enabled", True)
     
@@ -984,31 +986,71 @@ async def disable_user_with_punishment(panel_data: PanelType, username: UserType
         }
 
 
+# Longest the enable loop sleeps before re-checking config and storage
+ENABLE_RESYNC_INTERVAL = 60
+# Delay before retrying users whose re-enable failed
+ENABLE_RETRY_DELAY = 30
+
+
+def _disabled_users_mtime(filename: str) -> float:
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return 0.0
+
+
 async def enable_dis_user(panel_data: PanelType):
     """
     Enable disabled users individually based on when each was disabled.
     Each user is enabled after 'time_to_active_users' seconds from their disable time.
+
+    Sleeps on the enable scheduler until the next user is due. The schedule
+    is rebuilt from storage at startup and whenever the disabled users file
+    is changed by another process (e.g. the API server).
     """
     users_logger.info("🔄 Starting disabled user enable loop...")
+    synced_mtime = None
+    
     while True:
-        await asyncio.sleep(30)
-        
         try:
-            data = await read_config()
-            time_to_active = data.get("monitoring", {}).get("time_to_active_users", 1800)
+            config = await current_config()
+            enable_scheduler.set_default_time(config.time_to_active_users)
             
             dis_obj = DisabledUsers()
-            users_to_enable = await dis_obj.get_users_to_enable(time_to_active)
+            mtime = _disabled_users_mtime(dis_obj.filename)
+            if mtime != synced_mtime:
+                enable_scheduler.rebuild(dis_obj.disabled_users, dis_obj.enable_at)
+                synced_mtime = mtime
             
-            if users_to_enable:
-                users_logger.info(f"✅ Enabling {len(users_to_enable)} users: {users_to_enable}")
+            users_to_enable = await enable_scheduler.wait_for_due(timeout=ENABLE_RESYNC_INTERVAL)
+            if not users_to_enable:
+                continue
+            
+            # Reload - users may have been enabled manually while we slept
+            dis_obj = DisabledUsers()
+            users_to_enable = [u for u in users_to_enable if u in dis_obj.disabled_users]
+            if not users_to_enable:
+                continue
+            
+            users_logger.info(f"✅ Enabling {len(users_to_enable)} users: {users_to_enable}")
+            try:
                 await enable_selected_users(panel_data, set(users_to_enable))
-                
+            except Exception:
+                now = time.time()
                 for username in users_to_enable:
-                    await dis_obj.remove_user(username)
-                    users_logger.info(f"✅ User {username} has been re-enabled")
+                    enable_scheduler.schedule(
+                        username,
+                        dis_obj.disabled_users[username],
+                        enable_at=now + ENABLE_RETRY_DELAY,
+                    )
+                raise
+            
+            for username in users_to_enable:
+                await dis_obj.remove_user(username)
+                users_logger.info(f"✅ User {username} has been re-enabled")
         except Exception as e:
             users_logger.error(f"Error in enable_dis_user loop: {e}")
+            await asyncio.sleep(ENABLE_RETRY_DELAY)
 
 
 async def cleanup_deleted_users(panel_data: PanelType) -> dict:
@@ -8,8 +8,9 @@ import re
 import sys
 import time
 
-from utils.check_usage import ACTIVE_USERS
-from utils.read_config import read_config
+from utils.check_usage import ACTIVE_USERS, warning_system
+from utils.rate_governor import get_governor, parse_retry_after
+from utils.read_config import current_config
 from utils.types import ConnectionInfo, DeviceInfo, UserType
 
 try:
@@ -34,6 +35,11 @@ INVALID_IPS = {
 }
 VALID_IPS = []
 CACHE = {}
+# ip -> monotonic time of a failed country lookup
+FAILED_LOOKUPS = {}
+# Seconds a failed lookup is not retried
+FAILED_LOOKUP_TTL = 300
+FAILED_LOOKUPS_MAX = 10000
 
 API_ENDPOINTS = {
     "http://ip-api.com/json/": "countryCode",
@@ -42,6 +48,14 @@ API_ENDPOINTS = {
     "https://ipapi.co/": None,
 }
 
+# Rate governor (shared with the ISP detector) for each endpoint
+API_PROVIDERS = {
+    "http://ip-api.com/json/": "ip-api",
+    "https://ipinfo.io/": "ipinfo",
+    "https://api.iplocation.net/?ip=": "iplocation",
+    "https://ipapi.co/": "ipapi.co",
+}
+
 
 async def remove_id_from_username(username: str) -> str:
     """
@@ -61,6 +75,10 @@ async def check_ip(ip_address: str) -> None | str:
 
     Get the location of the IP address.
     The result is cached to avoid unnecessary requests for the same IP address.
+    Runs inline in the log parse loop, so it never waits for a rate limit:
+    only providers with a free token in their shared rate governor are used,
+    and None is returned when none has one. Failed lookups are remembered
+    for FAILED_LOOKUP_TTL seconds so they don't use up tokens on every line.
 
     Args:
         ip_address (str): The IP address to check.
@@ -70,20 +88,52 @@ async def check_ip(ip_address: str) -> None | str:
     """
     if ip_address in CACHE:
         return CACHE[ip_address]
-    endpoint, key = random.choice(list(API_ENDPOINTS.items()))
+    failed_at = FAILED_LOOKUPS.get(ip_address)
+    if failed_at is not None:
+        if time.monotonic() - failed_at < FAILED_LOOKUP_TTL:
+            return None
+        del FAILED_LOOKUPS[ip_address]
+    ready = [
+        endpoint for endpoint in API_ENDPOINTS
+        if get_governor(API_PROVIDERS[endpoint]).ready()
+    ]
+    if not ready:
+        return None
+    endpoint = random.choice(ready)
+    key = API_ENDPOINTS[endpoint]
+    governor = get_governor(API_PROVIDERS[endpoint])
+    if not governor.try_acquire():
+        return None
     url = endpoint + ip_address
     if "ipapi.co" in endpoint:
         url += "/country"
+    country = None
     try:
         async with httpx.AsyncClient(verify=False) as client:
             resp = await client.get(url, timeout=2)
+        if resp.status_code == 429:
+            governor.report_rate_limited(parse_retry_after(resp.headers))
+            return None
+        governor.report_success()
         info = resp.json()
         country = info.get(key) if key else resp.text
-        if country:
-            CACHE[ip_address] = country
-        return country
     except Exception:  # pylint: disable=broad-except
-        return None
+        pass
+    if country:
+        CACHE[ip_address] = country
+    else:
+        _remember_failed_lookup(ip_address)
+    return country
+
+
+def _remember_failed_lookup(ip_address: str):
+    if len(FAILED_LOOKUPS) >= FAILED_LOOKUPS_MAX:
+        cutoff = time.monotonic() - FAILED_LOOKUP_TTL
+        for ip in [ip for ip, failed_at in FAILED_LOOKUPS.items() if failed_at < cutoff]:
+            del FAILED_LOOKUPS[ip]
+        if len(FAILED_LOOKUPS) >= FAILED_LOOKUPS_MAX:
+            FAILED_LOOKUPS.clear()
+    FAILED_LOOKUPS[ip_address] = time.monotonic()
 
 
 async def is_valid_ip(ip: str) -> bool:
@@ -210,9 +260,11 @@ async def parse_logs(log: str, node_id: int = None, node_name: str = None) -> di
     current_node_id = node_id if node_id is not None else CURRENT_NODE_INFO.get("node_id")
     current_node_name = node_name if node_name is not None else CURRENT_NODE_INFO.get("node_name")
     
-    data = await read_config()
-    if data.get("INVALID_IPS"):
-        INVALID_IPS.update(data.get("INVALID_IPS"))
+    config = await current_config()
+    if config.invalid_ips:
+        INVALID_IPS.update(config.invalid_ips)
+    # Country filter ("None" disables it)
+    ip_location = config.country_code or "IR"
     lines = log.splitlines()
     for line in lines:
         if "accepted" not in line:
@@ -238,8 +290,14 @@ async def parse_logs(log: str, node_id: int = None, node_name: str = None) -> di
         if inbound_match:
             inbound_protocol = inbound_match.group(1).strip()
         
-        # Get IP location from config (new format)
-        ip_location = data.get("monitoring", {}).get("ip_location", "IR")
+        # Extract email
+        if email_match:
+            email = email_match.group(1)
+            email = await remove_id_from_username(email)
+            if email in INVALID_EMAILS:
+                continue
+        else:
+            continue
         
         # Validate IP
         if ip not in VALID_IPS:
@@ -254,15 +312,9 @@ async def parse_logs(log: str, node_id: int = None, node_name: str = None) -> di
                         continue
             else:
                 continue
-        
-        # Extract email
-        if email_match:
-            email = email_match.group(1)
-            email = await remove_id_from_username(email)
-            if email in INVALID_EMAILS:
-                continue
-        else:
-            continue
+
+        # Feed monitored users' activity to the warning system as it arrives
+        warning_system.record_ip_activity(email, ip)
 
         # Update user information
         user = ACTIVE_USERS.get(email)
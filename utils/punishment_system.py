@@ -4,6 +4,8 @@ This module provides an escalating punishment system based on violation history.
 
 The system tracks violations within a configurable time window and applies
 progressively harsher punishments based on the violation count.
+Violations are stored in the violation_history table; counts are windowed
+COUNT queries on its (username, timestamp) index, cached per user.
 
 Example configuration:
 {
@@ -25,12 +27,18 @@ import json
 import os
 import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
+from utils.db_handler import get_db_violation_history
 from utils.logs import get_logger
 
 punishment_logger = get_logger("punishment")
 
+# Upper bound on how long a cached per-user violation count is trusted
+COUNT_CACHE_TTL = 300
+# Minimum seconds between deletions of violations older than the window
+CLEANUP_INTERVAL = 3600
+
 
 @dataclass
 class PunishmentStep:
@@ -67,16 +75,6 @@ class PunishmentStep:
         return f"🔒 {hours}h {remaining_mins}m disable"
 
 
-@dataclass
-class ViolationRecord:
-    """Represents a single violation record"""
-    username: str
-    timestamp: float
-    step_applied: int  # Which step was applied (0-indexed)
-    disable_duration: int  # Duration in minutes (0 = unlimited or warning)
-    enabled_at: Optional[float] = None  # When user was re-enabled (for timed disables)
-
-
 class PunishmentSystem:
     """
     Smart punishment system with escalating penalties.
@@ -96,62 +94,44 @@ class PunishmentSystem:
     DEFAULT_WINDOW_HOURS = 168  # 7 days
     
     def __init__(self, filename=".violation_history.json"):
+        # Legacy JSON history, imported into the database on first use
         self.filename = filename
-        self.violations: dict[str, list[ViolationRecord]] = {}  # username -> list of violations
         self.steps: list[PunishmentStep] = self.DEFAULT_STEPS.copy()
         self.window_hours: int = self.DEFAULT_WINDOW_HOURS
         self.enabled: bool = True
-        self.load_violations()
+        # username -> (violation count in window, time until which the count is valid)
+        self._counts: Dict[str, Tuple[int, float]] = {}
+        self._legacy_checked = False
+        self._last_cleanup = 0.0
     
-    def load_violations(self):
-        """Load violation history from file"""
-        try:
-            if os.path.exists(self.filename):
-                punishment_logger.debug(f"📂 Loading violation history from {self.filename}")
-                with open(self.filename, "r", encoding="utf-8") as file:
-                    data = json.load(file)
-                    
-                    for username, records in data.get("violations", {}).items():
-                        self.violations[username] = []
-                        for record in records:
-                            self.violations[username].append(ViolationRecord(
-                                username=record["username"],
-                                timestamp=record["timestamp"],
-                                step_applied=record["step_applied"],
-                                disable_duration=record["disable_duration"],
-                                enabled_at=record.get("enabled_at")
-                            ))
-                    
-                    # Clean up old violations
-                    self.cleanup_old_violations()
-                    
-                    punishment_logger.info(f"✅ Loaded violation history for {len(self.violations)} users")
-        except Exception as e:
-            punishment_logger.error(f"❌ Error loading violation history: {e}")
-            self.violations = {}
+    @property
+    def _history(self):
+        return get_db_violation_history()
     
-    async def save_violations(self):
-        """Save violation history to file"""
+    async def _import_legacy_file(self):
+        """Import the old JSON violation history into the database once"""
+        if self._legacy_checked:
+            return
+        self._legacy_checked = True
+        if not os.path.exists(self.filename):
+            return
         try:
-            data = {"violations": {}}
-            
-            for username, records in self.violations.items():
-                data["violations"][username] = []
+            with open(self.filename, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            count = 0
+            for username, records in data.get("violations", {}).items():
                 for record in records:
-                    data["violations"][username].append({
-                        "username": record.username,
-                        "timestamp": record.timestamp,
-                        "step_applied": record.step_applied,
-                        "disable_duration": record.disable_duration,
-                        "enabled_at": record.enabled_at
-                    })
-            
-            with open(self.filename, "w", encoding="utf-8") as file:
-                json.dump(data, file, indent=2)
-                
-            punishment_logger.debug(f"💾 Saved violation history for {len(self.violations)} users")
+                    await self._history.record_violation(
+                        username,
+                        record.get("step_applied", 0),
+                        record.get("disable_duration", 0),
+                        timestamp=record.get("timestamp"),
+                    )
+                    count += 1
+            os.replace(self.filename, f"{self.filename}.migrated")
+            punishment_logger.info(f"📦 Imported {count} violations from {self.filename} into the database")
         except Exception as e:
-            punishment_logger.error(f"❌ Error saving violation history: {e}")
+            punishment_logger.error(f"❌ Error importing violation history from {self.filename}: {e}")
     
     def load_config(self, config_data: dict):
         """
@@ -163,7 +143,11 @@ class PunishmentSystem:
         punishment_config = config_data.get("punishment", {})
         
         self.enabled = punishment_config.get("enabled", True)
-        self.window_hours = punishment_config.get("window_hours", self.DEFAULT_WINDOW_HOURS)
+        window_hours = punishment_config.get("window_hours", self.DEFAULT_WINDOW_HOURS)
+        if window_hours != self.window_hours:
+            # Cached counts were taken over the old window
+            self._counts.clear()
+        self.window_hours = window_hours
         
         # Load steps from config
         steps_config = punishment_config.get("steps", None)
@@ -178,36 +162,49 @@ class PunishmentSystem:
             self.steps = self.DEFAULT_STEPS.copy()
             punishment_logger.debug("📋 Using default punishment steps")
     
-    def cleanup_old_violations(self):
-        """Remove violations older than the time window"""
-        current_time = time.time()
-        window_seconds = self.window_hours * 60 * 60
-        cutoff_time = current_time - window_seconds
-        
-        for username in list(self.violations.keys()):
-            # Filter out old violations
-            self.violations[username] = [
-                v for v in self.violations[username]
-                if v.timestamp > cutoff_time
-            ]
-            # Remove user if no recent violations
-            if not self.violations[username]:
-                del self.violations[username]
+    async def cleanup_old_violations(self):
+        """Delete violations older than the time window from the database"""
+        try:
+            await self._history.cleanup_old(self.window_hours)
+        except Exception as e:
+            punishment_logger.error(f"❌ Error cleaning up violation history: {e}")
     
-    def get_violation_count(self, username: str) -> int:
+    async def get_violation_count(self, username: str) -> int:
         """
         Get the number of violations for a user within the time window.
         
+        Counts come from an indexed COUNT query and are cached per user until
+        the oldest violation in the window expires or the user gets a new one.
+        
         Args:
             username: The username to check
             
         Returns:
             Number of violations in the time window
         """
-        self.cleanup_old_violations()
-        return len(self.violations.get(username, []))
+        now = time.time()
+        cached = self._counts.get(username)
+        if cached and now < cached[1]:
+            return cached[0]
+        
+        await self._import_legacy_file()
+        try:
+            count, oldest = await self._history.get_window_stats(username, self.window_hours)
+        except Exception as e:
+            punishment_logger.error(f"❌ Error counting violations for {username}: {e}")
+            return 0
+        
+        valid_until = now + COUNT_CACHE_TTL
+        if oldest is not None:
+            valid_until = min(valid_until, oldest + self.window_hours * 3600)
+        self._counts[username] = (count, valid_until)
+        return count
+    
+    def get_step_index(self, violation_count: int) -> int:
+        """Step index (0-indexed) for a violation count, capped at the last step"""
+        return min(violation_count, len(self.steps) - 1)
     
-    def get_next_step_index(self, username: str) -> int:
+    async def get_next_step_index(self, username: str) -> int:
         """
         Get the index of the next punishment step for a user.
         
@@ -217,11 +214,9 @@ class PunishmentSystem:
         Returns:
             Step index (0-indexed), capped at max step
         """
-        violation_count = self.get_violation_count(username)
-        # Cap at the last step
-        return min(violation_count, len(self.steps) - 1)
+        return self.get_step_index(await self.get_violation_count(username))
     
-    def get_next_punishment(self, username: str) -> PunishmentStep:
+    async def get_next_punishment(self, username: str) -> PunishmentStep:
         """
         Get the next punishment step for a user.
         
@@ -231,8 +226,7 @@ class PunishmentSystem:
         Returns:
             The PunishmentStep to apply
         """
-        step_index = self.get_next_step_index(username)
-        return self.steps[step_index]
+        return self.steps[await self.get_next_step_index(username)]
     
     async def record_violation(self, username: str, step_applied: int, duration_minutes: int):
         """
@@ -243,35 +237,38 @@ class PunishmentSystem:
             step_applied: Which step was applied (0-indexed)
             duration_minutes: Duration of disable in minutes (0 for warning or unlimited)
         """
-        if username not in self.violations:
-            self.violations[username] = []
-        
-        record = ViolationRecord(
-            username=username,
-            timestamp=time.time(),
-            step_applied=step_applied,
-            disable_duration=duration_minutes
-        )
+        await self._import_legacy_file()
+        try:
+            await self._history.record_violation(username, step_applied, duration_minutes)
+        except Exception as e:
+            punishment_logger.error(f"❌ Error recording violation for {username}: {e}")
+            return
+        finally:
+            self._counts.pop(username, None)
         
-        self.violations[username].append(record)
-        await self.save_violations()
+        punishment_logger.info(f"📝 Recorded violation for {username} (step {step_applied}, duration: {duration_minutes}min)")
         
-        punishment_logger.info(f"📝 Recorded violation #{len(self.violations[username])} for {username} (step {step_applied}, duration: {duration_minutes}min)")
+        # Keep the table bounded; at most once per CLEANUP_INTERVAL
+        now = time.time()
+        if now - self._last_cleanup >= CLEANUP_INTERVAL:
+            self._last_cleanup = now
+            await self.cleanup_old_violations()
     
     async def clear_user_history(self, username: str):
         """Clear all violation history for a user"""
-        if username in self.violations:
-            del self.violations[username]
-            await self.save_violations()
-            punishment_logger.info(f"🗑️ Cleared violation history for {username}")
+        await self._import_legacy_file()
+        await self._history.clear_user_history(username)
+        self._counts.pop(username, None)
+        punishment_logger.info(f"🗑️ Cleared violation history for {username}")
     
     async def clear_all_history(self):
         """Clear all violation history"""
-        self.violations = {}
-        await self.save_violations()
+        await self._import_legacy_file()
+        await self._history.clear_all_history()
+        self._counts.clear()
         punishment_logger.info("🗑️ Cleared all violation history")
     
-    def get_user_status(self, username: str) -> dict:
+    async def get_user_status(self, username: str) -> dict:
         """
         Get detailed status for a user.
         
@@ -281,15 +278,19 @@ class PunishmentSystem:
         Returns:
             Dict with violation_count, next_step, history details
         """
-        self.cleanup_old_violations()
-        
-        violations = self.violations.get(username, [])
-        next_step_idx = self.get_next_step_index(username)
+        violation_count = await self.get_violation_count(username)
+        next_step_idx = self.get_step_index(violation_count)
         next_step = self.steps[next_step_idx]
         
+        violations = []
+        if violation_count:
+            violations = await self._history.get_user_violations(
+                username, limit=5, window_hours=self.window_hours
+            )
+        
         return {
             "username": username,
-            "violation_count": len(violations),
+            "violation_count": violation_count,
             "window_hours": self.window_hours,
             "next_step_index": next_step_idx,
             "next_punishment": next_step.get_display_text(),
@@ -297,12 +298,12 @@ class PunishmentSystem:
             "is_unlimited_next": next_step.is_unlimited_disable(),
             "recent_violations": [
                 {
-                    "timestamp": v.timestamp,
-                    "time_ago": self._format_time_ago(v.timestamp),
-                    "step": v.step_applied,
-                    "duration": v.disable_duration
+                    "timestamp": v["timestamp"],
+                    "time_ago": self._format_time_ago(v["timestamp"]),
+                    "step": v["step_applied"],
+                    "duration": v["duration_minutes"]
                 }
-                for v in violations[-5:]  # Last 5 violations
+                for v in reversed(violations)  # Last 5 violations, oldest first
             ]
         }
     
@@ -355,9 +356,9 @@ async def get_punishment_for_user(username: str, config_data: dict) -> tuple[Pun
         # Punishment system disabled - use unlimited disable as default
         return PunishmentStep("disable", 0), 0, 0
     
-    violation_count = system.get_violation_count(username)
-    step_index = system.get_next_step_index(username)
-    punishment = system.get_next_punishment(username)
+    violation_count = await system.get_violation_count(username)
+    step_index = system.get_step_index(violation_count)
+    punishment = system.steps[step_index]
     
     return punishment, step_index, violation_count
 
@@ -0,0 +1,174 @@
+"""
+Rate Governor - shared request budgets for external IP lookup providers
+
+Each provider (ipinfo.io, ip-api.com, ...) gets one token bucket that every
+caller in the process shares, so the ISP detector and the log parser's
+country check never exceed a provider's quota together.
+
+- Waiters are served in priority order (lower value first), so lookups for
+  users under active monitoring go ahead of routine lookups.
+- A 429 puts the provider into a cooldown (Retry-After, or exponential
+  backoff) after which it recovers automatically.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.logs import get_logger
+
+governor_logger = get_logger("rate_governor")
+
+# Waiter priorities (lower is served first)
+PRIORITY_MONITORED = 0
+PRIORITY_NORMAL = 10
+
+# Cooldown after a 429 without Retry-After: doubles per consecutive 429
+BASE_COOLDOWN = 60
+MAX_COOLDOWN = 900
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until_token(self) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class ProviderGovernor:
+    """
+    Rate governor for a single provider.
+
+    Args:
+        name: Provider name (for logs)
+        per_minute: Sustained requests per minute
+        burst: Bucket capacity. Keep per_minute + burst within the provider's
+            per-minute quota so no rolling minute can exceed it.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: int):
+        self.name = name
+        self.bucket = TokenBucket(per_minute / 60.0, burst)
+        self.cooldown_until = 0.0
+        self._consecutive_429 = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @property
+    def in_cooldown(self) -> bool:
+        """True while the provider is backing off after a 429"""
+        return time.monotonic() < self.cooldown_until
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def ready(self) -> bool:
+        """True if a request could be sent right now without waiting"""
+        return not self.in_cooldown and not self._waiters and self.bucket.time_until_token() == 0
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is free right now; never waits"""
+        if not self.ready():
+            return False
+        self.bucket.take()
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL):
+        """Wait for permission to send one request to this provider"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await future
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def _dispatch(self):
+        """Release waiters in priority order as tokens become available"""
+        while self._waiters:
+            if self._waiters[0][2].done():
+                # Cancelled waiter
+                heapq.heappop(self._waiters)
+                continue
+            wait = max(self.cooldown_until - time.monotonic(), self.bucket.time_until_token())
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            self.bucket.take()
+            _, _, future = heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    def report_rate_limited(self, retry_after: Optional[float] = None):
+        """Record a 429 and pause the provider until it should recover"""
+        self._consecutive_429 += 1
+        if retry_after is None:
+            retry_after = min(BASE_COOLDOWN * 2 ** (self._consecutive_429 - 1), MAX_COOLDOWN)
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + retry_after)
+        # Drop any burst allowance so recovery starts slowly
+        self.bucket.tokens = 0
+        governor_logger.warning(f"⏳ {self.name} rate limited, cooling down for {retry_after:.0f}s")
+
+    def report_success(self):
+        """Record a successful request (resets the backoff)"""
+        if self._consecutive_429:
+            governor_logger.info(f"✅ {self.name} recovered from rate limiting")
+        self._consecutive_429 = 0
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait from Retry-After (or ip-api.com's X-Ttl) headers, if present"""
+    for header in ("Retry-After", "X-Ttl"):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                continue
+    return None
+
+
+# Quotas per provider. ip-api.com allows 45 requests/minute;
+# 40/min + burst 5 keeps any rolling minute within that.
+PROVIDER_QUOTAS: Dict[str, Tuple[float, int]] = {
+    "ipinfo": (60, 10),
+    "ip-api": (40, 5),
+    "iplocation": (30, 5),
+    "ipapi.co": (0.5, 2),  # ~1000/day free tier
+}
+
+_governors: Dict[str, ProviderGovernor] = {}
+
+
+def get_governor(provider: str) -> ProviderGovernor:
+    """Get the shared governor for a provider"""
+    governor = _governors.get(provider)
+    if governor is None:
+        per_minute, burst = PROVIDER_QUOTAS.get(provider, (30, 5))
+        governor = ProviderGovernor(provider, per_minute, burst)
+        _governors[provider] = governor
+    return governor
@@ -4,12 +4,22 @@ Reads settings from:
 - Environment variables (.env) for static settings
 - Database for dynamic settings that can be changed via Telegram
 - Redis cache for fast access (with fallback to in-memory)
+
+Hot paths should use the immutable ConfigSnapshot (get_config_snapshot /
+current_config) instead of read_config: it is built once, swapped
+atomically when a setting changes, and read with plain attribute access.
 """
 
+import asyncio
+import copy
 import os
-from typing import Any, Dict, List, Optional
+import time
+from dataclasses import dataclass, fields
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple, Union
 
 from utils.logs import get_logger
+from utils.loop_local import LoopLocal
 
 # Try to import Redis cache
 try:
@@ -25,7 +35,8 @@ config_logger = get_logger("read_config")
 
 # Try to import database module
 try:
-    from db import get_db, ConfigCRUD, UserLimitCRUD, ExceptUserCRUD
+    from db import get_db, ConfigCRUD, ConfigVersionCRUD, UserLimitCRUD, ExceptUserCRUD
+    from db.crud.config import SECTION_CONFIG, SECTION_LIMITS, SECTION_EXCEPT_USERS
     DB_AVAILABLE = True
 except ImportError:
     DB_AVAILABLE = False
@@ -34,10 +45,15 @@ except ImportError:
 _config_cache: Dict[str, Any] = {}
 _cache_loaded = False
 
+# Reuse the in-process copy for this many seconds before asking Redis again,
+# so bursts of reads (one per parsed log chunk) cost a single round trip
+CONFIG_LOCAL_TTL = 2
+_config_cached_at = 0.0
+
 
 async def invalidate_config_cache():
     """Invalidate configuration cache (Redis and in-memory)."""
-    global _config_cache, _cache_loaded
+    global _config_cache, _cache_loaded, _config_cached_at
     
     if REDIS_CACHE_AVAILABLE:
         try:
@@ -48,7 +64,15 @@ async def invalidate_config_cache():
     
     _config_cache = {}
     _cache_loaded = False
+    _config_cached_at = 0.0
     config_logger.info("🔧 Configuration cache invalidated")
+    
+    # Publish the change to snapshot consumers right away
+    if _snapshot is not None:
+        try:
+            await reload_config()
+        except Exception as e:
+            config_logger.warning(f"Failed to reload configuration snapshot: {e}")
 
 
 def _parse_admin_ids(admin_ids_str: str) -> List[int]:
@@ -105,7 +129,8 @@ def load_env_config() -> Dict[str, Any]:
         "except_users": [],  # Loaded from DB
         # Monitoring settings (from ENV)
         "check_interval": _get_env("CHECK_INTERVAL", 60, int),
-        "time_to_active_users": _get_env("TIME_TO_ACTIVE_USERS", 900, int),
+        "time_to_active_users": _get_env("TIME_TO_ACTIVE_USERS", 1800, int),
+        "report_full_interval": _get_env("REPORT_FULL_INTERVAL", 3600, int),
         "country_code": _get_env("COUNTRY_CODE", ""),
         # API settings (from ENV)
         "api": {
@@ -123,29 +148,77 @@ def load_env_config() -> Dict[str, Any]:
     }
 
 
+# DB config sections: section -> (key in load_db_config result, loader)
+_DB_SECTIONS = (
+    (SECTION_CONFIG, "db_config", ConfigCRUD.get_all),
+    (SECTION_LIMITS, "special_limits", UserLimitCRUD.get_all),
+    (SECTION_EXCEPT_USERS, "except_users", ExceptUserCRUD.get_all),
+) if DB_AVAILABLE else ()
+
+# Last loaded data per DB section: section -> (version, data)
+_db_sections: Dict[str, Tuple[int, Any]] = {}
+
+
+async def _get_db_versions(session) -> Optional[Dict[str, int]]:
+    """Current section versions, or None if they can't be read."""
+    try:
+        return await ConfigVersionCRUD.get_all(session)
+    except Exception as e:
+        config_logger.warning(f"Failed to read config versions: {e}")
+        return None
+
+
+async def db_config_changed() -> bool:
+    """
+    Cheap check (one small query) whether any DB config section changed
+    since it was last loaded.
+    """
+    if not DB_AVAILABLE:
+        return False
+    if len(_db_sections) < len(_DB_SECTIONS):
+        return True
+    try:
+        async with get_db() as session:
+            versions = await _get_db_versions(session)
+    except Exception:
+        return False
+    if versions is None:
+        return False
+    return any(
+        versions.get(section, 0) != _db_sections[section][0]
+        for section, _, _ in _DB_SECTIONS
+    )
+
+
 async def load_db_config() -> Dict[str, Any]:
-    """Load dynamic configuration from database."""
+    """
+    Load dynamic configuration from database.
+    
+    Section versions are checked first; only sections whose version changed
+    since the last load are queried again. If the database can't be read,
+    the last loaded sections are returned. Sections are returned as copies,
+    so callers can't change the cached data.
+    """
     if not DB_AVAILABLE:
         return {}
     
     try:
         async with get_db() as session:
-            # Load all config from database
-            db_config = await ConfigCRUD.get_all(session)
-            
-            # Load special limits
-            special_limits = await UserLimitCRUD.get_all(session)
-            
-            # Load except users
-            except_users = await ExceptUserCRUD.get_all(session)
-        
-        return {
-            "db_config": db_config,
-            "special_limits": special_limits,
-            "except_users": except_users,
-        }
-    except Exception:
-        return {}
+            versions = await _get_db_versions(session)
+            for section, _, loader in _DB_SECTIONS:
+                version = versions.get(section, 0) if versions is not None else None
+                cached = _db_sections.get(section)
+                if cached is not None and version is not None and cached[0] == version:
+                    continue
+                # Unknown version (-1) forces a reload next time
+                _db_sections[section] = (version if version is not None else -1, await loader(session))
+                config_logger.debug(f"🔧 Loaded config section '{section}' (v{version})")
+    except Exception as e:
+        config_logger.warning(f"Failed to load configuration from database: {e}")
+        if len(_db_sections) < len(_DB_SECTIONS):
+            return {}
+    
+    return {key: copy.deepcopy(_db_sections[section][1]) for section, key, _ in _DB_SECTIONS}
 
 
 def get_config_sync() -> Dict[str, Any]:
@@ -153,36 +226,8 @@ def get_config_sync() -> Dict[str, Any]:
     return load_env_config()
 
 
-async def read_config(check_required_elements: bool = False) -> Dict[str, Any]:
-    """
-    Read and return merged configuration from ENV and DB.
-    Uses Redis cache when available for fast access.
-    
-    Args:
-        check_required_elements: If True, validate required settings
-        
-    Returns:
-        Complete configuration dictionary
-    """
-    global _config_cache, _cache_loaded
-    
-    # Try Redis cache first
-    if REDIS_CACHE_AVAILABLE and not check_required_elements:
-        try:
-            cached = await get_cached_config()
-            if cached:
-                config_logger.debug("🔧 Using Redis cached config")
-                return cached
-        except Exception as e:
-            config_logger.warning(f"Redis config cache error: {e}")
-    
-    # Check in-memory cache
-    if _cache_loaded and _config_cache and not check_required_elements:
-        config_logger.debug("🔧 Using in-memory cached config")
-        return _config_cache
-    
-    config_logger.debug("🔧 Loading fresh configuration...")
-    
+async def _build_config() -> Dict[str, Any]:
+    """Build the merged configuration from ENV and DB (no caching)."""
     # Load ENV config
     env_config = load_env_config()
     
@@ -249,6 +294,52 @@ async def read_config(check_required_elements: bool = False) -> Dict[str, Any]:
             x.strip() for x in admin_usernames_str.split(",") if x.strip()
         ]
     
+    return config
+
+
+async def read_config(check_required_elements: bool = False) -> Dict[str, Any]:
+    """
+    Read and return merged configuration from ENV and DB.
+    Uses Redis cache when available for fast access.
+    
+    Args:
+        check_required_elements: If True, validate required settings
+        
+    Returns:
+        Complete configuration dictionary. Callers get their own copy and
+        may modify it; the cached configuration is never handed out.
+    """
+    global _config_cache, _cache_loaded, _config_cached_at
+    
+    # Recently fetched copy - no round trip
+    if (
+        _cache_loaded and _config_cache and not check_required_elements
+        and time.time() - _config_cached_at < CONFIG_LOCAL_TTL
+    ):
+        return copy.deepcopy(_config_cache)
+    
+    # Try Redis cache first
+    if REDIS_CACHE_AVAILABLE and not check_required_elements:
+        try:
+            cached = await get_cached_config()
+            if cached:
+                config_logger.debug("🔧 Using Redis cached config")
+                _config_cache = copy.deepcopy(cached)
+                _cache_loaded = True
+                _config_cached_at = time.time()
+                return cached
+        except Exception as e:
+            config_logger.warning(f"Redis config cache error: {e}")
+    
+    # Check in-memory cache
+    if _cache_loaded and _config_cache and not check_required_elements:
+        config_logger.debug("🔧 Using in-memory cached config")
+        return copy.deepcopy(_config_cache)
+    
+    config_logger.debug("🔧 Loading fresh configuration...")
+    
+    config = await _build_config()
+    
     # Validate required elements
     if check_required_elements:
         if not config["panel"]["domain"]:
@@ -260,8 +351,10 @@ async def read_config(check_required_elements: bool = False) -> Dict[str, Any]:
         if not config["telegram"]["admins"]:
             raise ValueError("ADMIN_IDS is not set in environment")
     
-    _config_cache = config
+    _config_cache = copy.deepcopy(config)
     _cache_loaded = True
+    _config_cached_at = time.time()
+    await _swap_snapshot(config)
     
     # Store in Redis cache
     if REDIS_CACHE_AVAILABLE:
@@ -291,9 +384,10 @@ async def save_config_value(key: str, value: Any) -> bool:
     try:
         async with get_db() as session:
             await ConfigCRUD.set(session, key, str(value))
-        return True
     except Exception:
         return False
+    await invalidate_config_cache()
+    return True
 
 
 async def delete_config_value(key: str) -> bool:
@@ -304,9 +398,10 @@ async def delete_config_value(key: str) -> bool:
     try:
         async with get_db() as session:
             await ConfigCRUD.delete(session, key)
-        return True
     except Exception:
         return False
+    await invalidate_config_cache()
+    return True
 
 
 async def get_config_value_from_db(key: str, default: Any = None) -> Any:
@@ -355,6 +450,172 @@ def get_config_value(config: dict, key: str, default: Any = None) -> Any:
     return config.get(key, default)
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# Immutable config snapshot
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Check the DB config versions after this many seconds to pick up changes
+# made by other processes (API server, CLI)
+CONFIG_REFRESH_INTERVAL = 10
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Immutable, typed view of the merged configuration.
+    Never mutated - a new snapshot replaces it when settings change.
+    """
+    
+    version: int
+    panel_domain: str
+    panel_username: str
+    panel_password: str
+    admins: Tuple[int, ...]
+    general_limit: int
+    special_limits: Mapping[str, int]
+    except_users: FrozenSet[str]
+    check_interval: int
+    time_to_active_users: int
+    report_full_interval: int
+    country_code: str
+    invalid_ips: FrozenSet[str]
+    disable_method: str
+    disabled_group_id: Optional[int]
+    enhanced_details: bool
+    show_single_ip_users: bool
+    ipinfo_token: str
+    punishment_enabled: bool
+    punishment_window_hours: int
+    
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any], version: int = 0) -> "ConfigSnapshot":
+        """Build a snapshot from a read_config() dictionary."""
+        punishment = config.get("punishment", {})
+        return cls(
+            version=version,
+            panel_domain=config["panel"]["domain"],
+            panel_username=config["panel"]["username"],
+            panel_password=config["panel"]["password"],
+            admins=tuple(config["telegram"]["admins"]),
+            general_limit=int(config["limits"]["general"]),
+            special_limits=MappingProxyType(
+                {username: int(limit) for username, limit in config["limits"]["special"].items()}
+            ),
+            except_users=frozenset(config.get("except_users", [])),
+            check_interval=int(config["check_interval"]),
+            time_to_active_users=int(config["time_to_active_users"]),
+            report_full_interval=int(config.get("report_full_interval", 3600)),
+            country_code=config.get("country_code", ""),
+            invalid_ips=frozenset(config.get("INVALID_IPS") or ()),
+            disable_method=config.get("disable_method", "status"),
+            disabled_group_id=config.get("disabled_group_id"),
+            enhanced_details=config.get("enhanced_details", True),
+            show_single_ip_users=config.get("show_single_ip_users", False),
+            ipinfo_token=config.get("ipinfo_token", ""),
+            punishment_enabled=punishment.get("enabled", True),
+            punishment_window_hours=punishment.get("window_hours", 168),
+        )
+    
+    def get_limit(self, username: str) -> int:
+        """IP limit for a user (special limit or general limit)."""
+        return self.special_limits.get(username, self.general_limit)
+    
+    def same_settings(self, other: Optional["ConfigSnapshot"]) -> bool:
+        """True if both snapshots hold the same settings (ignoring version)."""
+        if other is None:
+            return False
+        return all(
+            getattr(self, f.name) == getattr(other, f.name)
+            for f in fields(self) if f.name != "version"
+        )
+
+
+ConfigListener = Callable[[Optional[ConfigSnapshot], ConfigSnapshot], Union[None, Awaitable[None]]]
+
+_snapshot: Optional[ConfigSnapshot] = None
+_snapshot_loaded_at = 0.0
+_snapshot_lock = LoopLocal(asyncio.Lock)
+_config_listeners: List[ConfigListener] = []
+
+
+def get_config_snapshot() -> Optional[ConfigSnapshot]:
+    """Current config snapshot (None until first loaded). A plain attribute read."""
+    return _snapshot
+
+
+async def current_config() -> ConfigSnapshot:
+    """
+    Current config snapshot, loading it first if missing. Once stale, the
+    DB config versions are checked and the snapshot is rebuilt only if a
+    section changed.
+    """
+    global _snapshot_loaded_at
+    
+    if _snapshot is None:
+        return await reload_config()
+    if time.time() - _snapshot_loaded_at >= CONFIG_REFRESH_INTERVAL:
+        if await db_config_changed():
+            return await reload_config()
+        _snapshot_loaded_at = time.time()
+    return _snapshot
+
+
+def subscribe_config(listener: ConfigListener):
+    """
+    Call listener(old, new) whenever the configuration changes.
+    Listeners may be plain functions or coroutine functions.
+    """
+    if listener not in _config_listeners:
+        _config_listeners.append(listener)
+
+
+def unsubscribe_config(listener: ConfigListener):
+    """Stop notifying a listener."""
+    if listener in _config_listeners:
+        _config_listeners.remove(listener)
+
+
+async def reload_config() -> ConfigSnapshot:
+    """Rebuild the configuration from ENV and DB and swap in a new snapshot."""
+    global _config_cache, _cache_loaded, _config_cached_at
+    
+    async with _snapshot_lock.get():
+        config = await _build_config()
+        _config_cache = config
+        _cache_loaded = True
+        _config_cached_at = time.time()
+        
+        if REDIS_CACHE_AVAILABLE:
+            try:
+                await cache_config(config)
+            except Exception as e:
+                config_logger.warning(f"Failed to cache config in Redis: {e}")
+        
+        return await _swap_snapshot(config)
+
+
+async def _swap_snapshot(config: Dict[str, Any]) -> ConfigSnapshot:
+    """Replace the snapshot (one reference assignment) and notify listeners if it changed."""
+    global _snapshot, _snapshot_loaded_at
+    
+    old = _snapshot
+    new = ConfigSnapshot.from_dict(config, version=(old.version + 1) if old else 1)
+    _snapshot_loaded_at = time.time()
+    if new.same_settings(old):
+        return old
+    
+    _snapshot = new
+    config_logger.debug(f"🔧 Configuration snapshot v{new.version} published")
+    for listener in list(_config_listeners):
+        try:
+            result = listener(old, new)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            config_logger.error(f"Config listener {getattr(listener, '__name__', listener)} failed: {e}")
+    return new
+
+
 # Compatibility aliases
 async def get_config(*args, **kwargs):
     """Alias for read_config for backward compatibility."""
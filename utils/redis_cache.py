@@ -11,9 +11,14 @@ Replaces:
 """
 
 import os
+import re
 import json
+import time
+import heapq
 import asyncio
-from typing import Any, Dict, List, Optional, Set
+import fnmatch
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
 from datetime import timedelta
 
 from utils.logs import get_logger
@@ -50,144 +55,333 @@ CACHE_TTL = {
 # Cache key prefixes
 CACHE_PREFIX = "pg_limiter:"
 
+# Categories counted in cache stats. Each has a sorted set index
+# (CACHE_PREFIX + "index:<category>") of its keys scored by expiry time,
+# maintained on write/delete, so counting never scans the keyspace.
+INDEXED_CATEGORIES = ("token", "nodes", "isp", "panel_users")
+
+# Keys per SCAN/DEL batch for pattern invalidation
+SCAN_BATCH_SIZE = 500
+
+# Maximum number of keys held by the in-memory fallback (LRU evicted)
+IN_MEMORY_MAX_ENTRIES = int(os.environ.get("IN_MEMORY_CACHE_MAX_ENTRIES", "100000"))
+
 
 class InMemoryCache:
-    """Fallback in-memory cache when Redis is not available."""
+    """
+    Fallback in-memory cache when Redis is not available.
+    
+    Keys are spread over NUM_SHARDS LRU-ordered dicts, each bounded to its
+    share of max_entries. Everything runs on the event loop thread, so no
+    lock is needed. Expired keys are removed lazily on access and by a
+    background task draining an expiry heap.
+    """
+    
+    NUM_SHARDS = 16
     
-    def __init__(self):
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        self._lock = asyncio.Lock()
+    def __init__(self, max_entries: int = IN_MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._shard_limit = max(1, max_entries // self.NUM_SHARDS)
+        # key -> [value, expires_at] (expires_at 0 = no expiry)
+        self._shards: List["OrderedDict[str, list]"] = [
+            OrderedDict() for _ in range(self.NUM_SHARDS)
+        ]
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._expiry_wakeup: Optional[asyncio.Event] = None
+        self._expiry_task: Optional[asyncio.Task] = None
         redis_logger.info("📦 Using in-memory cache (Redis not available)")
     
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+    
+    def _shard(self, key: str) -> "OrderedDict[str, list]":
+        return self._shards[hash(key) % self.NUM_SHARDS]
+    
+    def _entry(self, key: str) -> Optional[list]:
+        """Live entry for key (refreshing its LRU position), or None."""
+        shard = self._shard(key)
+        entry = shard.get(key)
+        if entry is None:
+            return None
+        if entry[1] and entry[1] <= time.time():
+            del shard[key]
+            return None
+        shard.move_to_end(key)
+        return entry
+    
+    def _store(self, key: str, value: Any, expires_at: float = 0) -> list:
+        shard = self._shard(key)
+        entry = [value, expires_at]
+        shard[key] = entry
+        shard.move_to_end(key)
+        if len(shard) > self._shard_limit:
+            shard.popitem(last=False)
+        if expires_at:
+            self._schedule_expiry(key, expires_at)
+        return entry
+    
+    def _schedule_expiry(self, key: str, expires_at: float):
+        earliest = self._expiry_heap[0][0] if self._expiry_heap else None
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._expiry_task is None or self._expiry_task.done():
+            self._expiry_wakeup = asyncio.Event()
+            self._expiry_task = asyncio.create_task(self._expire_loop())
+        elif earliest is None or expires_at < earliest:
+            self._expiry_wakeup.set()
+    
+    def _purge_expired(self) -> int:
+        """Remove keys whose expiry time has passed (skipping stale heap entries)."""
+        now = time.time()
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            shard = self._shard(key)
+            entry = shard.get(key)
+            if entry is not None and entry[1] == expires_at:
+                del shard[key]
+                removed += 1
+        return removed
+    
+    async def _expire_loop(self):
+        """Sleep until the next expiry and remove expired keys."""
+        while self._expiry_heap:
+            self._purge_expired()
+            if not self._expiry_heap:
+                break
+            self._expiry_wakeup.clear()
+            delay = max(0.0, self._expiry_heap[0][0] - time.time())
+            try:
+                await asyncio.wait_for(self._expiry_wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+    
+    def _hash(self, name: str, create: bool = False) -> Optional[Dict[str, Any]]:
+        """Live hash/sorted-set value for name, optionally creating it."""
+        entry = self._entry(name)
+        if entry is not None and isinstance(entry[0], dict):
+            return entry[0]
+        if not create:
+            return None
+        return self._store(name, {})[0]
+    
     async def get(self, key: str) -> Optional[str]:
         """Get value from cache."""
-        async with self._lock:
-            import time
-            entry = self._cache.get(key)
-            if entry and (entry["expires_at"] == 0 or entry["expires_at"] > time.time()):
-                return entry["value"]
-            elif entry:
-                del self._cache[key]
-            return None
+        entry = self._entry(key)
+        return entry[0] if entry is not None else None
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """Get multiple values from cache (None for missing keys)."""
+        values = []
+        for key in keys:
+            entry = self._entry(key)
+            values.append(entry[0] if entry is not None else None)
+        return values
     
     async def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
         """Set value in cache with optional expiration."""
-        async with self._lock:
-            import time
-            expires_at = 0 if ex is None else time.time() + ex
-            self._cache[key] = {"value": value, "expires_at": expires_at}
-            return True
+        self._store(key, value, 0 if ex is None else time.time() + ex)
+        return True
     
-    async def delete(self, key: str) -> int:
-        """Delete key from cache."""
-        async with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-                return 1
-            return 0
+    async def mset(self, mapping: Dict[str, str]) -> bool:
+        """Set multiple values (no expiration)."""
+        for key, value in mapping.items():
+            self._store(key, value)
+        return True
+    
+    async def delete(self, *keys: str) -> int:
+        """Delete keys from cache."""
+        count = 0
+        for key in keys:
+            if self._shard(key).pop(key, None) is not None:
+                count += 1
+        return count
+    
+    async def unlink(self, *keys: str) -> int:
+        """Delete keys (same as delete for the in-memory cache)."""
+        return await self.delete(*keys)
+    
+    async def expire(self, key: str, seconds: int) -> bool:
+        """Set expiration on an existing key."""
+        entry = self._entry(key)
+        if entry is None:
+            return False
+        entry[1] = time.time() + seconds
+        self._schedule_expiry(key, entry[1])
+        return True
     
     async def exists(self, key: str) -> int:
         """Check if key exists."""
-        value = await self.get(key)
-        return 1 if value is not None else 0
+        return 1 if self._entry(key) is not None else 0
     
     async def keys(self, pattern: str) -> List[str]:
-        """Get keys matching pattern."""
-        async with self._lock:
-            import fnmatch
-            import time
-            # Clean expired entries first
-            current_time = time.time()
-            expired = [k for k, v in self._cache.items() 
-                      if v["expires_at"] != 0 and v["expires_at"] <= current_time]
-            for k in expired:
-                del self._cache[k]
-            
-            # Match pattern (convert Redis pattern to fnmatch)
-            pattern = pattern.replace("*", "*")
-            return [k for k in self._cache if fnmatch.fnmatch(k, pattern)]
+        """Get keys matching pattern (incrementally, see scan_iter)."""
+        return [key async for key in self.scan_iter(match=pattern)]
+    
+    async def scan_iter(self, match: Optional[str] = None, count: int = 1000):
+        """
+        Iterate live keys matching a glob pattern like Redis SCAN: shard by
+        shard over a snapshot of its keys, `count` keys at a time, yielding
+        to the event loop between chunks.
+        """
+        matcher = re.compile(fnmatch.translate(match)).match if match else None
+        for shard in self._shards:
+            snapshot = list(shard)
+            for start in range(0, len(snapshot), count):
+                now = time.time()
+                for key in snapshot[start:start + count]:
+                    entry = shard.get(key)
+                    if entry is None:
+                        continue
+                    if entry[1] and entry[1] <= now:
+                        del shard[key]
+                        continue
+                    if matcher is None or matcher(key):
+                        yield key
+                await asyncio.sleep(0)
     
     async def ttl(self, key: str) -> int:
         """Get TTL for key."""
-        async with self._lock:
-            import time
-            entry = self._cache.get(key)
-            if not entry:
-                return -2
-            if entry["expires_at"] == 0:
-                return -1
-            remaining = int(entry["expires_at"] - time.time())
-            return remaining if remaining > 0 else -2
+        entry = self._entry(key)
+        if entry is None:
+            return -2
+        if entry[1] == 0:
+            return -1
+        remaining = int(entry[1] - time.time())
+        return remaining if remaining > 0 else -2
     
     async def flushdb(self) -> bool:
         """Flush all keys."""
-        async with self._lock:
-            self._cache.clear()
-            return True
+        for shard in self._shards:
+            shard.clear()
+        self._expiry_heap.clear()
+        return True
     
     async def ping(self) -> bool:
         """Check connection (always True for in-memory)."""
         return True
     
     async def close(self):
-        """Close connection (no-op for in-memory)."""
-        self._cache.clear()
+        """Close connection (drops all keys and stops the expiry task)."""
+        await self.flushdb()
+        if self._expiry_task and not self._expiry_task.done():
+            self._expiry_task.cancel()
+        self._expiry_task = None
     
     async def incr(self, key: str) -> int:
         """Increment value."""
-        async with self._lock:
-            import time
-            entry = self._cache.get(key)
-            if entry and (entry["expires_at"] == 0 or entry["expires_at"] > time.time()):
-                try:
-                    new_val = int(entry["value"]) + 1
-                    entry["value"] = str(new_val)
-                    return new_val
-                except ValueError:
-                    return 1
-            self._cache[key] = {"value": "1", "expires_at": 0}
-            return 1
-    
-    async def hset(self, name: str, key: str, value: str) -> int:
-        """Set hash field."""
-        async with self._lock:
-            if name not in self._cache:
-                self._cache[name] = {"value": {}, "expires_at": 0}
-            entry = self._cache[name]
-            if not isinstance(entry["value"], dict):
-                entry["value"] = {}
-            is_new = key not in entry["value"]
-            entry["value"][key] = value
-            return 1 if is_new else 0
+        entry = self._entry(key)
+        if entry is not None:
+            try:
+                new_val = int(entry[0]) + 1
+                entry[0] = str(new_val)
+                return new_val
+            except (TypeError, ValueError):
+                return 1
+        self._store(key, "1")
+        return 1
+    
+    async def hset(
+        self,
+        name: str,
+        key: Optional[str] = None,
+        value: Optional[str] = None,
+        mapping: Optional[Dict[str, str]] = None,
+    ) -> int:
+        """Set hash field(s)."""
+        fields = self._hash(name, create=True)
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        added = sum(1 for field in items if field not in fields)
+        fields.update(items)
+        return added
     
     async def hget(self, name: str, key: str) -> Optional[str]:
         """Get hash field."""
-        async with self._lock:
-            entry = self._cache.get(name)
-            if entry and isinstance(entry["value"], dict):
-                return entry["value"].get(key)
-            return None
+        fields = self._hash(name)
+        return fields.get(key) if fields is not None else None
     
     async def hgetall(self, name: str) -> Dict[str, str]:
         """Get all hash fields."""
-        async with self._lock:
-            entry = self._cache.get(name)
-            if entry and isinstance(entry["value"], dict):
-                return entry["value"].copy()
-            return {}
+        fields = self._hash(name)
+        return fields.copy() if fields is not None else {}
     
     async def hdel(self, name: str, *keys: str) -> int:
         """Delete hash fields."""
-        async with self._lock:
-            entry = self._cache.get(name)
-            if entry and isinstance(entry["value"], dict):
-                count = 0
-                for key in keys:
-                    if key in entry["value"]:
-                        del entry["value"][key]
-                        count += 1
-                return count
+        fields = self._hash(name)
+        if fields is None:
+            return 0
+        return sum(1 for key in keys if fields.pop(key, None) is not None)
+    
+    async def zadd(self, name: str, mapping: Dict[str, float]) -> int:
+        """Add members with scores to a sorted set."""
+        members = self._hash(name, create=True)
+        added = sum(1 for member in mapping if member not in members)
+        members.update({member: float(score) for member, score in mapping.items()})
+        return added
+    
+    async def zrem(self, name: str, *members: str) -> int:
+        """Remove members from a sorted set."""
+        current = self._hash(name)
+        if current is None:
+            return 0
+        return sum(1 for member in members if current.pop(member, None) is not None)
+    
+    async def zcard(self, name: str) -> int:
+        """Number of members in a sorted set."""
+        members = self._hash(name)
+        return len(members) if members is not None else 0
+    
+    async def zremrangebyscore(self, name: str, min_score, max_score) -> int:
+        """Remove sorted set members with min_score <= score <= max_score."""
+        members = self._hash(name)
+        if members is None:
             return 0
+        low, high = float(min_score), float(max_score)
+        removed = [member for member, score in members.items() if low <= score <= high]
+        for member in removed:
+            del members[member]
+        return len(removed)
+    
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        """Queue commands and run them together, like a Redis pipeline."""
+        return InMemoryPipeline(self)
+
+
+class InMemoryPipeline:
+    """
+    Pipeline for InMemoryCache with the same calling convention as
+    redis.asyncio pipelines: commands are queued synchronously and run
+    in order by execute().
+    """
+    
+    def __init__(self, cache: InMemoryCache):
+        self._cache = cache
+        self._commands: List[tuple] = []
+    
+    def __getattr__(self, name: str):
+        method = getattr(self._cache, name)
+        
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        
+        return queue
+    
+    async def execute(self) -> List[Any]:
+        """Run the queued commands and return their results."""
+        commands, self._commands = self._commands, []
+        return [await method(*args, **kwargs) for method, args, kwargs in commands]
+    
+    async def __aenter__(self) -> "InMemoryPipeline":
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self._commands = []
 
 
 class RedisCache:
@@ -272,12 +466,100 @@ class RedisCache:
             redis_logger.error(f"❌ Redis get error for {key}: {e}")
             return None
     
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Get and deserialize many JSON values with one MGET. Missing keys are omitted."""
+        if not keys:
+            return {}
+        full_keys = [f"{CACHE_PREFIX}{key}" for key in keys]
+        try:
+            values = await self.client.mget(full_keys)
+        except Exception as e:
+            redis_logger.error(f"❌ Redis mget error for {len(keys)} keys: {e}")
+            return {}
+        return {key: json.loads(value) for key, value in zip(keys, values) if value}
+    
+    def pipeline(self, transaction: bool = True):
+        """
+        Get a pipeline on the active client. Queue commands (with full keys)
+        and `await pipe.execute()` to send them in one round trip; with
+        transaction=True they run atomically (MULTI/EXEC).
+        """
+        return self.client.pipeline(transaction=transaction)
+    
+    @staticmethod
+    def _category(key: str) -> Optional[str]:
+        """Indexed category of a key (without prefix), if any."""
+        category = key.split(":", 1)[0]
+        return category if category in INDEXED_CATEGORIES else None
+    
+    @staticmethod
+    def _index_key(category: str) -> str:
+        return f"{CACHE_PREFIX}index:{category}"
+    
+    def _queue_index_add(self, pipe, keys: List[str], ttl: int):
+        """Queue index updates for keys written with the given TTL."""
+        expires_at = time.time() + ttl
+        by_category: Dict[str, Dict[str, float]] = {}
+        for key in keys:
+            category = self._category(key)
+            if category:
+                by_category.setdefault(category, {})[key] = expires_at
+        for category, members in by_category.items():
+            pipe.zadd(self._index_key(category), members)
+    
+    def _queue_index_remove(self, pipe, keys: List[str]):
+        """Queue index removals for deleted keys (without prefix)."""
+        by_category: Dict[str, List[str]] = {}
+        for key in keys:
+            category = self._category(key)
+            if category:
+                by_category.setdefault(category, []).append(key)
+        for category, members in by_category.items():
+            pipe.zrem(self._index_key(category), *members)
+    
+    async def set_many(self, items: Dict[str, Any], ttl_key: str = "default") -> bool:
+        """Serialize and set many JSON values with TTL in one pipelined round trip."""
+        if not items:
+            return True
+        ttl = CACHE_TTL.get(ttl_key, CACHE_TTL["default"])
+        try:
+            pipe = self.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(f"{CACHE_PREFIX}{key}", json.dumps(value), ex=ttl)
+            self._queue_index_add(pipe, list(items), ttl)
+            await pipe.execute()
+            redis_logger.debug(f"💾 Cached {len(items)} keys (TTL: {ttl}s)")
+            return True
+        except Exception as e:
+            redis_logger.error(f"❌ Redis set_many error for {len(items)} keys: {e}")
+            return False
+    
+    async def delete_many(self, keys: List[str]) -> int:
+        """Delete many keys with one DEL."""
+        if not keys:
+            return 0
+        try:
+            pipe = self.pipeline(transaction=False)
+            pipe.delete(*[f"{CACHE_PREFIX}{key}" for key in keys])
+            self._queue_index_remove(pipe, keys)
+            results = await pipe.execute()
+            return results[0]
+        except Exception as e:
+            redis_logger.error(f"❌ Redis delete error for {len(keys)} keys: {e}")
+            return 0
+    
     async def set_json(self, key: str, value: Any, ttl_key: str = "default") -> bool:
         """Serialize and set JSON value with TTL."""
         full_key = f"{CACHE_PREFIX}{key}"
         ttl = CACHE_TTL.get(ttl_key, CACHE_TTL["default"])
         try:
-            await self.client.set(full_key, json.dumps(value), ex=ttl)
+            if self._category(key):
+                pipe = self.pipeline(transaction=False)
+                pipe.set(full_key, json.dumps(value), ex=ttl)
+                self._queue_index_add(pipe, [key], ttl)
+                await pipe.execute()
+            else:
+                await self.client.set(full_key, json.dumps(value), ex=ttl)
             redis_logger.debug(f"💾 Cached {key} (TTL: {ttl}s)")
             return True
         except Exception as e:
@@ -288,26 +570,48 @@ class RedisCache:
         """Delete a key."""
         full_key = f"{CACHE_PREFIX}{key}"
         try:
-            await self.client.delete(full_key)
+            if self._category(key):
+                pipe = self.pipeline(transaction=False)
+                pipe.delete(full_key)
+                self._queue_index_remove(pipe, [key])
+                await pipe.execute()
+            else:
+                await self.client.delete(full_key)
             redis_logger.debug(f"🗑️ Deleted cache key: {key}")
             return True
         except Exception as e:
             redis_logger.error(f"❌ Redis delete error for {key}: {e}")
             return False
     
+    async def _delete_batch(self, full_keys: List[str]) -> int:
+        """Unlink a batch of full keys and drop them from the category indexes."""
+        pipe = self.pipeline(transaction=False)
+        pipe.unlink(*full_keys)
+        self._queue_index_remove(pipe, [key[len(CACHE_PREFIX):] for key in full_keys])
+        results = await pipe.execute()
+        return results[0]
+    
     async def delete_pattern(self, pattern: str) -> int:
-        """Delete all keys matching pattern."""
+        """
+        Delete all keys matching pattern.
+        Iterates with SCAN and deletes in batches of SCAN_BATCH_SIZE (UNLINK,
+        freed in the background by Redis), so Redis is never blocked by a
+        full keyspace walk.
+        """
         full_pattern = f"{CACHE_PREFIX}{pattern}"
         try:
-            keys = await self.client.keys(full_pattern)
-            if keys:
-                count = 0
-                for key in keys:
-                    await self.client.delete(key)
-                    count += 1
+            count = 0
+            batch: List[str] = []
+            async for key in self.client.scan_iter(match=full_pattern, count=SCAN_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= SCAN_BATCH_SIZE:
+                    count += await self._delete_batch(batch)
+                    batch = []
+            if batch:
+                count += await self._delete_batch(batch)
+            if count:
                 redis_logger.debug(f"🗑️ Deleted {count} keys matching {pattern}")
-                return count
-            return 0
+            return count
         except Exception as e:
             redis_logger.error(f"❌ Redis delete pattern error for {pattern}: {e}")
             return 0
@@ -339,6 +643,23 @@ class RedisCache:
             redis_logger.error(f"❌ Redis incr error for {key}: {e}")
             return 0
     
+    async def count_categories(self) -> Dict[str, int]:
+        """
+        Live key count per indexed category in one pipelined round trip.
+        Expired members are pruned from each index first (O(log n) per call
+        plus the number of expired keys), so counts stay exact.
+        """
+        now = time.time()
+        pipe = self.pipeline(transaction=False)
+        for category in INDEXED_CATEGORIES:
+            index_key = self._index_key(category)
+            pipe.zremrangebyscore(index_key, "-inf", now)
+            pipe.zcard(index_key)
+        results = await pipe.execute()
+        return {
+            category: results[i * 2 + 1] for i, category in enumerate(INDEXED_CATEGORIES)
+        }
+    
     async def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
         try:
@@ -354,9 +675,7 @@ class RedisCache:
                 }
             else:
                 # Get cache size from fallback
-                cache_size = 0
-                if self._fallback and hasattr(self._fallback, "_cache"):
-                    cache_size = len(getattr(self._fallback, "_cache", {}))
+                cache_size = len(self._fallback) if self._fallback else 0
                 return {
                     "type": "in-memory",
                     "connected": True,
@@ -473,6 +792,21 @@ async def get_cached_isp(subnet: str) -> Optional[Dict]:
     return data
 
 
+async def get_cached_isp_many(subnets: List[str]) -> Dict[str, Dict]:
+    """Get cached ISP data for many subnets in one round trip."""
+    cache = await get_cache()
+    data = await cache.get_many([f"isp:{subnet}" for subnet in subnets])
+    return {key[len("isp:"):]: value for key, value in data.items()}
+
+
+async def cache_isp_many(isp_data: Dict[str, Dict]) -> bool:
+    """Cache ISP data for many subnets in one round trip."""
+    cache = await get_cache()
+    return await cache.set_many(
+        {f"isp:{subnet}": data for subnet, data in isp_data.items()}, ttl_key="isp"
+    )
+
+
 async def cache_panel_users(panel_domain: str, users: List[Dict]) -> bool:
     """Cache panel users list."""
     cache = await get_cache()
@@ -495,33 +829,57 @@ async def invalidate_panel_users(panel_domain: str) -> bool:
 
 
 async def cache_disabled_users(users: Dict[str, float]) -> bool:
-    """Cache disabled users dict."""
+    """Replace the disabled users hash in one atomic pipeline."""
     cache = await get_cache()
-    return await cache.set_json("disabled_users", users, ttl_key="disabled_users")
+    key = f"{CACHE_PREFIX}disabled_users"
+    try:
+        pipe = cache.pipeline()
+        pipe.delete(key)
+        if users:
+            pipe.hset(key, mapping={username: str(ts) for username, ts in users.items()})
+            pipe.expire(key, CACHE_TTL["disabled_users"])
+        await pipe.execute()
+        return True
+    except Exception as e:
+        redis_logger.error(f"❌ Redis error caching disabled users: {e}")
+        return False
 
 
 async def get_cached_disabled_users() -> Optional[Dict[str, float]]:
     """Get cached disabled users."""
     cache = await get_cache()
-    return await cache.get_json("disabled_users")
+    try:
+        users = await cache.client.hgetall(f"{CACHE_PREFIX}disabled_users")
+    except Exception as e:
+        redis_logger.error(f"❌ Redis error reading disabled users: {e}")
+        return None
+    return {username: float(ts) for username, ts in users.items()} if users else None
 
 
 async def add_disabled_user(username: str, timestamp: float) -> bool:
-    """Add a user to disabled cache."""
+    """Add a user to disabled cache (single HSET, no read-modify-write)."""
     cache = await get_cache()
-    users = await get_cached_disabled_users() or {}
-    users[username] = timestamp
-    return await cache_disabled_users(users)
+    key = f"{CACHE_PREFIX}disabled_users"
+    try:
+        pipe = cache.pipeline()
+        pipe.hset(key, username, str(timestamp))
+        pipe.expire(key, CACHE_TTL["disabled_users"])
+        await pipe.execute()
+        return True
+    except Exception as e:
+        redis_logger.error(f"❌ Redis error adding disabled user {username}: {e}")
+        return False
 
 
 async def remove_disabled_user(username: str) -> bool:
-    """Remove a user from disabled cache."""
+    """Remove a user from disabled cache (single HDEL)."""
     cache = await get_cache()
-    users = await get_cached_disabled_users() or {}
-    if username in users:
-        del users[username]
-        return await cache_disabled_users(users)
-    return True
+    try:
+        await cache.client.hdel(f"{CACHE_PREFIX}disabled_users", username)
+        return True
+    except Exception as e:
+        redis_logger.error(f"❌ Redis error removing disabled user {username}: {e}")
+        return False
 
 
 async def get_cache_stats() -> Dict[str, Any]:
@@ -529,16 +887,23 @@ async def get_cache_stats() -> Dict[str, Any]:
     cache = await get_cache()
     stats = await cache.get_stats()
     
-    # Add category counts
+    # Add category counts (from the category indexes, no keyspace scan)
     try:
-        client = cache.client
+        counts = await cache.count_categories()
         stats["categories"] = {
-            "tokens": len(await client.keys(f"{CACHE_PREFIX}token:*")),
-            "nodes": len(await client.keys(f"{CACHE_PREFIX}nodes:*")),
-            "isp": len(await client.keys(f"{CACHE_PREFIX}isp:*")),
-            "panel_users": len(await client.keys(f"{CACHE_PREFIX}panel_users:*")),
+            "tokens": counts["token"],
+            "nodes": counts["nodes"],
+            "isp": counts["isp"],
+            "panel_users": counts["panel_users"],
         }
     except Exception:
         stats["categories"] = {}
     
+    # Tiered ISP cache hit rates (imported here to avoid a circular import)
+    try:
+        from utils.isp_cache import get_isp_cache
+        stats["isp_cache"] = get_isp_cache().get_stats()
+    except ImportError:
+        stats["isp_cache"] = {}
+    
     return stats
@@ -12,10 +12,19 @@ It includes:
 from utils.warning_system.helpers import (
     safe_send_logs,
     safe_send_disable_notification,
+    safe_send_disable_digest,
     safe_disable_user,
     safe_disable_user_with_punishment,
 )
 
+# Import trust score engine
+from utils.warning_system.trust_score import (
+    TRUST_WEIGHTS,
+    TrustBreakdown,
+    TrustScoreEngine,
+    trust_engine,
+)
+
 # Import UserWarning dataclass
 from utils.warning_system.user_warning import UserWarning
 
@@ -29,8 +38,14 @@ __all__ = [
     # Helpers
     "safe_send_logs",
     "safe_send_disable_notification",
+    "safe_send_disable_digest",
     "safe_disable_user",
     "safe_disable_user_with_punishment",
+    # Trust score
+    "TRUST_WEIGHTS",
+    "TrustBreakdown",
+    "TrustScoreEngine",
+    "trust_engine",
     # UserWarning
     "UserWarning",
     # EnhancedWarningSystem
@@ -4,31 +4,56 @@ This module provides a warning system with monitoring periods for users who exce
 """
 
 import asyncio
+import heapq
 import json
 import os
 import time
 import ipaddress
-from typing import Dict, Optional, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from datetime import datetime
 
 from utils.logs import logger, log_monitoring_event, get_logger
+from utils.loop_local import LoopLocal
+from utils.read_config import current_config
 from utils.types import PanelType, UserType
-from utils.warning_system.user_warning import UserWarning
+from utils.warning_system.trust_score import TrustBreakdown, trust_engine
+from utils.warning_system.user_warning import IPActivity, MonitoringHistory, UserWarning
 from utils.warning_system.helpers import (
     safe_send_logs,
     safe_send_disable_notification,
+    safe_send_disable_digest,
     safe_disable_user_with_punishment,
 )
 
+# Try to import database module, fall back to JSON files if not available
+try:
+    from db import init_db, get_db, WarningStateCRUD, WarningHistoryCRUD
+    DB_AVAILABLE = True
+except ImportError:
+    DB_AVAILABLE = False
+
 # Module logger
 warning_logger = get_logger("warning_system")
 
+# How long warning history is kept (seconds)
+WARNING_HISTORY_RETENTION = 24 * 60 * 60
+
 
 class EnhancedWarningSystem:
     """
     Enhanced warning system that monitors users for 3 minutes after warning.
     Counts IPs as devices only if active for 2+ minutes during monitoring.
     Instantly disables users with very low trust scores (skip monitoring).
+    
+    With the database available, each warning is a row keyed by username and
+    only warnings that changed since the last flush are written. History
+    entries are appended as rows and old ones are compacted away hourly.
+    Without it, state is kept in the JSON files.
+    
+    Warnings are kept in a heap ordered by monitoring deadline. A monitor
+    task (start_monitor) sleeps until the next deadline and evaluates exactly
+    the users whose window ended; the log ingest path pushes IP activity for
+    monitored users as it arrives (record_ip_activity).
     """
     
     # Trust score threshold for instant disable (skip monitoring)
@@ -36,14 +61,51 @@ class EnhancedWarningSystem:
     # Minimum duration (seconds) for an IP to count as a device
     MIN_DEVICE_DURATION = 120  # 2 minutes
     
-    def __init__(self, filename=".user_warnings.json", history_filename=".warning_history.json"):
+    # Seconds between warning history compactions
+    COMPACTION_INTERVAL = 3600
+    # IPs seen within this many seconds count as the user's current IPs
+    # when the monitor task evaluates an expired warning
+    CURRENT_IP_WINDOW = 120
+    # Punishments applied concurrently when several warnings expire together
+    EVALUATION_CONCURRENCY = 8
+    # Seconds IP activity pushed from the log ingest path is batched before a flush
+    ACTIVITY_FLUSH_DELAY = 10
+    
+    def __init__(self, filename=".user_warnings.json", history_filename=".warning_history.json",
+                 use_db: bool = True):
         self.filename = filename
         self.history_filename = history_filename
         self.warnings: Dict[str, UserWarning] = {}
         self.warning_history: Dict[str, list] = {}
         self.monitoring_period = 180  # 3 minutes in seconds
-        self.load_warnings()
-        self.load_warning_history()
+        self._use_db = use_db and DB_AVAILABLE
+        self._loaded = False
+        # Users whose warning changed since the last flush
+        self._dirty: Set[str] = set()
+        # Users that currently have a stored warning row
+        self._persisted: Set[str] = set()
+        self._pending_history: List[Tuple[str, float]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # True while _flush_task is still waiting out its delay
+        self._flush_delayed = False
+        self._flush_lock = LoopLocal(asyncio.Lock)
+        self._load_lock = LoopLocal(asyncio.Lock)
+        self._last_compaction = 0.0
+        # Deadline heap of (monitoring_end_time, username). An entry is live only
+        # while it matches _deadlines_by_user; others are skipped when popped.
+        self._deadlines: List[Tuple[float, str]] = []
+        self._deadlines_by_user: Dict[str, float] = {}
+        self._deadline_changed = LoopLocal(asyncio.Event)
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._panel_data: Optional[PanelType] = None
+        # Users being evaluated right now, and users the monitor task disabled
+        # since the last check_persistent_violations call
+        self._evaluating: Set[str] = set()
+        self._disabled_by_monitor: Set[str] = set()
+        if not self._use_db:
+            self.load_warnings()
+            self.load_warning_history()
+            self._loaded = True
         warning_logger.debug(f"⚠️ EnhancedWarningSystem initialized (monitoring_period={self.monitoring_period}s)")
     
     def load_warning_history(self):
@@ -59,7 +121,10 @@ class EnhancedWarningSystem:
             self.warning_history = {}
     
     async def save_warning_history(self):
-        """Save warning history to file"""
+        """Save warning history to file (queued for a background flush with the database)"""
+        if self._use_db:
+            self._schedule_flush()
+            return
         try:
             with open(self.history_filename, "w", encoding="utf-8") as file:
                 json.dump(self.warning_history, file, indent=2)
@@ -89,12 +154,99 @@ class EnhancedWarningSystem:
     
     async def add_to_warning_history(self, username: str):
         """Add current warning to history"""
+        await self.add_many_to_warning_history([username])
+    
+    async def add_many_to_warning_history(self, usernames: List[str]):
+        """Add current warnings for several users to history with a single save"""
         current_time = time.time()
-        if username not in self.warning_history:
-            self.warning_history[username] = []
-        self.warning_history[username].append(current_time)
+        for username in usernames:
+            self.warning_history.setdefault(username, []).append(current_time)
+            if self._use_db:
+                self._pending_history.append((username, current_time))
         await self.save_warning_history()
     
+    @staticmethod
+    def _warning_from_dict(warning_data: dict) -> UserWarning:
+        """Build a UserWarning from its serialized form"""
+        if 'history' in warning_data:
+            history = MonitoringHistory.from_dict(warning_data['history'])
+        else:
+            # Older format: full IP list per snapshot
+            history = MonitoringHistory.from_snapshots(warning_data.get('monitoring_history', []))
+        
+        ip_to_inbounds = {}
+        if 'ip_to_inbounds' in warning_data:
+            for ip, inbounds in warning_data['ip_to_inbounds'].items():
+                ip_to_inbounds[ip] = set(inbounds)
+        
+        if "ip_activity" in warning_data:
+            ip_activity = {
+                ip: IPActivity.from_list(entry)
+                for ip, entry in warning_data["ip_activity"].items()
+            }
+        else:
+            # Older format: three parallel dicts
+            ip_first_seen = warning_data.get("ip_first_seen", {})
+            ip_last_seen = warning_data.get("ip_last_seen", {})
+            ip_seen_count = warning_data.get("ip_seen_count", {})
+            ip_activity = {
+                ip: IPActivity(first_seen, ip_last_seen.get(ip, first_seen), ip_seen_count.get(ip, 0))
+                for ip, first_seen in ip_first_seen.items()
+            }
+        
+        warning = UserWarning(
+            username=warning_data["username"],
+            ip_count=warning_data["ip_count"],
+            ips=set(warning_data["ips"]),
+            warning_time=warning_data["warning_time"],
+            monitoring_end_time=warning_data["monitoring_end_time"],
+            warned=warning_data.get("warned", False),
+            history=history,
+            ip_activity=ip_activity,
+            trust_score=warning_data.get("trust_score", 0.0),
+            inbound_protocols=set(warning_data.get("inbound_protocols", [])),
+            isp_names=set(warning_data.get("isp_names", [])),
+            ip_subnets=set(warning_data.get("ip_subnets", [])),
+            previous_warnings_12h=warning_data.get("previous_warnings_12h", 0),
+            previous_warnings_24h=warning_data.get("previous_warnings_24h", 0),
+            ip_to_inbounds=ip_to_inbounds,
+            same_ip_multiple_inbounds=warning_data.get("same_ip_multiple_inbounds", False),
+            isp_change_pattern=warning_data.get("isp_change_pattern"),
+            connection_details=warning_data.get("connection_details", []),
+            trust_factors=warning_data.get("trust_factors", {}),
+        )
+        return warning
+    
+    @staticmethod
+    def _warning_to_dict(warning: UserWarning) -> dict:
+        """Serialize a UserWarning to JSON-compatible data"""
+        ip_to_inbounds_serializable = {}
+        if warning.ip_to_inbounds:
+            for ip, inbounds in warning.ip_to_inbounds.items():
+                ip_to_inbounds_serializable[ip] = list(inbounds)
+        
+        return {
+            "username": warning.username,
+            "ip_count": warning.ip_count,
+            "ips": list(warning.ips),
+            "warning_time": warning.warning_time,
+            "monitoring_end_time": warning.monitoring_end_time,
+            "warned": warning.warned,
+            "history": warning.history.to_dict(),
+            "ip_activity": {ip: entry.to_list() for ip, entry in warning.ip_activity.items()},
+            "trust_score": warning.trust_score,
+            "inbound_protocols": list(warning.inbound_protocols),
+            "isp_names": list(warning.isp_names),
+            "ip_subnets": list(warning.ip_subnets),
+            "previous_warnings_12h": warning.previous_warnings_12h,
+            "previous_warnings_24h": warning.previous_warnings_24h,
+            "ip_to_inbounds": ip_to_inbounds_serializable,
+            "same_ip_multiple_inbounds": warning.same_ip_multiple_inbounds,
+            "isp_change_pattern": warning.isp_change_pattern,
+            "connection_details": warning.connection_details,
+            "trust_factors": warning.trust_factors,
+        }
+    
     def load_warnings(self):
         """Load warnings from file"""
         try:
@@ -102,91 +254,145 @@ class EnhancedWarningSystem:
                 with open(self.filename, "r", encoding="utf-8") as file:
                     data = json.load(file)
                     for username, warning_data in data.items():
-                        monitoring_history = []
-                        if 'monitoring_history' in warning_data:
-                            for snapshot in warning_data['monitoring_history']:
-                                monitoring_history.append({
-                                    'timestamp': snapshot['timestamp'],
-                                    'ips': set(snapshot['ips']),
-                                    'ip_count': snapshot['ip_count']
-                                })
-                        
-                        ip_to_inbounds = {}
-                        if 'ip_to_inbounds' in warning_data:
-                            for ip, inbounds in warning_data['ip_to_inbounds'].items():
-                                ip_to_inbounds[ip] = set(inbounds)
-                        
-                        ip_first_seen = warning_data.get("ip_first_seen", {})
-                        ip_last_seen = warning_data.get("ip_last_seen", {})
-                        ip_seen_count = warning_data.get("ip_seen_count", {})
-                        
-                        warning = UserWarning(
-                            username=warning_data["username"],
-                            ip_count=warning_data["ip_count"],
-                            ips=set(warning_data["ips"]),
-                            warning_time=warning_data["warning_time"],
-                            monitoring_end_time=warning_data["monitoring_end_time"],
-                            warned=warning_data.get("warned", False),
-                            ip_first_seen=ip_first_seen,
-                            ip_last_seen=ip_last_seen,
-                            ip_seen_count=ip_seen_count,
-                            trust_score=warning_data.get("trust_score", 0.0),
-                            inbound_protocols=set(warning_data.get("inbound_protocols", [])),
-                            isp_names=set(warning_data.get("isp_names", [])),
-                            ip_subnets=set(warning_data.get("ip_subnets", [])),
-                            previous_warnings_12h=warning_data.get("previous_warnings_12h", 0),
-                            previous_warnings_24h=warning_data.get("previous_warnings_24h", 0),
-                            ip_to_inbounds=ip_to_inbounds,
-                            same_ip_multiple_inbounds=warning_data.get("same_ip_multiple_inbounds", False),
-                            isp_change_pattern=warning_data.get("isp_change_pattern"),
-                            connection_details=warning_data.get("connection_details", [])
-                        )
-                        warning.monitoring_history = monitoring_history
-                        self.warnings[username] = warning
+                        self.warnings[username] = self._warning_from_dict(warning_data)
+                        self.reschedule(username)
                     warning_logger.debug(f"⚠️ Loaded {len(self.warnings)} active warnings from file")
         except Exception as e:
             warning_logger.error(f"Error loading warnings: {e}")
     
-    async def save_warnings(self):
-        """Save warnings to file"""
+    async def _ensure_loaded(self):
+        """Load warnings and history from the database on first use"""
+        if self._loaded:
+            return
+        async with self._load_lock.get():
+            if not self._loaded:
+                await self._load_from_db()
+    
+    async def _load_from_db(self):
         try:
-            data = {}
-            for username, warning in self.warnings.items():
-                monitoring_history_serializable = []
-                for snapshot in warning.monitoring_history:
-                    monitoring_history_serializable.append({
-                        'timestamp': snapshot['timestamp'],
-                        'ips': list(snapshot['ips']),
-                        'ip_count': snapshot['ip_count']
-                    })
+            await init_db()
+            async with get_db() as session:
+                states = await WarningStateCRUD.get_all(session)
+                history = await WarningHistoryCRUD.get_since(
+                    session, time.time() - WARNING_HISTORY_RETENTION
+                )
+        except Exception as e:
+            # Not marked as loaded - the next call retries
+            warning_logger.error(f"Error loading warnings from database: {e}")
+            return
+        self._loaded = True
+        
+        # Warnings added while the database was unreachable are newer than the stored ones
+        for username, warning_data in states.items():
+            if username in self.warnings:
+                continue
+            try:
+                self.warnings[username] = self._warning_from_dict(warning_data)
+                self.reschedule(username)
+            except Exception as e:
+                warning_logger.error(f"Error loading warning for {username}: {e}")
+        for username, timestamps in self.warning_history.items():
+            history[username] = sorted(set(history.get(username, [])) | set(timestamps))
+        self.warning_history = history
+        self._persisted = set(states)
+        
+        # One-time import of the JSON files into an empty database
+        if not states and not history:
+            self.load_warnings()
+            self.load_warning_history()
+            if self.warnings or self.warning_history:
+                self._dirty.update(self.warnings)
+                self._pending_history.extend(
+                    (username, ts)
+                    for username, timestamps in self.warning_history.items()
+                    for ts in timestamps
+                )
+                self._schedule_flush()
+                warning_logger.info(
+                    f"⚠️ Imported {len(self.warnings)} warnings and history for "
+                    f"{len(self.warning_history)} users from JSON files"
+                )
+        
+        warning_logger.debug(f"⚠️ Loaded {len(self.warnings)} active warnings from database")
+    
+    def mark_changed(self, username: str):
+        """Mark a user's warning as changed so the next flush writes it"""
+        self._dirty.add(username)
+    
+    def _schedule_flush(self, delay: float = 0):
+        """Start a background flush unless one is running (it picks up new changes)"""
+        if self._flush_task is not None and not self._flush_task.done():
+            if delay or not self._flush_delayed:
+                return
+            # An immediate flush replaces one still waiting out its delay
+            self._flush_task.cancel()
+        self._flush_delayed = bool(delay)
+        self._flush_task = asyncio.create_task(self._flush_after(delay))
+    
+    async def _flush_after(self, delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+            self._flush_delayed = False
+        await self.flush()
+    
+    async def flush(self):
+        """
+        Write changed warnings, removed warnings and new history entries
+        to the database. Cost scales with what changed since the last flush.
+        Changes made while a write is in progress are written by the next pass.
+        """
+        if not self._use_db:
+            return
+        
+        async with self._flush_lock.get():
+            while True:
+                dirty, self._dirty = self._dirty, set()
+                pending_history, self._pending_history = self._pending_history, []
+                changed = {
+                    username: self._warning_to_dict(self.warnings[username])
+                    for username in dirty if username in self.warnings
+                }
+                removed = self._persisted - self.warnings.keys()
                 
-                ip_to_inbounds_serializable = {}
-                if warning.ip_to_inbounds:
-                    for ip, inbounds in warning.ip_to_inbounds.items():
-                        ip_to_inbounds_serializable[ip] = list(inbounds)
+                compact = time.time() - self._last_compaction >= self.COMPACTION_INTERVAL
+                if not (changed or removed or pending_history or compact):
+                    return
                 
-                data[username] = {
-                    "username": warning.username,
-                    "ip_count": warning.ip_count,
-                    "ips": list(warning.ips),
-                    "warning_time": warning.warning_time,
-                    "monitoring_end_time": warning.monitoring_end_time,
-                    "warned": warning.warned,
-                    "monitoring_history": monitoring_history_serializable,
-                    "ip_first_seen": warning.ip_first_seen,
-                    "ip_last_seen": warning.ip_last_seen,
-                    "ip_seen_count": warning.ip_seen_count,
-                    "trust_score": warning.trust_score,
-                    "inbound_protocols": list(warning.inbound_protocols),
-                    "isp_names": list(warning.isp_names),
-                    "ip_subnets": list(warning.ip_subnets),
-                    "previous_warnings_12h": warning.previous_warnings_12h,
-                    "previous_warnings_24h": warning.previous_warnings_24h,
-                    "ip_to_inbounds": ip_to_inbounds_serializable,
-                    "same_ip_multiple_inbounds": warning.same_ip_multiple_inbounds,
-                    "isp_change_pattern": warning.isp_change_pattern,
-                    "connection_details": warning.connection_details
-                }
+                try:
+                    async with get_db() as session:
+                        await WarningStateCRUD.upsert_many(session, changed)
+                        await WarningStateCRUD.delete_many(session, removed)
+                        await WarningHistoryCRUD.add_many(session, pending_history)
+                        if compact:
+                            await WarningHistoryCRUD.cleanup_old(
+                                session, time.time() - WARNING_HISTORY_RETENTION
+                            )
+                except Exception as e:
+                    warning_logger.error(f"Error saving warnings to database: {e}")
+                    # Retry on the next flush
+                    self._dirty |= dirty
+                    self._pending_history = pending_history + self._pending_history
+                    return
+                
+                self._persisted = (self._persisted - removed) | changed.keys()
+                if compact:
+                    self._last_compaction = time.time()
+                    self.cleanup_old_warning_history()
+                warning_logger.debug(
+                    f"⚠️ Flushed {len(changed)} changed, {len(removed)} removed warnings, "
+                    f"{len(pending_history)} history entries"
+                )
+    
+    async def save_warnings(self):
+        """Save warnings to file (queued for a background flush with the database)"""
+        if self._use_db:
+            self._schedule_flush()
+            return
+        try:
+            data = {
+                username: self._warning_to_dict(warning)
+                for username, warning in self.warnings.items()
+            }
             
             with open(self.filename, "w", encoding="utf-8") as file:
                 json.dump(data, file, indent=2)
@@ -205,7 +411,11 @@ class EnhancedWarningSystem:
         Returns:
             str: "new" if new warning, "updated" if existing, "instant_disabled" if instantly disabled
         """
+        await self._ensure_loaded()
         current_time = time.time()
+        if username in self._evaluating:
+            warning_logger.debug(f"⚠️ {username} is being evaluated, ignoring new warning")
+            return "evaluating"
         warning_logger.info(f"⚠️ Processing warning for user: {username} (ip_count={ip_count}, limit={user_limit})")
         
         if username in self.warnings:
@@ -217,13 +427,14 @@ class EnhancedWarningSystem:
                 
                 if user_data and user_data.device_info:
                     warning.inbound_protocols = user_data.device_info.inbound_protocols
-                    warning.ip_to_inbounds = self._extract_ip_to_inbounds(user_data)
+                    warning.set_inbounds(self._extract_ip_to_inbounds(user_data))
                 if isp_info:
                     warning.isp_names = set(info.get('isp', 'Unknown') for info in isp_info.values())
                     warning.ip_subnets = self._extract_subnets(ips)
                 
                 warning.trust_score = warning.calculate_trust_score()
                 
+                self.mark_changed(username)
                 await self.save_warnings()
                 warning_logger.debug(f"⚠️ Updated existing warning for {username} (trust={warning.trust_score:.0f})")
                 log_monitoring_event("warning_updated", username, {"ip_count": ip_count, "trust_score": warning.trust_score})
@@ -336,6 +547,8 @@ class EnhancedWarningSystem:
         warning.update_ip_activity(ips, current_time)
         
         self.warnings[username] = warning
+        self.reschedule(username)
+        self.mark_changed(username)
         await self.save_warnings()
         
         trust_details = []
@@ -405,144 +618,429 @@ class EnhancedWarningSystem:
                 subnets.add(ip)
         return subnets
     
+    # ═══════════════════════════════════════════════════════════════════════
+    # Deadline scheduling
+    # ═══════════════════════════════════════════════════════════════════════
+    
+    def reschedule(self, username: str):
+        """
+        (Re)schedule evaluation of a user's warning at its monitoring_end_time.
+        Call after changing monitoring_end_time of an existing warning.
+        """
+        warning = self.warnings.get(username)
+        if warning is None:
+            self._deadlines_by_user.pop(username, None)
+            return
+        deadline = warning.monitoring_end_time
+        if self._deadlines_by_user.get(username) == deadline:
+            return
+        self._deadlines_by_user[username] = deadline
+        heapq.heappush(self._deadlines, (deadline, username))
+        self._wake_monitor()
+    
+    def _wake_monitor(self):
+        """Wake the monitor task to recompute its sleep (no-op outside an event loop)"""
+        try:
+            self._deadline_changed.get().set()
+        except RuntimeError:
+            pass
+    
+    def _pop_expired(self, now: float = None) -> List[str]:
+        """Take every warning whose deadline has passed off the heap"""
+        if now is None:
+            now = time.time()
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, username = heapq.heappop(self._deadlines)
+            if self._deadlines_by_user.get(username) != deadline:
+                continue  # superseded entry
+            del self._deadlines_by_user[username]
+            warning = self.warnings.get(username)
+            if warning is None:
+                continue  # warning was removed
+            if warning.monitoring_end_time > now:
+                self.reschedule(username)
+                continue
+            expired.append(username)
+        return expired
+    
+    def _compact_deadlines(self):
+        """Drop heap entries for warnings that no longer exist"""
+        for username in [u for u in self._deadlines_by_user if u not in self.warnings]:
+            del self._deadlines_by_user[username]
+        if len(self._deadlines) > 2 * len(self._deadlines_by_user) + 64:
+            self._deadlines = [(deadline, username) for username, deadline in self._deadlines_by_user.items()]
+            heapq.heapify(self._deadlines)
+    
+    def start_monitor(self, panel_data: PanelType):
+        """Start (or keep running) the task that evaluates warnings as they expire"""
+        self._panel_data = panel_data
+        if self._monitor_task is None or self._monitor_task.done():
+            self._monitor_task = asyncio.create_task(self._monitor_loop())
+            warning_logger.debug("⚠️ Warning monitor started")
+    
+    async def _monitor_loop(self):
+        """Sleep until the next deadline, then evaluate exactly the expired users"""
+        await self._ensure_loaded()
+        deadline_changed = self._deadline_changed.get()
+        while True:
+            deadline_changed.clear()
+            timeout = None
+            if self._deadlines:
+                timeout = max(0.0, self._deadlines[0][0] - time.time())
+            try:
+                await asyncio.wait_for(deadline_changed.wait(), timeout)
+                continue
+            except asyncio.TimeoutError:
+                pass
+            
+            expired = self._pop_expired()
+            if not expired:
+                continue
+            config = await current_config()
+            batch = [
+                (username, self.warnings[username].get_recent_ips(self.CURRENT_IP_WINDOW) or None, config.get_limit(username))
+                for username in expired
+            ]
+            try:
+                self._disabled_by_monitor |= await self._evaluate_expired(self._panel_data, batch)
+            except Exception as e:
+                warning_logger.error(f"Warning monitor failed to evaluate {len(batch)} users: {e}")
+            await self.save_warnings()
+    
+    def record_ip_activity(self, username: str, ip: str, timestamp: float = None):
+        """
+        Push IP activity for a monitored user from the log ingest path.
+        A dict lookup for users that are not monitored.
+        """
+        warning = self.warnings.get(username)
+        if warning is None:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        if timestamp >= warning.monitoring_end_time:
+            return
+        warning.touch_ip(ip, timestamp)
+        self._dirty.add(username)
+        if self._use_db:
+            self._schedule_flush(self.ACTIVITY_FLUSH_DELAY)
+    
+    def rescore_warnings(self, usernames: Optional[Iterable[str]] = None) -> Dict[str, TrustBreakdown]:
+        """
+        Recompute trust scores for several warnings in one batch
+        (all warnings if usernames is None).
+        
+        Returns:
+            Dict mapping username to its TrustBreakdown
+        """
+        if usernames is None:
+            warnings = list(self.warnings.values())
+        else:
+            warnings = [self.warnings[u] for u in usernames if u in self.warnings]
+        breakdowns = trust_engine.score_many(warnings)
+        for warning in warnings:
+            breakdown = breakdowns[warning.username]
+            warning.trust_score = breakdown.score
+            warning.apply_trust_breakdown(breakdown)
+        return breakdowns
+    
     async def check_persistent_violations(self, panel_data: PanelType, all_users_actual_ips: Dict[str, Set[str]], config_data: dict) -> Set[str]:
         """
         Check for users who still violate limits after 3-minute warning period.
         Uses device counting: only IPs active for 2+ minutes count as devices.
         
+        Only warnings whose deadline has passed are taken off the deadline
+        heap and evaluated, so the cost depends on how many expired, not on
+        how many are active. Users disabled by the monitor task since the
+        last call are included in the result.
+        
         Returns:
             Set[str]: Set of users who were disabled
         """
-        disabled_users = set()
-        users_to_remove = []
+        await self._ensure_loaded()
+        disabled_users, self._disabled_by_monitor = self._disabled_by_monitor, set()
         
         limits_config = config_data.get("limits", {})
         special_limit = limits_config.get("special", {})
         limit_number = limits_config.get("general", 2)
         
-        warning_logger.debug(f"⚠️ Checking {len(self.warnings)} active warnings for persistent violations")
+        expired = self._pop_expired()
+        warning_logger.debug(f"⚠️ {len(expired)} of {len(self.warnings)} warnings expired")
         
-        for username, warning in self.warnings.items():
-            if not warning.is_monitoring_active():
-                warning_logger.debug(f"⚠️ Monitoring ended for {username}")
-                if warning.active_monitoring_task and not warning.active_monitoring_task.done():
-                    warning.active_monitoring_task.cancel()
-                
-                user_limit_number = int(special_limit.get(username, limit_number))
-                trust_score = warning.trust_score
-                trust_level = warning.get_trust_level()
-                
-                if username in all_users_actual_ips:
-                    current_ips = all_users_actual_ips[username]
-                    
-                    persistent_devices = warning.get_persistent_devices(self.MIN_DEVICE_DURATION)
-                    device_count = len(persistent_devices)
-                    
-                    current_persistent = current_ips.intersection(persistent_devices)
-                    activity_summary = warning.get_ip_activity_summary()
-                    
-                    warning_logger.info(f"⚠️ User {username}: {device_count} devices (limit: {user_limit_number}), trust={trust_score:.0f}")
-                    
-                    time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    if device_count > user_limit_number:
-                        warning_logger.warning(f"🚫 User {username} exceeds limit: {device_count} > {user_limit_number}")
-                        try:
-                            punishment_result = await safe_disable_user_with_punishment(
-                                panel_data, UserType(name=username, ip=[])
-                            )
-                            
-                            await self.add_to_warning_history(username)
-                            
-                            if punishment_result["action"] == "warning":
-                                await safe_send_logs(
-                                    f"⚠️ <b>WARNING</b> - {time_str}\n\n"
-                                    f"User: <code>{username}</code>\n"
-                                    f"Confirmed Devices: <code>{device_count}</code> (active 2+ min)\n"
-                                    f"User limit: <code>{user_limit_number}</code>\n"
-                                    f"Trust Level: {trust_level} (<code>{trust_score:.0f}</code>)\n\n"
-                                    f"📊 Violation #{punishment_result['violation_count']} in time window\n"
-                                    f"⚡ Next violation will result in disable."
-                                )
-                                warning_logger.warning(f"⚠️ WARNING: User {username} - {device_count} devices (limit: {user_limit_number}) - violation #{punishment_result['violation_count']}")
-                                log_monitoring_event("persistent_warning", username, {"devices": device_count, "limit": user_limit_number, "violation": punishment_result['violation_count']})
-                            elif punishment_result["action"] == "disabled":
-                                disabled_users.add(username)
-                                
-                                duration_text = ""
-                                if punishment_result["duration_minutes"] > 0:
-                                    duration_text = f"Duration: <code>{punishment_result['duration_minutes']} minutes</code>\n"
-                                else:
-                                    duration_text = "Duration: <code>Until manual enable</code>\n"
-                                
-                                await safe_send_disable_notification(
-                                    f"🚫 <b>USER DISABLED</b> - {time_str}\n\n"
-                                    f"User: <code>{username}</code>\n"
-                                    f"Confirmed Devices: <code>{device_count}</code> (active 2+ min)\n"
-                                    f"Current IPs: <code>{len(current_ips)}</code>\n"
-                                    f"User limit: <code>{user_limit_number}</code>\n"
-                                    f"Trust Level: {trust_level} (<code>{trust_score:.0f}</code>)\n\n"
-                                    f"📊 Violation #{punishment_result['violation_count']} (Step {punishment_result['step_index'] + 1})\n"
-                                    f"{duration_text}"
-                                    f"📊 IP Activity:\n<code>{activity_summary}</code>",
-                                    username
-                                )
-                                
-                                warning_logger.warning(f"🚫 Disabled user {username}: {device_count} devices (limit: {user_limit_number}) - step {punishment_result['step_index'] + 1}")
-                                log_monitoring_event("user_disabled", username, {"devices": device_count, "limit": user_limit_number, "duration_min": punishment_result.get("duration_minutes", 0)})
-                            else:
-                                warning_logger.error(f"Punishment action error for {username}: {punishment_result['message']}")
-                            
-                        except Exception as e:
-                            warning_logger.error(f"Failed to disable user {username}: {e}")
-                            await safe_send_logs(f"❌ <b>Error:</b> Failed to disable user {username}: {e}")
-                    
-                    elif len(current_ips) > user_limit_number and device_count <= user_limit_number:
-                        warning_logger.info(f"✅ User {username}: {len(current_ips)} IPs but only {device_count} devices - no action")
-                        log_monitoring_event("monitoring_cleared", username, {"ips": len(current_ips), "devices": device_count, "limit": user_limit_number})
-                        await safe_send_logs(
-                            f"✅ <b>MONITORING ENDED - NO ACTION</b> - {time_str}\n\n"
-                            f"User: <code>{username}</code>\n"
-                            f"Current IPs: <code>{len(current_ips)}</code>\n"
-                            f"Confirmed Devices: <code>{device_count}</code> (active 2+ min)\n"
-                            f"User limit: <code>{user_limit_number}</code>\n"
-                            f"Trust Level: {trust_level} (<code>{trust_score:.0f}</code>)\n\n"
-                            f"📊 IP Activity:\n<code>{activity_summary}</code>\n\n"
-                            f"IPs were temporary - not enough persistent devices to violate."
-                        )
-                    
-                    else:
-                        warning_logger.info(f"✅ User {username} is now within limits ({device_count} devices, limit: {user_limit_number})")
-                        log_monitoring_event("monitoring_ended", username, {"devices": device_count, "limit": user_limit_number})
-                        await safe_send_logs(
-                            f"✅ <b>MONITORING ENDED</b> - {time_str}\n\n"
-                            f"User: <code>{username}</code>\n"
-                            f"Confirmed Devices: <code>{device_count}</code>\n"
-                            f"User limit: <code>{user_limit_number}</code>\n\n"
-                            f"User is now compliant with device limits."
-                        )
-                else:
-                    warning_logger.info(f"ℹ️ User {username} not found in current logs - monitoring ended")
-                    log_monitoring_event("monitoring_ended", username, {"reason": "user_inactive"})
-                    await safe_send_logs(
-                        f"ℹ️ <b>MONITORING ENDED</b> - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                        f"User: <code>{username}</code>\n"
-                        f"Reason: <code>User not found in current logs</code>\n\n"
-                        f"User is no longer active."
+        if expired:
+            disabled_users |= await self._evaluate_expired(panel_data, [
+                (username, all_users_actual_ips.get(username), int(special_limit.get(username, limit_number)))
+                for username in expired
+            ])
+            await self.save_warnings()
+        
+        return disabled_users
+    
+    async def _evaluate_expired(self, panel_data: PanelType,
+                                expired: List[Tuple[str, Optional[Set[str]], int]]) -> Set[str]:
+        """
+        Evaluate a batch of users whose monitoring period ended and remove
+        their warnings.
+        
+        Decisions are made first without any I/O. Punishments then run
+        concurrently (at most EVALUATION_CONCURRENCY at a time), history is
+        saved once for the whole batch and the results go out as a single
+        digest when more than one user expired together.
+        
+        Args:
+            expired: (username, current IPs or None if inactive, user limit) tuples
+        
+        Returns:
+            Set[str]: Users who were disabled
+        """
+        self.rescore_warnings(username for username, _, _ in expired)
+        outcomes = []
+        for username, current_ips, user_limit_number in expired:
+            warning = self.warnings.pop(username, None)
+            if warning is None:
+                continue
+            warning_logger.debug(f"⚠️ Monitoring ended for {username}")
+            if warning.active_monitoring_task and not warning.active_monitoring_task.done():
+                warning.active_monitoring_task.cancel()
+            self._evaluating.add(username)
+            outcomes.append(self._assess_warning(username, warning, current_ips, user_limit_number))
+        if not outcomes:
+            return set()
+        
+        try:
+            to_punish = [outcome for outcome in outcomes if outcome["kind"] == "exceeds"]
+            semaphore = asyncio.Semaphore(self.EVALUATION_CONCURRENCY)
+            
+            async def punish(outcome: dict):
+                async with semaphore:
+                    outcome["punishment"] = await safe_disable_user_with_punishment(
+                        panel_data, UserType(name=outcome["username"], ip=[])
                     )
-                
-                users_to_remove.append(username)
+            
+            await asyncio.gather(*(punish(outcome) for outcome in to_punish))
+            if to_punish:
+                await self.add_many_to_warning_history([outcome["username"] for outcome in to_punish])
+            
+            for outcome in outcomes:
+                self._log_outcome(outcome)
+            await self._notify_outcomes(outcomes)
+        finally:
+            self._evaluating.difference_update(outcome["username"] for outcome in outcomes)
         
-        for username in users_to_remove:
-            del self.warnings[username]
+        return {
+            outcome["username"] for outcome in outcomes
+            if outcome.get("punishment", {}).get("action") == "disabled"
+        }
+    
+    def _assess_warning(self, username: str, warning: UserWarning,
+                        current_ips: Optional[Set[str]], user_limit_number: int) -> dict:
+        """Decide the outcome of one expired warning (no I/O)"""
+        outcome = {
+            "username": username,
+            "limit": user_limit_number,
+            "trust_score": warning.trust_score,
+            "trust_level": warning.get_trust_level(),
+            "time_str": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        if current_ips is None:
+            outcome["kind"] = "inactive"
+            return outcome
         
-        if users_to_remove:
-            await self.save_warnings()
+        device_count = warning.get_device_count(self.MIN_DEVICE_DURATION)
+        outcome.update(
+            ip_count=len(current_ips),
+            device_count=device_count,
+            activity_summary=warning.get_ip_activity_summary(),
+        )
+        warning_logger.info(f"⚠️ User {username}: {device_count} devices (limit: {user_limit_number}), trust={warning.trust_score:.0f}")
         
-        return disabled_users
+        if device_count > user_limit_number:
+            outcome["kind"] = "exceeds"
+        elif len(current_ips) > user_limit_number:
+            outcome["kind"] = "cleared"
+        else:
+            outcome["kind"] = "compliant"
+        return outcome
+    
+    def _log_outcome(self, outcome: dict):
+        """Log and record the monitoring event for one outcome"""
+        username = outcome["username"]
+        kind = outcome["kind"]
+        limit = outcome["limit"]
+        
+        if kind == "inactive":
+            warning_logger.info(f"ℹ️ User {username} not found in current logs - monitoring ended")
+            log_monitoring_event("monitoring_ended", username, {"reason": "user_inactive"})
+            return
+        
+        devices = outcome["device_count"]
+        if kind == "cleared":
+            warning_logger.info(f"✅ User {username}: {outcome['ip_count']} IPs but only {devices} devices - no action")
+            log_monitoring_event("monitoring_cleared", username, {"ips": outcome["ip_count"], "devices": devices, "limit": limit})
+            return
+        if kind == "compliant":
+            warning_logger.info(f"✅ User {username} is now within limits ({devices} devices, limit: {limit})")
+            log_monitoring_event("monitoring_ended", username, {"devices": devices, "limit": limit})
+            return
+        
+        result = outcome["punishment"]
+        warning_logger.warning(f"🚫 User {username} exceeds limit: {devices} > {limit}")
+        if result["action"] == "warning":
+            warning_logger.warning(f"⚠️ WARNING: User {username} - {devices} devices (limit: {limit}) - violation #{result['violation_count']}")
+            log_monitoring_event("persistent_warning", username, {"devices": devices, "limit": limit, "violation": result['violation_count']})
+        elif result["action"] == "disabled":
+            warning_logger.warning(f"🚫 Disabled user {username}: {devices} devices (limit: {limit}) - step {result['step_index'] + 1}")
+            log_monitoring_event("user_disabled", username, {"devices": devices, "limit": limit, "duration_min": result.get("duration_minutes", 0)})
+        else:
+            warning_logger.error(f"Punishment action error for {username}: {result['message']}")
+    
+    @staticmethod
+    def _duration_text(result: dict) -> str:
+        if result["duration_minutes"] > 0:
+            return f"{result['duration_minutes']} minutes"
+        return "Until manual enable"
+    
+    def _outcome_message(self, outcome: dict) -> Optional[str]:
+        """Full notification for a single outcome (None if nothing is sent)"""
+        username = outcome["username"]
+        kind = outcome["kind"]
+        time_str = outcome["time_str"]
+        trust = f"{outcome['trust_level']} (<code>{outcome['trust_score']:.0f}</code>)"
+        
+        if kind == "inactive":
+            return (
+                f"ℹ️ <b>MONITORING ENDED</b> - {time_str}\n\n"
+                f"User: <code>{username}</code>\n"
+                f"Reason: <code>User not found in current logs</code>\n\n"
+                f"User is no longer active."
+            )
+        if kind == "compliant":
+            return (
+                f"✅ <b>MONITORING ENDED</b> - {time_str}\n\n"
+                f"User: <code>{username}</code>\n"
+                f"Confirmed Devices: <code>{outcome['device_count']}</code>\n"
+                f"User limit: <code>{outcome['limit']}</code>\n\n"
+                f"User is now compliant with device limits."
+            )
+        if kind == "cleared":
+            return (
+                f"✅ <b>MONITORING ENDED - NO ACTION</b> - {time_str}\n\n"
+                f"User: <code>{username}</code>\n"
+                f"Current IPs: <code>{outcome['ip_count']}</code>\n"
+                f"Confirmed Devices: <code>{outcome['device_count']}</code> (active 2+ min)\n"
+                f"User limit: <code>{outcome['limit']}</code>\n"
+                f"Trust Level: {trust}\n\n"
+                f"📊 IP Activity:\n<code>{outcome['activity_summary']}</code>\n\n"
+                f"IPs were temporary - not enough persistent devices to violate."
+            )
+        
+        result = outcome["punishment"]
+        if result["action"] == "warning":
+            return (
+                f"⚠️ <b>WARNING</b> - {time_str}\n\n"
+                f"User: <code>{username}</code>\n"
+                f"Confirmed Devices: <code>{outcome['device_count']}</code> (active 2+ min)\n"
+                f"User limit: <code>{outcome['limit']}</code>\n"
+                f"Trust Level: {trust}\n\n"
+                f"📊 Violation #{result['violation_count']} in time window\n"
+                f"⚡ Next violation will result in disable."
+            )
+        if result["action"] == "disabled":
+            return (
+                f"🚫 <b>USER DISABLED</b> - {time_str}\n\n"
+                f"User: <code>{username}</code>\n"
+                f"Confirmed Devices: <code>{outcome['device_count']}</code> (active 2+ min)\n"
+                f"Current IPs: <code>{outcome['ip_count']}</code>\n"
+                f"User limit: <code>{outcome['limit']}</code>\n"
+                f"Trust Level: {trust}\n\n"
+                f"📊 Violation #{result['violation_count']} (Step {result['step_index'] + 1})\n"
+                f"Duration: <code>{self._duration_text(result)}</code>\n"
+                f"📊 IP Activity:\n<code>{outcome['activity_summary']}</code>"
+            )
+        if result["action"] == "error":
+            return f"❌ <b>Error:</b> Failed to disable user {username}: {result['message']}"
+        return None
+    
+    def _digest_line(self, outcome: dict) -> Optional[str]:
+        """One-line summary of an outcome for digests"""
+        username = outcome["username"]
+        kind = outcome["kind"]
+        if kind == "inactive":
+            return f"ℹ️ <code>{username}</code> - no longer active"
+        devices = f"{outcome['device_count']}/{outcome['limit']} devices"
+        if kind == "compliant":
+            return f"✅ <code>{username}</code> - within limit ({devices})"
+        if kind == "cleared":
+            return f"✅ <code>{username}</code> - {outcome['ip_count']} IPs, {devices}, no action"
+        
+        result = outcome["punishment"]
+        if result["action"] == "warning":
+            return f"⚠️ <code>{username}</code> - {devices}, violation #{result['violation_count']} (next: disable)"
+        if result["action"] == "disabled":
+            return (
+                f"🚫 <code>{username}</code> - {devices}, violation #{result['violation_count']}, "
+                f"{self._duration_text(result).lower()}"
+            )
+        if result["action"] == "error":
+            return f"❌ <code>{username}</code> - disable failed: {result['message']}"
+        return None
+    
+    @staticmethod
+    def _chunk_lines(header: str, entries: List[Tuple[str, str]],
+                     max_length: int = 3800) -> List[Tuple[str, List[str]]]:
+        """
+        Split (line, username) digest entries into messages that fit in a
+        Telegram message. Returns (message, usernames in it) pairs.
+        """
+        chunks = []
+        current, usernames = header, []
+        for line, username in entries:
+            if usernames and len(current) + len(line) + 1 > max_length:
+                chunks.append((current, usernames))
+                current, usernames = header, []
+            current += "\n" + line
+            usernames.append(username)
+        if usernames:
+            chunks.append((current, usernames))
+        return chunks
+    
+    async def _notify_outcomes(self, outcomes: List[dict]):
+        """Send one message per outcome, or digests when several users expired together"""
+        if len(outcomes) == 1:
+            outcome = outcomes[0]
+            message = self._outcome_message(outcome)
+            if message is None:
+                return
+            if outcome.get("punishment", {}).get("action") == "disabled":
+                await safe_send_disable_notification(message, outcome["username"])
+            else:
+                await safe_send_logs(message)
+            return
+        
+        time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        disabled, others = [], []
+        for outcome in outcomes:
+            if outcome.get("punishment", {}).get("action") == "disabled":
+                disabled.append(outcome)
+            else:
+                others.append(outcome)
+        
+        if disabled:
+            header = f"🚫 <b>USERS DISABLED ({len(disabled)})</b> - {time_str}\n"
+            entries = [(self._digest_line(o), o["username"]) for o in disabled]
+            for message, usernames in self._chunk_lines(header, entries):
+                await safe_send_disable_digest(message, usernames)
+        
+        entries = [(self._digest_line(o), o["username"]) for o in others]
+        entries = [(line, username) for line, username in entries if line]
+        if entries:
+            header = f"📋 <b>MONITORING ENDED ({len(entries)} users)</b> - {time_str}\n"
+            for message, _ in self._chunk_lines(header, entries):
+                await safe_send_logs(message)
     
     async def send_monitoring_status(self):
         """Send status of currently monitored users"""
+        await self._ensure_loaded()
         if not self.warnings:
             return
         
@@ -569,14 +1067,20 @@ class EnhancedWarningSystem:
         return username in self.warnings and self.warnings[username].is_monitoring_active()
     
     async def cleanup_expired_warnings(self):
-        """Clean up expired warnings"""
-        expired_users = []
-        for username, warning in self.warnings.items():
-            if not warning.is_monitoring_active():
-                expired_users.append(username)
+        """
+        Clean up expired warnings.
+        While the monitor task runs it evaluates and removes warnings as they
+        expire, so only stale heap entries are dropped here.
+        """
+        await self._ensure_loaded()
+        if self._monitor_task is not None and not self._monitor_task.done():
+            self._compact_deadlines()
+            return
         
+        expired_users = self._pop_expired()
         for username in expired_users:
             del self.warnings[username]
+        self._compact_deadlines()
         
         if expired_users:
             await self.save_warnings()
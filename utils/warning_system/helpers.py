@@ -37,6 +37,20 @@ async def safe_send_disable_notification(message: str, username: str):
         await safe_send_logs(message)
 
 
+async def safe_send_disable_digest(message: str, usernames: list[str]):
+    """Safely send a digest of disabled users with an enable button per user"""
+    try:
+        from telegram_bot.send_message import send_disable_digest
+        helpers_logger.debug(f"📤 Sending disable digest for {len(usernames)} users")
+        await send_disable_digest(message, usernames)
+    except ImportError as e:
+        helpers_logger.warning(f"⚠️ Telegram not configured: {e}")
+        await safe_send_logs(message)
+    except Exception as e:
+        helpers_logger.error(f"❌ Failed to send disable digest: {e}")
+        await safe_send_logs(message)
+
+
 async def safe_disable_user(panel_data: PanelType, user: UserType):
     """Safely disable user, handling import errors gracefully"""
     try:
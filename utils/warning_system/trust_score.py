@@ -0,0 +1,213 @@
+"""
+Trust score engine for UserWarning.
+
+Each warning is reduced to a row of factor values (flags and counts) which
+is multiplied by a weight vector; the score is the base score plus the sum
+of the weighted factors, clamped to [-100, 100]. Weights are plain data
+(TRUST_WEIGHTS) and can be overridden with the TRUST_SCORE_WEIGHTS
+environment variable (JSON object, e.g. '{"excess_ips": -15}').
+
+The IP ↔ inbound relations a score depends on are kept in an InboundIndex,
+built once per check cycle from that cycle's connections, so scoring never
+rebuilds them.
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Mapping, Optional, Set, Tuple, TYPE_CHECKING
+
+from utils.logs import get_logger
+
+if TYPE_CHECKING:
+    from utils.warning_system.user_warning import UserWarning
+
+trust_logger = get_logger("trust_score")
+
+BASE_SCORE = 50.0
+MIN_SCORE = -100.0
+MAX_SCORE = 100.0
+# IPs beyond this count are penalized per extra IP
+EXCESS_IP_THRESHOLD = 2
+
+# Weight per unit of each factor (factor values are flags or counts)
+TRUST_WEIGHTS: Dict[str, float] = {
+    "same_ip_multi_inbound": 20,   # one IP using several inbounds (likely one device)
+    "multi_ip_same_inbound": -30,  # several IPs on the same inbound
+    "inbound_spread": -15,         # per inbound/IP pair spread over different IPs
+    "subnet_spread": -15,          # per extra subnet on the same ISP
+    "sim_swap": -8,                # ISP change that looks like a SIM swap
+    "multi_device_isp": -25,       # ISP pattern of several devices
+    "warnings_12h": -20,           # per disable in the last 12 hours
+    "warnings_24h": -10,           # per additional disable in the last 24 hours
+    "excess_ips": -10,             # per IP above EXCESS_IP_THRESHOLD
+}
+
+FACTORS: Tuple[str, ...] = tuple(TRUST_WEIGHTS)
+
+
+class InboundIndex:
+    """
+    IP → inbounds and inbound → IPs maps, updated per observed connection.
+    Tracks which IPs use several inbounds and which inbounds serve several IPs.
+    """
+
+    def __init__(self, ip_to_inbounds: Optional[Mapping[str, Iterable[str]]] = None):
+        self.ip_to_inbounds: Dict[str, Set[str]] = {}
+        self.inbound_to_ips: Dict[str, Set[str]] = {}
+        self.multi_inbound_ips: Set[str] = set()
+        self.multi_ip_inbounds: Set[str] = set()
+        if ip_to_inbounds:
+            self.observe_many(ip_to_inbounds)
+
+    def observe(self, ip: str, inbound: str):
+        """Record that an IP connected through an inbound"""
+        inbounds = self.ip_to_inbounds.setdefault(ip, set())
+        if inbound in inbounds:
+            return
+        inbounds.add(inbound)
+        if len(inbounds) > 1:
+            self.multi_inbound_ips.add(ip)
+        ips = self.inbound_to_ips.setdefault(inbound, set())
+        ips.add(ip)
+        if len(ips) > 1:
+            self.multi_ip_inbounds.add(inbound)
+
+    def observe_many(self, ip_to_inbounds: Mapping[str, Iterable[str]]):
+        for ip, inbounds in ip_to_inbounds.items():
+            for inbound in inbounds:
+                self.observe(ip, inbound)
+
+    @property
+    def same_ip_multi_inbound(self) -> bool:
+        return bool(self.multi_inbound_ips)
+
+    @property
+    def multi_ip_same_inbound(self) -> bool:
+        return bool(self.multi_ip_inbounds)
+
+    @property
+    def pattern_type(self) -> str:
+        if self.same_ip_multi_inbound and self.multi_ip_same_inbound:
+            return "mixed"
+        if self.same_ip_multi_inbound:
+            return "single_device_switching"
+        if self.multi_ip_same_inbound:
+            return "multi_device"
+        return "unknown"
+
+
+def detect_isp_pattern(warning: "UserWarning") -> str:
+    """
+    ISP change pattern: "sim_swap", "possible_sim_swap", "multi_device",
+    "single_isp" or "unknown".
+    """
+    if len(warning.isp_names) <= 1:
+        return "single_isp"
+
+    if len(warning.ip_subnets) == len(warning.ips) and len(warning.isp_names) <= 2:
+        if warning.connection_details and len(warning.ips) == 2 and len(warning.isp_names) == 2:
+            return "sim_swap"
+        return "possible_sim_swap"
+
+    if len(warning.ip_subnets) < len(warning.ips):
+        return "multi_device"
+
+    return "unknown"
+
+
+@dataclass
+class TrustBreakdown:
+    """Score of one warning with the contribution of each factor"""
+    score: float
+    isp_pattern: str
+    factors: Dict[str, float] = field(default_factory=dict)
+
+    def describe(self) -> str:
+        """Non-zero contributions, e.g. "multi_ip_same_inbound -30, excess_ips -10" """
+        parts = [f"{name} {value:+.0f}" for name, value in self.factors.items() if value]
+        return ", ".join(parts) if parts else "no factors"
+
+
+class TrustScoreEngine:
+    """
+    Scores warnings from their factor rows and a weight vector.
+
+    Args:
+        weights: Overrides for TRUST_WEIGHTS (unknown factor names raise ValueError)
+    """
+
+    def __init__(self, weights: Optional[Mapping[str, float]] = None):
+        self.weights: Dict[str, float] = {}
+        self._vector: Tuple[float, ...] = ()
+        self.set_weights(weights)
+
+    def set_weights(self, weights: Optional[Mapping[str, float]] = None):
+        """Replace the weight overrides"""
+        unknown = set(weights or {}) - set(FACTORS)
+        if unknown:
+            raise ValueError(f"Unknown trust score factors: {', '.join(sorted(unknown))}")
+        self.weights = {**TRUST_WEIGHTS, **(weights or {})}
+        self._vector = tuple(float(self.weights[name]) for name in FACTORS)
+
+    @staticmethod
+    def factor_row(warning: "UserWarning", isp_pattern: str) -> Tuple[float, ...]:
+        """Factor values of a warning, in FACTORS order"""
+        index = warning.inbound_index
+        ip_count = len(warning.ips)
+        inbound_count = len(warning.inbound_protocols)
+        subnet_count = len(warning.ip_subnets)
+        same_ip_multi = index.same_ip_multi_inbound
+
+        return (
+            1.0 if same_ip_multi else 0.0,
+            1.0 if index.multi_ip_same_inbound else 0.0,
+            min(inbound_count, ip_count) if inbound_count > 1 and ip_count > 1 and not same_ip_multi else 0.0,
+            subnet_count - 1 if subnet_count > 1 and len(warning.isp_names) == 1 else 0.0,
+            1.0 if isp_pattern in ("sim_swap", "possible_sim_swap") else 0.0,
+            1.0 if isp_pattern == "multi_device" else 0.0,
+            warning.previous_warnings_12h,
+            max(0, warning.previous_warnings_24h - warning.previous_warnings_12h),
+            max(0, ip_count - EXCESS_IP_THRESHOLD),
+        )
+
+    def score_many(self, warnings: Iterable["UserWarning"]) -> Dict[str, TrustBreakdown]:
+        """Score several warnings at once, keyed by username"""
+        vector = self._vector
+        results = {}
+        for warning in warnings:
+            isp_pattern = detect_isp_pattern(warning)
+            contributions = [
+                weight * value if value else 0.0
+                for weight, value in zip(vector, self.factor_row(warning, isp_pattern))
+            ]
+            score = max(MIN_SCORE, min(MAX_SCORE, BASE_SCORE + sum(contributions)))
+            results[warning.username] = TrustBreakdown(
+                score=score,
+                isp_pattern=isp_pattern,
+                factors=dict(zip(FACTORS, contributions)),
+            )
+        return results
+
+    def score(self, warning: "UserWarning") -> TrustBreakdown:
+        """Score a single warning"""
+        return self.score_many([warning])[warning.username]
+
+
+def _weights_from_env() -> Optional[Dict[str, float]]:
+    raw = os.environ.get("TRUST_SCORE_WEIGHTS", "").strip()
+    if not raw:
+        return None
+    try:
+        weights = json.loads(raw)
+        unknown = set(weights) - set(FACTORS)
+        if unknown:
+            trust_logger.warning(f"Ignoring unknown TRUST_SCORE_WEIGHTS factors: {', '.join(sorted(unknown))}")
+        return {name: float(value) for name, value in weights.items() if name in FACTORS}
+    except (ValueError, TypeError, AttributeError) as e:
+        trust_logger.warning(f"Invalid TRUST_SCORE_WEIGHTS, using defaults: {e}")
+        return None
+
+
+# Shared engine
+trust_engine = TrustScoreEngine(_weights_from_env())
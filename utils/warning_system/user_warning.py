@@ -3,13 +3,106 @@ UserWarning dataclass for tracking user warnings and behavior analysis.
 """
 
 import time
-from typing import Dict, Optional, Set
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 from dataclasses import dataclass
 
 from utils.logs import get_logger
+from utils.warning_system.trust_score import InboundIndex, detect_isp_pattern, trust_engine
 
 trust_logger = get_logger("trust_score")
 
+# Monitoring snapshots kept per warning (the most recent ones)
+MONITORING_HISTORY_SIZE = 20
+
+
+class IPActivity:
+    """Activity of one IP during monitoring"""
+    
+    __slots__ = ("first_seen", "last_seen", "seen_count")
+    
+    def __init__(self, first_seen: float, last_seen: float, seen_count: int = 0):
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.seen_count = seen_count  # number of checks the IP was seen in
+    
+    @property
+    def duration(self) -> float:
+        return self.last_seen - self.first_seen
+    
+    def to_list(self) -> list:
+        return [self.first_seen, self.last_seen, self.seen_count]
+    
+    @classmethod
+    def from_list(cls, data: list) -> "IPActivity":
+        return cls(data[0], data[1], data[2])
+
+
+class MonitoringHistory:
+    """
+    Fixed-size ring of IP snapshots, delta encoded.
+    
+    Each entry stores (timestamp, added IPs, removed IPs) relative to the
+    previous snapshot; `base` is the IP set before the oldest entry. When the
+    ring is full the oldest delta is folded into `base`, so the most recent
+    snapshots are kept.
+    """
+    
+    __slots__ = ("size", "base", "deltas", "_latest")
+    
+    def __init__(self, size: int = MONITORING_HISTORY_SIZE):
+        self.size = size
+        self.base: Set[str] = set()
+        self.deltas: "deque[Tuple[float, Tuple[str, ...], Tuple[str, ...]]]" = deque()
+        self._latest: Set[str] = set()
+    
+    def __len__(self) -> int:
+        return len(self.deltas)
+    
+    def append(self, timestamp: float, ips: Set[str]):
+        """Record a snapshot of the current IPs"""
+        added = tuple(ips - self._latest)
+        removed = tuple(self._latest - ips)
+        self.deltas.append((timestamp, added, removed))
+        self._latest = set(ips)
+        while len(self.deltas) > self.size:
+            _, old_added, old_removed = self.deltas.popleft()
+            self.base.difference_update(old_removed)
+            self.base.update(old_added)
+    
+    def __iter__(self) -> Iterator[dict]:
+        """Replay the snapshots, oldest first"""
+        ips = set(self.base)
+        for timestamp, added, removed in self.deltas:
+            ips.difference_update(removed)
+            ips.update(added)
+            yield {"timestamp": timestamp, "ips": set(ips), "ip_count": len(ips)}
+    
+    def to_dict(self) -> dict:
+        return {
+            "base": list(self.base),
+            "deltas": [[timestamp, list(added), list(removed)] for timestamp, added, removed in self.deltas],
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict, size: int = MONITORING_HISTORY_SIZE) -> "MonitoringHistory":
+        history = cls(size)
+        history.base = set(data.get("base", []))
+        history._latest = set(history.base)
+        for timestamp, added, removed in data.get("deltas", []):
+            history.deltas.append((timestamp, tuple(added), tuple(removed)))
+            history._latest.difference_update(removed)
+            history._latest.update(added)
+        return history
+    
+    @classmethod
+    def from_snapshots(cls, snapshots: List[dict], size: int = MONITORING_HISTORY_SIZE) -> "MonitoringHistory":
+        """Build from the old list-of-snapshots format"""
+        history = cls(size)
+        for snapshot in snapshots:
+            history.append(snapshot["timestamp"], set(snapshot["ips"]))
+        return history
+
 
 @dataclass
 class UserWarning:
@@ -23,12 +116,10 @@ class UserWarning:
     monitoring_end_time: float
     warned: bool = False
     # Enhanced monitoring fields
-    monitoring_history: list = None
+    history: MonitoringHistory = None
     active_monitoring_task: Optional[object] = None
     # IP activity tracking - tracks how long each IP has been active
-    ip_first_seen: Dict[str, float] = None  # IP -> first seen timestamp
-    ip_last_seen: Dict[str, float] = None   # IP -> last seen timestamp
-    ip_seen_count: Dict[str, int] = None    # IP -> number of times seen in checks
+    ip_activity: Dict[str, IPActivity] = None
     # Trust score fields
     trust_score: float = 0.0  # Higher = more trustworthy, Lower = more suspicious
     inbound_protocols: Set[str] = None
@@ -41,16 +132,13 @@ class UserWarning:
     same_ip_multiple_inbounds: bool = False  # True if same IP uses different inbounds (likely 1 device)
     isp_change_pattern: str = None  # "sim_swap" or "multi_device" or None
     connection_details: list = None  # List of connection info for analysis
+    trust_factors: Dict[str, float] = None  # Per-factor contributions to trust_score
     
     def __post_init__(self):
-        if self.monitoring_history is None:
-            self.monitoring_history = []
-        if self.ip_first_seen is None:
-            self.ip_first_seen = {}
-        if self.ip_last_seen is None:
-            self.ip_last_seen = {}
-        if self.ip_seen_count is None:
-            self.ip_seen_count = {}
+        if self.history is None:
+            self.history = MonitoringHistory()
+        if self.ip_activity is None:
+            self.ip_activity = {}
         if self.inbound_protocols is None:
             self.inbound_protocols = set()
         if self.isp_names is None:
@@ -61,6 +149,17 @@ class UserWarning:
             self.ip_to_inbounds = {}
         if self.connection_details is None:
             self.connection_details = []
+        if self.trust_factors is None:
+            self.trust_factors = {}
+        # IP <-> inbound index of the current cycle; ip_to_inbounds is its IP -> inbounds map
+        self.inbound_index = InboundIndex(self.ip_to_inbounds)
+        self.ip_to_inbounds = self.inbound_index.ip_to_inbounds
+    
+    def set_inbounds(self, ip_to_inbounds: Dict[str, Set[str]]):
+        """Replace the IP -> inbound index with the current cycle's connections"""
+        self.inbound_index = InboundIndex(ip_to_inbounds)
+        self.ip_to_inbounds = self.inbound_index.ip_to_inbounds
+        self.same_ip_multiple_inbounds = self.inbound_index.same_ip_multi_inbound
     
     def is_monitoring_active(self) -> bool:
         """Check if the monitoring period is still active"""
@@ -71,6 +170,11 @@ class UserWarning:
         remaining = self.monitoring_end_time - time.time()
         return max(0, int(remaining))
     
+    @property
+    def monitoring_history(self) -> List[dict]:
+        """Recent monitoring snapshots, oldest first"""
+        return list(self.history)
+    
     def update_ip_activity(self, current_ips: Set[str], timestamp: float = None):
         """
         Update IP activity tracking. Called each check cycle during monitoring.
@@ -79,27 +183,40 @@ class UserWarning:
         if timestamp is None:
             timestamp = time.time()
         
+        activity = self.ip_activity
         for ip in current_ips:
-            if ip not in self.ip_first_seen:
-                self.ip_first_seen[ip] = timestamp
-            self.ip_last_seen[ip] = timestamp
-            self.ip_seen_count[ip] = self.ip_seen_count.get(ip, 0) + 1
-        
-        if len(self.monitoring_history) < 20:
-            self.monitoring_history.append({
-                'timestamp': timestamp,
-                'ips': current_ips.copy(),
-                'ip_count': len(current_ips)
-            })
+            entry = activity.get(ip)
+            if entry is None:
+                activity[ip] = IPActivity(timestamp, timestamp, 1)
+            else:
+                entry.last_seen = timestamp
+                entry.seen_count += 1
+        
+        self.history.append(timestamp, current_ips)
+    
+    def touch_ip(self, ip: str, timestamp: float):
+        """
+        Record that an IP was seen (pushed from the log ingest path).
+        Extends the active duration but not the per-check seen count.
+        """
+        entry = self.ip_activity.get(ip)
+        if entry is None:
+            self.ip_activity[ip] = IPActivity(timestamp, timestamp, 0)
+        elif timestamp > entry.last_seen:
+            entry.last_seen = timestamp
+    
+    def get_recent_ips(self, window_seconds: float) -> Set[str]:
+        """IPs seen within the last window_seconds"""
+        cutoff = time.time() - window_seconds
+        return {ip for ip, entry in self.ip_activity.items() if entry.last_seen >= cutoff}
     
     def get_ip_active_duration(self, ip: str) -> float:
         """
         Get how long an IP has been active (in seconds).
         Returns the duration between first and last seen.
         """
-        if ip not in self.ip_first_seen or ip not in self.ip_last_seen:
-            return 0.0
-        return self.ip_last_seen[ip] - self.ip_first_seen[ip]
+        entry = self.ip_activity.get(ip)
+        return entry.duration if entry else 0.0
     
     def get_persistent_devices(self, min_duration_seconds: int = 120) -> Set[str]:
         """
@@ -115,15 +232,11 @@ class UserWarning:
         persistent_ips = set()
         current_time = time.time()
         
-        for ip in self.ip_first_seen:
-            last_seen = self.ip_last_seen.get(ip, 0)
-            if current_time - last_seen > 120:
+        for ip, entry in self.ip_activity.items():
+            if current_time - entry.last_seen > 120:
                 continue
             
-            duration = self.get_ip_active_duration(ip)
-            seen_count = self.ip_seen_count.get(ip, 0)
-            
-            if duration >= min_duration_seconds or seen_count >= 2:
+            if entry.duration >= min_duration_seconds or entry.seen_count >= 2:
                 persistent_ips.add(ip)
         
         return persistent_ips
@@ -137,11 +250,10 @@ class UserWarning:
         lines = []
         current_time = time.time()
         
-        for ip in self.ip_first_seen:
-            duration = self.get_ip_active_duration(ip)
-            seen_count = self.ip_seen_count.get(ip, 0)
-            last_seen = self.ip_last_seen.get(ip, 0)
-            is_recent = (current_time - last_seen) < 120
+        for ip, entry in self.ip_activity.items():
+            duration = entry.duration
+            seen_count = entry.seen_count
+            is_recent = (current_time - entry.last_seen) < 120
             
             status = "✅" if duration >= 120 or seen_count >= 2 else "⏳"
             if not is_recent:
@@ -158,131 +270,49 @@ class UserWarning:
         Returns:
             dict with analysis results
         """
-        analysis = {
-            'same_ip_multi_inbound': False,
-            'multi_ip_same_inbound': False,
-            'pattern_type': 'unknown',
-            'details': []
+        index = self.inbound_index
+        details = [
+            f"IP {ip} uses {len(index.ip_to_inbounds[ip])} inbounds: {index.ip_to_inbounds[ip]}"
+            for ip in index.multi_inbound_ips
+        ]
+        details.extend(
+            f"Inbound '{inbound}' used by {len(index.inbound_to_ips[inbound])} IPs"
+            for inbound in index.multi_ip_inbounds
+        )
+        return {
+            'same_ip_multi_inbound': index.same_ip_multi_inbound,
+            'multi_ip_same_inbound': index.multi_ip_same_inbound,
+            'pattern_type': index.pattern_type,
+            'details': details,
         }
-        
-        if not self.ip_to_inbounds:
-            return analysis
-        
-        for ip, inbounds in self.ip_to_inbounds.items():
-            if len(inbounds) > 1:
-                analysis['same_ip_multi_inbound'] = True
-                analysis['details'].append(f"IP {ip} uses {len(inbounds)} inbounds: {inbounds}")
-        
-        inbound_to_ips = {}
-        for ip, inbounds in self.ip_to_inbounds.items():
-            for inbound in inbounds:
-                if inbound not in inbound_to_ips:
-                    inbound_to_ips[inbound] = set()
-                inbound_to_ips[inbound].add(ip)
-        
-        for inbound, ips in inbound_to_ips.items():
-            if len(ips) > 1:
-                analysis['multi_ip_same_inbound'] = True
-                analysis['details'].append(f"Inbound '{inbound}' used by {len(ips)} IPs")
-        
-        if analysis['same_ip_multi_inbound'] and not analysis['multi_ip_same_inbound']:
-            analysis['pattern_type'] = 'single_device_switching'
-        elif analysis['multi_ip_same_inbound'] and not analysis['same_ip_multi_inbound']:
-            analysis['pattern_type'] = 'multi_device'
-        elif analysis['same_ip_multi_inbound'] and analysis['multi_ip_same_inbound']:
-            analysis['pattern_type'] = 'mixed'
-        
-        return analysis
     
     def detect_isp_change_pattern(self) -> str:
         """
         Detect ISP change patterns to identify SIM card swap vs multi-device.
         
         Returns:
-            str: "sim_swap", "multi_device", "single_isp", or "unknown"
+            str: "sim_swap", "possible_sim_swap", "multi_device", "single_isp", or "unknown"
         """
-        if len(self.isp_names) <= 1:
-            return "single_isp"
-        
-        if len(self.ip_subnets) == len(self.ips) and len(self.isp_names) <= 2:
-            if self.connection_details:
-                if len(self.ips) == 2 and len(self.isp_names) == 2:
-                    return "sim_swap"
-            return "possible_sim_swap"
-        
-        if len(self.ip_subnets) < len(self.ips):
-            return "multi_device"
-        
-        return "unknown"
+        return detect_isp_pattern(self)
     
     def calculate_trust_score(self) -> float:
         """
-        Calculate trust score based on multiple behavioral factors.
+        Calculate trust score based on multiple behavioral factors (see trust_score.py).
         Score ranges from -100 (very suspicious/multi-device) to 100 (trustworthy/single device)
+        Also updates isp_change_pattern and the per-factor breakdown in trust_factors.
         
         Returns:
             float: Trust score (-100 to 100)
         """
-        score = 50.0
-        ip_count = len(self.ips)
-        
-        # Factor 1: IP-Inbound Pattern Analysis
-        ip_pattern = self.analyze_ip_inbound_pattern()
-        
-        if ip_pattern['same_ip_multi_inbound']:
-            score += 20
-            trust_logger.debug(f"Trust [{self.username}]: +20 (same IP, multiple inbounds)")
-        
-        if ip_pattern['multi_ip_same_inbound']:
-            score -= 30
-            trust_logger.debug(f"Trust [{self.username}]: -30 (multiple IPs, same inbound)")
-        
-        inbound_count = len(self.inbound_protocols)
-        if inbound_count > 1 and ip_count > 1 and not ip_pattern['same_ip_multi_inbound']:
-            penalty = min(inbound_count, ip_count) * 15
-            score -= penalty
-            trust_logger.debug(f"Trust [{self.username}]: -{penalty} ({inbound_count} inbounds, {ip_count} IPs)")
-        
-        # Factor 2: ISP/Network Pattern
-        isp_pattern = self.detect_isp_change_pattern()
-        self.isp_change_pattern = isp_pattern
-        
-        subnet_count = len(self.ip_subnets)
-        isp_count = len(self.isp_names)
-        
-        if subnet_count > 1 and isp_count == 1:
-            penalty = (subnet_count - 1) * 15
-            score -= penalty
-            trust_logger.debug(f"Trust [{self.username}]: -{penalty} ({subnet_count} subnets, same ISP)")
-        
-        if isp_pattern in ("sim_swap", "possible_sim_swap"):
-            score -= 8
-            trust_logger.debug(f"Trust [{self.username}]: -8 (possible SIM swap)")
-        elif isp_pattern == "multi_device":
-            score -= 25
-            trust_logger.debug(f"Trust [{self.username}]: -25 (multi-device ISP pattern)")
-        
-        # Factor 3: Warning History
-        if self.previous_warnings_12h > 0:
-            penalty = self.previous_warnings_12h * 20
-            score -= penalty
-            trust_logger.debug(f"Trust [{self.username}]: -{penalty} ({self.previous_warnings_12h} disables in 12h)")
-        
-        additional_24h = max(0, self.previous_warnings_24h - self.previous_warnings_12h)
-        if additional_24h > 0:
-            penalty = additional_24h * 10
-            score -= penalty
-            trust_logger.debug(f"Trust [{self.username}]: -{penalty} ({additional_24h} disables in 24h)")
-        
-        # Factor 4: IP Count Severity
-        if ip_count > 2:
-            penalty = (ip_count - 2) * 10
-            score -= penalty
-            trust_logger.debug(f"Trust [{self.username}]: -{penalty} ({ip_count} IPs, excess penalty)")
-        
-        score = max(-100.0, min(100.0, score))
-        trust_logger.info(f"📊 Trust score for {self.username}: {score:.0f}")
-        return score
+        breakdown = trust_engine.score(self)
+        self.apply_trust_breakdown(breakdown)
+        return breakdown.score
+    
+    def apply_trust_breakdown(self, breakdown) -> None:
+        """Store a TrustBreakdown computed for this warning"""
+        self.isp_change_pattern = breakdown.isp_pattern
+        self.trust_factors = breakdown.factors
+        trust_logger.debug(f"📊 Trust score for {self.username}: {breakdown.score:.0f} ({breakdown.describe()})")
     
     def get_trust_level(self) -> str:
         """Get human-readable trust level based on score."""
@@ -303,12 +333,12 @@ class UserWarning:
         """Get a human-readable summary of detected behavior patterns."""
         patterns = []
         
-        ip_pattern = self.analyze_ip_inbound_pattern()
-        if ip_pattern['pattern_type'] == 'single_device_switching':
+        pattern_type = self.inbound_index.pattern_type
+        if pattern_type == 'single_device_switching':
             patterns.append("📱 Single device switching protocols")
-        elif ip_pattern['pattern_type'] == 'multi_device':
+        elif pattern_type == 'multi_device':
             patterns.append("📲📲 Multiple devices detected")
-        elif ip_pattern['pattern_type'] == 'mixed':
+        elif pattern_type == 'mixed':
             patterns.append("🔀 Mixed device pattern")
         
         if self.isp_change_pattern == "sim_swap" or self.isp_change_pattern == "possible_sim_swap":